@@ -1,11 +1,43 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import sqlite3
 import datetime
+import sys
+import argparse
+import csv
+import json
+import os
+import uuid
+import threading
+import time
+import atexit
+import queue
 import tkinter.font as tkfont
-from datetime import datetime, date
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
 
 DB_NAME = "BD_municipalidad.db"
+
+# usuarios predeterminados
+USUARIOS_PREDETERMINADOS = (
+    ("Administrador", "123"),
+    ("LectorAgua", "456"),
+    ("Cocodes", "789"),
+    ("LectorMultas", "012"),
+)
+
+# Se aplican una sola vez, al abrir cada conexión del pool
+PRAGMAS_CONEXION = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+)
+
 def _add_header_footer(ventana, title_text, usuario_text, header_bg):
     header = tk.Frame(ventana, bg=header_bg, height=90)
     header.pack(fill="x", side="top")
@@ -27,87 +59,2091 @@ def _add_header_footer(ventana, title_text, usuario_text, header_bg):
                           font=("Segoe UI", 15 , "italic"),
                           bg=footer_bg, fg="#2D3A4A")
     lbl_footer.pack(pady=2)
+
+    # Indicador de consultas en segundo plano (se coloca sobre la ventana para que
+    # siga visible aunque un panel oculte el header/footer)
+    ocupado = tk.Frame(ventana, bg=footer_bg)
+    tk.Label(ocupado, text="⏳ Consultando…", font=("Segoe UI", 9),
+             bg=footer_bg, fg="#2D3A4A").pack(side="left", padx=(6, 4))
+    barra = ttk.Progressbar(ocupado, mode="indeterminate", length=90)
+    barra.pack(side="left", padx=(0, 6), pady=3)
+    ejecutor_bd.agregar_indicador(ocupado, barra)
     return header, footer
 
+def _columnas(conn, tabla):
+    return {r["name"] for r in conn.execute(f"PRAGMA table_info({tabla})")}
+
+def _migracion_1_esquema_base(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios_registrados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT,
+            direccion TEXT,
+            numero_casa TEXT,
+            dpi TEXT,
+            nit TEXT,
+            servicio_agua TEXT,
+            contador TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS multas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_completo TEXT NOT NULL,
+            dpi TEXT NOT NULL,
+            tipo_multa TEXT NOT NULL,
+            detalle_otro TEXT,
+            monto REAL NOT NULL DEFAULT 0,
+            avisos INTEGER NOT NULL DEFAULT 0,
+            estado TEXT NOT NULL DEFAULT 'Vigente',
+            creado_por TEXT,
+            fecha_creacion TEXT
+        );
+    """)
+    # Bases creadas antes de que existiera la columna 'avisos'
+    if "avisos" not in _columnas(conn, "multas"):
+        conn.execute("ALTER TABLE multas ADD COLUMN avisos INTEGER NOT NULL DEFAULT 0;")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS lecturas_agua (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER,
+            consumo_m3 REAL,
+            total_pagar REAL,
+            fecha TEXT,
+            pagado INTEGER DEFAULT 0,
+            fecha_pago TEXT,
+            FOREIGN KEY(usuario_id) REFERENCES usuarios_registrados(id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ciudadanos_ornato (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            dpi TEXT UNIQUE NOT NULL,
+            nit TEXT,
+            salario REAL NOT NULL
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS boletas_ornato (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ciudadano_id INTEGER NOT NULL,
+            monto REAL NOT NULL,
+            con_multa INTEGER DEFAULT 0,
+            fecha_pago TEXT,
+            anio INTEGER,
+            FOREIGN KEY (ciudadano_id) REFERENCES ciudadanos_ornato(id)
+        );
+    """)
+    # Tablas de credenciales (una por tipo de usuario) y usuarios predeterminados
+    for tabla, contrasena in USUARIOS_PREDETERMINADOS:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabla.lower()} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo_usuario TEXT NOT NULL,
+                contrasena TEXT NOT NULL
+            );
+        """)
+        conn.execute(f"""
+            INSERT INTO {tabla.lower()} (tipo_usuario, contrasena)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM {tabla.lower()} WHERE contrasena = ?)
+        """, (tabla, contrasena, contrasena))
+
+def _migracion_2_indices(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_dpi ON usuarios_registrados(dpi)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_numero_casa ON usuarios_registrados(numero_casa)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_nombre ON usuarios_registrados(nombre COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lecturas_usuario_pagado ON lecturas_agua(usuario_id, pagado)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_boletas_ciudadano_anio ON boletas_ornato(ciudadano_id, anio)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_fecha ON multas(fecha_creacion)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_dpi ON multas(dpi)")
+
+# Índice de mes (año*12 + mes) de una fecha 'YYYY-MM-DD ...'; NULL si la fecha no es válida
+_SQL_MES = "(CAST(strftime('%Y', {f}) AS INTEGER) * 12 + CAST(strftime('%m', {f}) AS INTEGER))"
+_SQL_FECHADA = "(strftime('%Y', {f}) IS NOT NULL)"
+
+def _sql_mora(fila, con_mora):
+    # (cuenta para mora, índice de mes) de una lectura; con_mora es una condición SQL sobre la fila
+    fecha = f"{fila}.fecha" if fila else "fecha"
+    return (f"({con_mora} AND {_SQL_FECHADA.format(f=fecha)})",
+            f"(CASE WHEN {con_mora} THEN COALESCE({_SQL_MES.format(f=fecha)}, 0) ELSE 0 END)")
+
+def _sql_sumar_saldo(fila, con_mora="1"):
+    # Upsert que suma una lectura pendiente (NEW u OLD dentro de un trigger) al saldo del cliente
+    fechada, mes = _sql_mora(fila, con_mora)
+    return f"""
+        INSERT INTO saldos_agua (usuario_id, total_pendiente, lecturas_pendientes, lecturas_con_fecha, suma_meses)
+        SELECT {fila}.usuario_id, COALESCE({fila}.total_pagar, 0), 1, {fechada}, {mes}
+        WHERE {fila}.pagado = 0 AND {fila}.usuario_id IS NOT NULL
+        ON CONFLICT(usuario_id) DO UPDATE SET
+            total_pendiente = total_pendiente + excluded.total_pendiente,
+            lecturas_pendientes = lecturas_pendientes + 1,
+            lecturas_con_fecha = lecturas_con_fecha + excluded.lecturas_con_fecha,
+            suma_meses = suma_meses + excluded.suma_meses;
+    """
+
+def _sql_restar_saldo(fila, con_mora="1"):
+    fechada, mes = _sql_mora(fila, con_mora)
+    return f"""
+        UPDATE saldos_agua SET
+            total_pendiente = total_pendiente - COALESCE({fila}.total_pagar, 0),
+            lecturas_pendientes = lecturas_pendientes - 1,
+            lecturas_con_fecha = lecturas_con_fecha - {fechada},
+            suma_meses = suma_meses - {mes}
+        WHERE usuario_id = {fila}.usuario_id AND {fila}.pagado = 0;
+    """
+
+def _crear_triggers_saldos(conn, con_mora=lambda fila: "1", columnas="usuario_id, total_pagar, fecha, pagado"):
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_agua_insert AFTER INSERT ON lecturas_agua
+        BEGIN {_sql_sumar_saldo("NEW", con_mora("NEW"))} END;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_agua_delete AFTER DELETE ON lecturas_agua
+        BEGIN {_sql_restar_saldo("OLD", con_mora("OLD"))} END;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_agua_update
+        AFTER UPDATE OF {columnas} ON lecturas_agua
+        BEGIN {_sql_restar_saldo("OLD", con_mora("OLD"))} {_sql_sumar_saldo("NEW", con_mora("NEW"))} END;
+    """)
+
+def _reconstruir_saldos(conn, con_mora="1"):
+    # Recalcula saldos_agua desde lecturas_agua con el esquema de la migración que lo llama;
+    # SaldosAgua.reconstruir es la versión de la aplicación y puede cambiar, esta no
+    fechada, mes = _sql_mora(None, con_mora)
+    conn.execute("DELETE FROM saldos_agua")
+    conn.execute(f"""
+        INSERT INTO saldos_agua (usuario_id, total_pendiente, lecturas_pendientes, lecturas_con_fecha, suma_meses)
+        SELECT usuario_id, SUM(COALESCE(total_pagar, 0)), COUNT(*), SUM({fechada}), SUM({mes})
+        FROM lecturas_agua
+        WHERE pagado = 0 AND usuario_id IS NOT NULL
+        GROUP BY usuario_id
+    """)
+
+def _migracion_3_saldos_agua(conn):
+    # Saldo por cliente mantenido por triggers; la mora se obtiene en O(1) con
+    # 25 * (lecturas_con_fecha * mes_actual - suma_meses)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS saldos_agua (
+            usuario_id INTEGER PRIMARY KEY,
+            total_pendiente REAL NOT NULL DEFAULT 0,
+            lecturas_pendientes INTEGER NOT NULL DEFAULT 0,
+            lecturas_con_fecha INTEGER NOT NULL DEFAULT 0,
+            suma_meses INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(usuario_id) REFERENCES usuarios_registrados(id)
+        );
+    """)
+    _crear_triggers_saldos(conn)
+    _reconstruir_saldos(conn)
+
+def _migracion_4_cierres_agua(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cierres_agua (
+            periodo TEXT NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            lecturas INTEGER NOT NULL,
+            consumo_m3 REAL NOT NULL,
+            cargo REAL NOT NULL,
+            mora REAL NOT NULL,
+            total REAL NOT NULL,
+            fecha_cierre TEXT NOT NULL,
+            PRIMARY KEY (periodo, usuario_id)
+        );
+    """)
+
+def _migracion_5_lecturas_por_fecha(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lecturas_usuario_fecha ON lecturas_agua(usuario_id, fecha)")
+
+def _migracion_6_cargos_tarifa_fija(conn):
+    # Los cargos de tarifa fija se guardan en lecturas_agua (tipo 'Tarifa fija', sin consumo),
+    # uno por cliente y periodo; la mora de Q25 solo aplica a las lecturas de contador
+    columnas = _columnas(conn, "lecturas_agua")
+    if "tipo" not in columnas:
+        conn.execute("ALTER TABLE lecturas_agua ADD COLUMN tipo TEXT NOT NULL DEFAULT 'Contador'")
+    if "periodo" not in columnas:
+        conn.execute("ALTER TABLE lecturas_agua ADD COLUMN periodo TEXT")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_lecturas_cargo_fijo
+        ON lecturas_agua(usuario_id, periodo) WHERE tipo = 'Tarifa fija'
+    """)
+    for trigger in ("trg_saldos_agua_insert", "trg_saldos_agua_delete", "trg_saldos_agua_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _crear_triggers_saldos(conn, con_mora=lambda fila: f"{fila}.tipo = 'Contador'",
+                           columnas="usuario_id, total_pagar, fecha, pagado, tipo")
+    _reconstruir_saldos(conn, con_mora="tipo = 'Contador'")
+
+def _migracion_7_historial_por_llave(conn):
+    # La paginación del historial ordena por (fecha, id); el índice lleva las tres columnas
+    conn.execute("DROP INDEX IF EXISTS idx_lecturas_usuario_fecha")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lecturas_usuario_fecha_id ON lecturas_agua(usuario_id, fecha, id)")
+
+def _migracion_8_anomalias_consumo(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS configuracion (
+            clave TEXT PRIMARY KEY,
+            valor TEXT NOT NULL
+        )
+    """)
+    # Valores de DetectorConsumo al crear la migración (umbral 3, mínimo 4 lecturas, varianza mínima 1);
+    # se copian aquí para que cambiar la clase no cambie lo que hace la migración
+    conn.execute("INSERT OR IGNORE INTO configuracion (clave, valor) VALUES ('umbral_anomalia', '3.0')")
+    # Estadística acumulada por cliente (n, Σx, Σx²) de las lecturas de contador
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS estadisticas_consumo (
+            usuario_id INTEGER PRIMARY KEY,
+            lecturas INTEGER NOT NULL DEFAULT 0,
+            suma REAL NOT NULL DEFAULT 0,
+            suma_cuadrados REAL NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS anomalias_consumo (
+            lectura_id INTEGER PRIMARY KEY,
+            usuario_id INTEGER NOT NULL,
+            consumo REAL NOT NULL,
+            media REAL NOT NULL,
+            varianza REAL NOT NULL,
+            origen TEXT NOT NULL DEFAULT 'captura',
+            detectada TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            revisada INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_anomalias_revisada ON anomalias_consumo(revisada, detectada)")
+
+    media = "(e.suma * 1.0 / e.lecturas)"
+    varianza = "MAX((e.suma_cuadrados - e.suma * e.suma * 1.0 / e.lecturas) / (e.lecturas - 1), 1.0)"
+    cuenta = "{f}.tipo = 'Contador' AND {f}.consumo_m3 IS NOT NULL AND {f}.usuario_id IS NOT NULL"
+    sumar = """
+        INSERT INTO estadisticas_consumo (usuario_id, lecturas, suma, suma_cuadrados)
+        SELECT NEW.usuario_id, 1, NEW.consumo_m3, NEW.consumo_m3 * NEW.consumo_m3
+        WHERE {cond}
+        ON CONFLICT(usuario_id) DO UPDATE SET
+            lecturas = lecturas + 1,
+            suma = suma + excluded.suma,
+            suma_cuadrados = suma_cuadrados + excluded.suma_cuadrados;
+    """.format(cond=cuenta.format(f="NEW"))
+    restar = """
+        UPDATE estadisticas_consumo SET
+            lecturas = lecturas - 1,
+            suma = suma - OLD.consumo_m3,
+            suma_cuadrados = suma_cuadrados - OLD.consumo_m3 * OLD.consumo_m3
+        WHERE usuario_id = OLD.usuario_id AND {cond};
+    """.format(cond=cuenta.format(f="OLD"))
+    # La lectura nueva se compara con la estadística previa y luego se suma a ella
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_consumo_insert AFTER INSERT ON lecturas_agua
+        BEGIN
+            INSERT INTO anomalias_consumo (lectura_id, usuario_id, consumo, media, varianza)
+            SELECT NEW.id, NEW.usuario_id, NEW.consumo_m3, {media}, {varianza}
+            FROM estadisticas_consumo e, configuracion c
+            WHERE {cuenta.format(f="NEW")}
+              AND e.usuario_id = NEW.usuario_id AND e.lecturas >= 4
+              AND c.clave = 'umbral_anomalia'
+              AND (NEW.consumo_m3 - {media}) * (NEW.consumo_m3 - {media})
+                  > CAST(c.valor AS REAL) * CAST(c.valor AS REAL) * {varianza};
+            {sumar}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_consumo_delete AFTER DELETE ON lecturas_agua
+        BEGIN
+            {restar}
+            DELETE FROM anomalias_consumo WHERE lectura_id = OLD.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_consumo_update AFTER UPDATE OF usuario_id, consumo_m3, tipo ON lecturas_agua
+        BEGIN
+            {restar}
+            {sumar}
+            DELETE FROM anomalias_consumo WHERE lectura_id = NEW.id AND OLD.consumo_m3 IS NOT NEW.consumo_m3;
+        END
+    """)
+    conn.execute("DELETE FROM estadisticas_consumo")
+    conn.execute("""
+        INSERT INTO estadisticas_consumo (usuario_id, lecturas, suma, suma_cuadrados)
+        SELECT usuario_id, COUNT(*), SUM(consumo_m3), SUM(consumo_m3 * consumo_m3)
+        FROM lecturas_agua
+        WHERE tipo = 'Contador' AND consumo_m3 IS NOT NULL AND usuario_id IS NOT NULL
+        GROUP BY usuario_id
+    """)
+
+def _migracion_9_tarifas(conn):
+    # Tarifas vigentes hasta ahora: agua Q5.00/m³ en un solo bloque, tarifa fija Q20.00 y multas por tipo
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tarifas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            servicio TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            desde REAL NOT NULL DEFAULT 0,
+            valor REAL NOT NULL,
+            vigente_desde TEXT NOT NULL DEFAULT '2000-01-01',
+            UNIQUE (servicio, categoria, vigente_desde, desde)
+        )
+    """)
+    conn.executemany("INSERT OR IGNORE INTO tarifas (servicio, categoria, desde, valor) VALUES (?, ?, 0, ?)", [
+        ("agua", "Residencial", 5.0),
+        ("agua_fija", "Residencial", 20.0),
+        ("multa", "Tala de árboles.", 6000),
+        ("multa", "Indocumentación", 100),
+        ("multa", "Contaminación ambiental.", 5000),
+        ("multa", "Daño a la infraestructura pública.", 500),
+        ("multa", "Daño al alumbrado público.", 500),
+        ("multa", "Otro", 50),
+    ])
+    # Cualquier cambio en tarifas sube la versión y vacía el caché de Tarifario
+    conn.execute("INSERT OR IGNORE INTO configuracion (clave, valor) VALUES ('version_tarifas', '0')")
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_tarifas_{evento.lower()} AFTER {evento} ON tarifas
+            BEGIN
+                UPDATE configuracion SET valor = CAST(valor AS INTEGER) + 1 WHERE clave = 'version_tarifas';
+            END
+        """)
+    if "categoria" not in _columnas(conn, "usuarios_registrados"):
+        conn.execute("ALTER TABLE usuarios_registrados ADD COLUMN categoria TEXT NOT NULL DEFAULT 'Residencial'")
+
+def _migracion_10_tramos_ornato(conn):
+    # Tramos de salario del boleto de ornato; cada tramo aplica a salarios mayores que 'desde'
+    conn.executemany("INSERT OR IGNORE INTO tarifas (servicio, categoria, desde, valor) VALUES ('ornato', ?, ?, ?)", [
+        (categoria, desde, valor * (2 if categoria == "Con multa" else 1))
+        for categoria in ("Sin multa", "Con multa")
+        for desde, valor in ((0, 15), (3000, 50), (6000, 75), (9000, 100), (12000, 150))
+    ])
+
+def _migracion_11_boleta_unica(conn):
+    # Una boleta por ciudadano y año. Los cobros duplicados que ya existieran se conservan en
+    # boletas_ornato_duplicadas (para revisión y devolución) y se deja la primera boleta.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS boletas_ornato_duplicadas AS
+        SELECT * FROM boletas_ornato WHERE 0
+    """)
+    duplicadas = """
+        SELECT id FROM boletas_ornato b
+        WHERE EXISTS (
+            SELECT 1 FROM boletas_ornato p
+            WHERE p.ciudadano_id = b.ciudadano_id AND p.anio = b.anio AND p.id < b.id
+        )
+    """
+    conn.execute(f"INSERT INTO boletas_ornato_duplicadas SELECT * FROM boletas_ornato WHERE id IN ({duplicadas})")
+    conn.execute(f"DELETE FROM boletas_ornato WHERE id IN ({duplicadas})")
+    conn.execute("DROP INDEX IF EXISTS idx_boletas_ciudadano_anio")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_boletas_ciudadano_anio ON boletas_ornato(ciudadano_id, anio)")
+
+def _migracion_12_campana_ornato(conn):
+    # Las boletas existentes son cobros hechos en caja; la campaña anual crea las pendientes (pagado = 0)
+    if "pagado" not in _columnas(conn, "boletas_ornato"):
+        conn.execute("ALTER TABLE boletas_ornato ADD COLUMN pagado INTEGER NOT NULL DEFAULT 1")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_boletas_anio_pagado ON boletas_ornato(anio, pagado)")
+
+def _migracion_13_version_multas(conn):
+    # Cada cambio en multas sube la versión; así RepositorioMultas detecta cambios de otras terminales
+    conn.execute("INSERT OR IGNORE INTO configuracion (clave, valor) VALUES ('version_multas', '0')")
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_multas_{evento.lower()} AFTER {evento} ON multas
+            BEGIN
+                UPDATE configuracion SET valor = CAST(valor AS INTEGER) + 1 WHERE clave = 'version_multas';
+            END
+        """)
+
+def _migracion_14_multas_por_estado(conn):
+    # La ronda de avisos filtra por estado y antigüedad
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_estado_fecha ON multas(estado, fecha_creacion)")
+
+def _migracion_15_navegador_multas(conn):
+    # El navegador de multas filtra por DPI, tipo o autor y ordena por fecha dentro del filtro
+    conn.execute("DROP INDEX IF EXISTS idx_multas_dpi")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_dpi_fecha ON multas(dpi, fecha_creacion)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_tipo_fecha ON multas(tipo_multa, fecha_creacion)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_autor_fecha ON multas(creado_por, fecha_creacion)")
+
+def _migracion_16_saldos_por_deuda(conn):
+    # Todo cliente tiene su fila en saldos_agua (en cero si no debe nada): la lista de clientes por
+    # deuda se lee en orden del índice, sin LEFT JOIN ni COALESCE
+    conn.execute("INSERT OR IGNORE INTO saldos_agua (usuario_id) SELECT id FROM usuarios_registrados")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_agua_usuario AFTER INSERT ON usuarios_registrados
+        BEGIN
+            INSERT OR IGNORE INTO saldos_agua (usuario_id) VALUES (NEW.id);
+        END
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_saldos_agua_deuda ON saldos_agua(total_pendiente, usuario_id)")
+
+def _migracion_17_orden_multas(conn):
+    # Órdenes del navegador de multas además de id y fecha: cada uno necesita su índice para leer
+    # las páginas por llave sin ordenar la tabla
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_nombre ON multas(nombre_completo)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_multas_monto ON multas(monto)")
+
+def _migracion_18_totales_historial(conn):
+    # Total histórico de lecturas y consumo por cliente (pie del historial de pagos), mantenido por
+    # triggers junto al saldo para no sumar todas las lecturas del cliente cada vez
+    columnas = _columnas(conn, "saldos_agua")
+    if "lecturas_total" not in columnas:
+        conn.execute("ALTER TABLE saldos_agua ADD COLUMN lecturas_total INTEGER NOT NULL DEFAULT 0")
+    if "consumo_total" not in columnas:
+        conn.execute("ALTER TABLE saldos_agua ADD COLUMN consumo_total REAL NOT NULL DEFAULT 0")
+    sumar = """
+        INSERT INTO saldos_agua (usuario_id, lecturas_total, consumo_total)
+        SELECT NEW.usuario_id, 1, COALESCE(NEW.consumo_m3, 0) WHERE NEW.usuario_id IS NOT NULL
+        ON CONFLICT(usuario_id) DO UPDATE SET
+            lecturas_total = lecturas_total + 1,
+            consumo_total = consumo_total + excluded.consumo_total;
+    """
+    restar = """
+        UPDATE saldos_agua SET
+            lecturas_total = lecturas_total - 1,
+            consumo_total = consumo_total - COALESCE(OLD.consumo_m3, 0)
+        WHERE usuario_id = OLD.usuario_id;
+    """
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_totales_agua_insert AFTER INSERT ON lecturas_agua "
+                 f"BEGIN {sumar} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_totales_agua_delete AFTER DELETE ON lecturas_agua "
+                 f"BEGIN {restar} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_totales_agua_update AFTER UPDATE OF usuario_id, consumo_m3 "
+                 f"ON lecturas_agua BEGIN {restar} {sumar} END")
+    conn.execute("""
+        UPDATE saldos_agua SET (lecturas_total, consumo_total) = (
+            SELECT COUNT(*), COALESCE(SUM(consumo_m3), 0) FROM lecturas_agua l
+            WHERE l.usuario_id = saldos_agua.usuario_id
+        )
+    """)
+    conn.execute("""
+        INSERT INTO saldos_agua (usuario_id, lecturas_total, consumo_total)
+        SELECT usuario_id, COUNT(*), COALESCE(SUM(consumo_m3), 0) FROM lecturas_agua
+        WHERE usuario_id IS NOT NULL AND usuario_id NOT IN (SELECT usuario_id FROM saldos_agua)
+        GROUP BY usuario_id
+    """)
+
+# Cada migración se aplica una sola vez, en orden, y deja PRAGMA user_version en su número
+MIGRACIONES = [
+    (1, _migracion_1_esquema_base),
+    (2, _migracion_2_indices),
+    (3, _migracion_3_saldos_agua),
+    (4, _migracion_4_cierres_agua),
+    (5, _migracion_5_lecturas_por_fecha),
+    (6, _migracion_6_cargos_tarifa_fija),
+    (7, _migracion_7_historial_por_llave),
+    (8, _migracion_8_anomalias_consumo),
+    (9, _migracion_9_tarifas),
+    (10, _migracion_10_tramos_ornato),
+    (11, _migracion_11_boleta_unica),
+    (12, _migracion_12_campana_ornato),
+    (13, _migracion_13_version_multas),
+    (14, _migracion_14_multas_por_estado),
+    (15, _migracion_15_navegador_multas),
+    (16, _migracion_16_saldos_por_deuda),
+    (17, _migracion_17_orden_multas),
+    (18, _migracion_18_totales_historial),
+]
+
+def _sql_buscar_usuarios(nombre=None, casa=None, dpi=None):
+    # Búsqueda de usuarios (panel de administrador y cobro de agua); cada filtro es opcional
+    condiciones, params = ["1=1"], []
+    if nombre:
+        condiciones.append("nombre LIKE ?")
+        params.append(f"%{nombre}%")
+    if casa:
+        condiciones.append("numero_casa = ?")
+        params.append(casa)
+    if dpi:
+        condiciones.append("dpi = ?")
+        params.append(dpi)
+    return "SELECT * FROM usuarios_registrados WHERE " + " AND ".join(condiciones), params
+
+# Consultas de búsqueda y cobro de los paneles; ninguna debe recorrer la tabla completa. Los
+# paneles ejecutan estas mismas entradas, así que lo que se verifica es lo que corre.
+CONSULTAS_CRITICAS = {
+    "admin_buscar_dpi": _sql_buscar_usuarios(dpi="?")[0],
+    "admin_buscar_casa": _sql_buscar_usuarios(casa="?")[0],
+    "admin_buscar_nombre": _sql_buscar_usuarios(nombre="?")[0],
+    "admin_usuario_por_id": "SELECT * FROM usuarios_registrados WHERE id = ?",
+    "agua_cobro": """
+        UPDATE lecturas_agua
+        SET pagado = 1, fecha_pago = ?
+        WHERE usuario_id = ? AND pagado = 0
+    """,
+    "agua_saldo": "SELECT * FROM saldos_agua WHERE usuario_id = ?",
+    "agua_anomalias_pendientes": """
+        SELECT a.*, l.fecha, u.nombre, u.dpi FROM anomalias_consumo a
+        JOIN lecturas_agua l ON l.id = a.lectura_id
+        JOIN usuarios_registrados u ON u.id = a.usuario_id
+        WHERE a.revisada = 0 ORDER BY a.detectada DESC
+    """,
+    "ornato_buscar_dpi": "SELECT * FROM ciudadanos_ornato WHERE dpi = ?",
+    "ornato_cobro": """
+        INSERT INTO boletas_ornato (ciudadano_id, monto, con_multa, fecha_pago, anio, pagado)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT (ciudadano_id, anio) DO UPDATE SET
+            monto = excluded.monto, con_multa = excluded.con_multa, fecha_pago = excluded.fecha_pago, pagado = 1
+        WHERE boletas_ornato.pagado = 0
+    """,
+    "ornato_recaudacion": """
+        SELECT COUNT(*) AS emitidas, SUM(pagado) AS pagadas,
+               SUM(CASE WHEN pagado = 1 THEN monto ELSE 0 END) AS recaudado,
+               SUM(CASE WHEN pagado = 0 THEN monto ELSE 0 END) AS pendiente
+        FROM boletas_ornato WHERE anio = ?
+    """,
+    "multas_version": "SELECT valor FROM configuracion WHERE clave = 'version_multas'",
+    "multas_por_dpi": "SELECT * FROM multas WHERE dpi = ?",
+    "multas_por_id": "SELECT * FROM multas WHERE id = ?",
+    "multas_ronda_avisos": "SELECT COUNT(*) FROM multas WHERE estado = ? AND fecha_creacion <= ?",
+    "ciudadano_agua": """
+        SELECT u.id, u.nombre, u.numero_casa, s.* FROM usuarios_registrados u
+        LEFT JOIN saldos_agua s ON s.usuario_id = u.id
+        WHERE u.dpi = ?
+    """,
+    "ciudadano_ornato": """
+        SELECT c.id, c.nombre, c.salario, b.pagado, b.monto AS monto_boleta, b.fecha_pago FROM ciudadanos_ornato c
+        LEFT JOIN boletas_ornato b ON b.ciudadano_id = c.id AND b.anio = ?
+        WHERE c.dpi = ?
+    """,
+    "ciudadano_multas": "SELECT * FROM multas WHERE dpi = ? AND estado = 'Vigente' ORDER BY fecha_creacion DESC",
+}
+
+# Consultas de CONSULTAS_CRITICAS que recorren la tabla a propósito, con el motivo
+RECORRIDOS_PERMITIDOS = {
+    "admin_buscar_nombre": "LIKE '%texto%' busca en cualquier parte del nombre y ningún índice lo resuelve; "
+                           "los resultados llegan por lotes con CargadorIncremental",
+}
+
+class ConnectionPool:
+    def __init__(self, db_name=None, max_conexiones=4, espera_maxima=10.0):
+        self.db_name = db_name
+        self.max_conexiones = max_conexiones
+        self.espera_maxima = espera_maxima
+        self._libres = []
+        self._abiertas = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {"abiertas": 0, "reusadas": 0, "cerradas": 0, "esperas": 0, "tiempo_espera": 0.0}
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.db_name or DB_NAME, timeout=self.espera_maxima, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS_CONEXION:
+            conn.execute(pragma)
+        return conn
+
+    def adquirir(self):
+        inicio = time.perf_counter()
+        with self._cond:
+            while not self._libres and self._abiertas >= self.max_conexiones:
+                restante = self.espera_maxima - (time.perf_counter() - inicio)
+                if restante <= 0:
+                    raise sqlite3.OperationalError("No hay conexiones disponibles en el pool")
+                self._cond.wait(restante)
+            esperado = time.perf_counter() - inicio
+            if esperado > 0.001:
+                self._stats["esperas"] += 1
+                self._stats["tiempo_espera"] += esperado
+            if self._libres:
+                self._stats["reusadas"] += 1
+                return self._libres.pop()
+            self._abiertas += 1
+        try:
+            conn = self._abrir()
+        except Exception:
+            with self._cond:
+                self._abiertas -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["abiertas"] += 1
+        return conn
+
+    def liberar(self, conn):
+        with self._cond:
+            self._libres.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self):
+        # Reentrante: un hilo que ya tiene conexión la reutiliza en llamadas anidadas
+        actual = getattr(self._local, "conn", None)
+        if actual is not None:
+            yield actual
+            return
+
+        conn = self.adquirir()
+        self._local.conn = conn
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self.liberar(conn)
+
+    def cerrar(self):
+        with self._cond:
+            while self._libres:
+                self._libres.pop().close()
+                self._abiertas -= 1
+                self._stats["cerradas"] += 1
+
+    def stats(self):
+        with self._cond:
+            datos = dict(self._stats)
+            datos["en_uso"] = self._abiertas - len(self._libres)
+            datos["libres"] = len(self._libres)
+        return datos
+
+
 class DatabaseManager:
+    pool = ConnectionPool()
+    _esquema_listo = False
+
     @staticmethod
     def connect():
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return DatabaseManager.pool.conexion()
+
+    @staticmethod
+    @contextmanager
+    def transaccion(conn):
+        # Transacción de escritura; si el llamador ya abrió una (conexión reentrante del pool),
+        # se anida con un SAVEPOINT y el commit queda en manos del llamador
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT anidada")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO anidada")
+                conn.execute("RELEASE anidada")
+                raise
+            conn.execute("RELEASE anidada")
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @staticmethod
+    def verificar_indices(consultas=None):
+        # Devuelve las consultas cuyo plan incluye un recorrido completo ("SCAN tabla" sin índice);
+        # recorrer el resultado de una subconsulta ("SCAN (subquery-n)") no cuenta
+        fallos = {}
+        with DatabaseManager.connect() as conn:
+            for nombre, sql in (consultas or CONSULTAS_CRITICAS).items():
+                params = [None] * sql.count("?")
+                plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                recorridos = [d for d in plan if d.startswith("SCAN ") and " USING " not in d
+                              and not d.startswith("SCAN (")]
+                if recorridos and nombre not in RECORRIDOS_PERMITIDOS:
+                    fallos[nombre] = plan
+        return fallos
+
+    @staticmethod
+    def close():
+        DatabaseManager.pool.cerrar()
+
+    @staticmethod
+    def stats():
+        return DatabaseManager.pool.stats()
 
     @staticmethod
     def init_tables():
+        if DatabaseManager._esquema_listo:
+            return
         with DatabaseManager.connect() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS usuarios_registrados (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT,
-                    direccion TEXT,
-                    numero_casa TEXT,
-                    dpi TEXT,
-                    nit TEXT,
-                    servicio_agua TEXT,
-                    contador TEXT
-                );
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS multas (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre_completo TEXT NOT NULL,
-                    dpi TEXT NOT NULL,
-                    tipo_multa TEXT NOT NULL,
-                    detalle_otro TEXT,
-                    monto REAL NOT NULL DEFAULT 0,
-                    avisos INTEGER NOT NULL DEFAULT 0,
-                    estado TEXT NOT NULL DEFAULT 'Vigente',
-                    creado_por TEXT,
-                    fecha_creacion TEXT
-                );
-            """)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            ultima = MIGRACIONES[-1][0]
+            if version < ultima:
+                conn.execute("BEGIN IMMEDIATE")
+                # Otra terminal pudo migrar mientras esperábamos el bloqueo
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for numero, migracion in MIGRACIONES:
+                    if numero > version:
+                        migracion(conn)
+                conn.execute(f"PRAGMA user_version = {max(version, ultima)}")
+                conn.commit()
+        DatabaseManager._esquema_listo = True
+
+class DBExecutor:
+    # Ejecuta trabajos de base de datos fuera del hilo de Tk. Cada trabajo recibe una
+    # conexión del pool; el resultado se entrega en el hilo de Tk mediante after().
+    INTERVALO_MS = 16
+
+    def __init__(self, max_hilos=3):
+        self._hilos = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="bd")
+        self._resultados = queue.Queue()
+        self._pendientes = 0
+        self._sondeando = False
+        self._indicadores = []
+
+    def enviar(self, widget, trabajo, al_terminar=None, al_fallar=None):
+        def ejecutar():
+            with DatabaseManager.connect() as conn:
+                return trabajo(conn)
+
+        raiz = widget._root()
+        self._pendientes += 1
+        futuro = self._hilos.submit(ejecutar)
+        futuro.add_done_callback(lambda f: self._resultados.put((widget, f, al_terminar, al_fallar)))
+        self._actualizar_indicadores()
+        if not self._sondeando:
+            self._sondeando = True
+            raiz.after(self.INTERVALO_MS, self._sondear, raiz)
+        return futuro
+
+    def _sondear(self, raiz):
+        while True:
+            try:
+                widget, futuro, al_terminar, al_fallar = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            self._pendientes -= 1
             try:
-                conn.execute("ALTER TABLE multas ADD COLUMN avisos INTEGER NOT NULL DEFAULT 0;")
-            except Exception as e:
-                # Si ya existe, no pasa nada
-                if "duplicate column name" not in str(e).lower():
-                    print("Error al agregar columna 'avisos':", e)
+                vigente = bool(widget.winfo_exists())
+            except tk.TclError:
+                vigente = False
+            if not vigente:
+                # La vista que pidió el trabajo ya se cerró
+                continue
+            error = futuro.exception()
+            if error is None:
+                if al_terminar:
+                    al_terminar(futuro.result())
+            elif al_fallar:
+                al_fallar(error)
+            else:
+                messagebox.showerror("Error", f"Error en la base de datos: {error}")
 
-            conn.commit()
+        self._actualizar_indicadores()
+        try:
+            if self._pendientes:
+                raiz.after(self.INTERVALO_MS, self._sondear, raiz)
+                return
+        except tk.TclError:
+            pass
+        self._sondeando = False
+
+    def agregar_indicador(self, marco, barra):
+        self._indicadores.append((marco, barra))
+        self._actualizar_indicadores()
+
+    def _actualizar_indicadores(self):
+        vivos = []
+        for marco, barra in self._indicadores:
+            try:
+                if not marco.winfo_exists():
+                    continue
+                if self._pendientes:
+                    if not marco.place_info():
+                        marco.place(relx=1.0, rely=1.0, anchor="se", x=-4, y=-30)
+                        barra.start(15)
+                else:
+                    barra.stop()
+                    marco.place_forget()
+            except tk.TclError:
+                continue
+            vivos.append((marco, barra))
+        self._indicadores = vivos
+
+    def cerrar(self):
+        self._hilos.shutdown(wait=False, cancel_futures=True)
+
+ejecutor_bd = DBExecutor()
+
+class PaginadorLlave:
+    # Páginas de "SELECT {select} {desde} WHERE {where}" ordenadas por (columna, id_col), leídas por
+    # llave: cada página empieza después de la llave de la última fila de la anterior, así que leer
+    # cualquier página cuesta lo mismo (con OFFSET el costo crece con la posición). Con columna=None
+    # se ordena solo por id_col. marcas() recorre el índice una vez y da la llave donde termina cada
+    # página, para poder saltar a cualquier posición (barra de desplazamiento de ListaVirtual).
+    # Si la columna admite NULL (nulos=True), esas filas se leen aparte: SQLite las ordena primero en
+    # sentido ascendente y al final en descendente, y la comparación por llave no las alcanza.
+    def __init__(self, select, desde, where="1=1", params=(), columna=None, id_col="id",
+                 descendente=False, nulos=False):
+        self.select = select
+        self.desde = desde
+        self.where = where
+        self.params = list(params)
+        self.columna = columna
+        self.id_col = id_col
+        self.descendente = descendente
+        self.nulos = nulos and columna is not None
+
+    def _orden(self):
+        sentido = "DESC" if self.descendente else "ASC"
+        if self.columna is None:
+            return f"{self.id_col} {sentido}"
+        return f"{self.columna} {sentido}, {self.id_col} {sentido}"
+
+    def sql_pagina(self, tramo=""):
+        return f"SELECT {self.select} {self.desde} WHERE ({self.where}){tramo} ORDER BY {self._orden()} LIMIT ?"
+
+    def _tramos(self):
+        # Condiciones que se agregan al WHERE para leer a partir de una llave. SQLite no usa el índice
+        # para comparar (columna, id) como fila cuando id es el rowid, así que "después de (v, id)"
+        # se lee en dos partes: el resto de las filas con columna = v, y luego columna > v (o < v).
+        op = "<" if self.descendente else ">"
+        if self.columna is None:
+            return {"despues": f" AND {self.id_col} {op} ?"}
+        tramos = {"empate": f" AND {self.columna} = ? AND {self.id_col} {op} ?",
+                  "despues": f" AND {self.columna} {op} ?"}
+        if self.nulos:
+            tramos.update(nulos=f" AND {self.columna} IS NULL",
+                          nulos_despues=f" AND {self.columna} IS NULL AND {self.id_col} {op} ?",
+                          valores=f" AND {self.columna} IS NOT NULL")
+        return tramos
+
+    def consultas(self):
+        # Todas las consultas que puede hacer pagina(), para CONSULTAS_CRITICAS
+        return {"": self.sql_pagina(), **{f"_{nombre}": self.sql_pagina(tramo)
+                                          for nombre, tramo in self._tramos().items()}}
+
+    def pagina(self, conn, despues_de=None, limite=100):
+        # despues_de: llave (tupla) de la última fila ya mostrada, o None para la primera página
+        t = self._tramos()
+        if despues_de is None:
+            if not self.nulos:
+                tramos = [("", [])]
+            elif self.descendente:
+                tramos = [(t["valores"], []), (t["nulos"], [])]
+            else:
+                tramos = [(t["nulos"], []), (t["valores"], [])]
+        elif self.columna is None:
+            tramos = [(t["despues"], [despues_de[-1]])]
+        elif despues_de[0] is None:
+            tramos = [(t["nulos_despues"], [despues_de[1]])]
+            if not self.descendente:
+                tramos.append((t["valores"], []))
+        else:
+            valor, ident = despues_de
+            tramos = [(t["empate"], [valor, ident]), (t["despues"], [valor])]
+            if self.nulos and self.descendente:
+                tramos.append((t["nulos"], []))
+        filas = []
+        for tramo, params in tramos:
+            if len(filas) >= limite:
+                break
+            filas += conn.execute(self.sql_pagina(tramo),
+                                  self.params + params + [limite - len(filas)]).fetchall()
+        return filas
+
+    def marcas(self, conn, paso):
+        # (total de filas, llaves): llaves[k] es la llave de la última fila de la página k - 1,
+        # o None para la primera página
+        llave = self.id_col if self.columna is None else f"{self.columna}, {self.id_col}"
+        cortes = [None] + [tuple(c)[:-1] for c in conn.execute(f"""
+            SELECT * FROM (
+                SELECT {llave}, ROW_NUMBER() OVER (ORDER BY {self._orden()}) AS n
+                {self.desde} WHERE {self.where}
+            ) WHERE n % ? = 0
+        """, self.params + [paso])]
+        # El total sale de las marcas y de la última página, leída por llave, sin un COUNT(*) aparte
+        return (len(cortes) - 1) * paso + len(self.pagina(conn, cortes[-1], paso)), cortes
+
+    @staticmethod
+    def _clase(valor):
+        # Orden de SQLite entre tipos: NULL, números, texto, BLOB
+        if valor is None:
+            return 0, 0
+        if isinstance(valor, (int, float)):
+            return 1, valor
+        if isinstance(valor, str):
+            return 2, valor
+        return 3, bytes(valor)
+
+    def pagina_de(self, cortes, fila):
+        # Página (según marcas()) donde cae la llave de la fila, o None si no se puede saber aquí.
+        # Solo para columnas simples: el orden se compara en Python, igual que SQLite con BINARY
+        columnas = [self.id_col] if self.columna is None else [self.columna, self.id_col]
+        if any(columna not in fila.keys() for columna in columnas):
+            return None
+        llave = tuple(self._clase(fila[columna]) for columna in columnas)
+        numero = 0
+        for corte in cortes[1:]:
+            corte = tuple(self._clase(valor) for valor in corte)
+            if not (corte > llave if self.descendente else corte < llave):
+                break
+            numero += 1
+        return numero
+
+def _registrar_paginador(nombre, paginador):
+    # Las consultas con que el paginador lee sus páginas, tal cual, en CONSULTAS_CRITICAS
+    for sufijo, sql in paginador.consultas().items():
+        CONSULTAS_CRITICAS[nombre + sufijo] = sql
+
+def _paginador_usuarios():
+    return PaginadorLlave("*", "FROM usuarios_registrados", columna="nombre COLLATE NOCASE", nulos=True)
+
+def _paginador_clientes_agua(por_deuda=False):
+    # La deuda de cada cliente sale de su fila en saldos_agua (todo cliente tiene una)
+    if por_deuda:
+        return PaginadorLlave("u.*, s.total_pendiente AS deuda_lecturas",
+                              "FROM saldos_agua s JOIN usuarios_registrados u ON u.id = s.usuario_id",
+                              "u.servicio_agua = 'Sí' OR u.servicio_agua = 'si'",
+                              columna="s.total_pendiente", id_col="s.usuario_id", descendente=True)
+    return PaginadorLlave("u.*, s.total_pendiente AS deuda_lecturas",
+                          "FROM usuarios_registrados u LEFT JOIN saldos_agua s ON s.usuario_id = u.id",
+                          "u.servicio_agua = 'Sí' OR u.servicio_agua = 'si'",
+                          columna="u.nombre COLLATE NOCASE", id_col="u.id", nulos=True)
+
+def _paginador_historial_agua(usuario_id, recientes_primero=True):
+    # Historial de lecturas de un cliente por (fecha, id) sobre idx_lecturas_usuario_fecha_id. Las
+    # lecturas sin fecha no se pierden: van al final (o al principio en orden inverso)
+    return PaginadorLlave("id, fecha, tipo, consumo_m3 AS consumo, total_pagar, pagado, fecha_pago",
+                          "FROM lecturas_agua", "usuario_id = ?", [usuario_id],
+                          columna="fecha", descendente=recientes_primero, nulos=True)
+
+_registrar_paginador("admin_usuarios", _paginador_usuarios())
+_registrar_paginador("agua_clientes", _paginador_clientes_agua())
+_registrar_paginador("agua_clientes_deuda", _paginador_clientes_agua(por_deuda=True))
+_registrar_paginador("agua_historial", _paginador_historial_agua(None))
+_registrar_paginador("agua_historial_inverso", _paginador_historial_agua(None, recientes_primero=False))
+
+class SaldosAgua:
+    MORA_MENSUAL = 25.0
+
+    @staticmethod
+    def reconstruir(conn):
+        # Recalcula todos los saldos desde lecturas_agua; devuelve cuántos clientes no cuadraban
+        anteriores = {r["usuario_id"]: tuple(r) for r in conn.execute("SELECT * FROM saldos_agua")}
+        fechada, mes = _sql_mora(None, "tipo = 'Contador'")
+        pendiente = "CASE WHEN pagado = 0 THEN {} ELSE 0 END"
+        conn.execute("DELETE FROM saldos_agua")
+        conn.execute(f"""
+            INSERT INTO saldos_agua (usuario_id, total_pendiente, lecturas_pendientes, lecturas_con_fecha, suma_meses,
+                                     lecturas_total, consumo_total)
+            SELECT usuario_id, SUM({pendiente.format("COALESCE(total_pagar, 0)")}), SUM({pendiente.format(1)}),
+                   SUM({pendiente.format(fechada)}), SUM({pendiente.format(mes)}),
+                   COUNT(*), SUM(COALESCE(consumo_m3, 0))
+            FROM lecturas_agua
+            WHERE usuario_id IS NOT NULL
+            GROUP BY usuario_id
+        """)
+        conn.execute("INSERT OR IGNORE INTO saldos_agua (usuario_id) SELECT id FROM usuarios_registrados")
+        actuales = {r["usuario_id"]: tuple(r) for r in conn.execute("SELECT * FROM saldos_agua")}
+        vacio = lambda uid: (uid, 0, 0, 0, 0, 0, 0)
+        return sum(1 for uid in set(anteriores) | set(actuales)
+                   if anteriores.get(uid, vacio(uid)) != actuales.get(uid, vacio(uid)))
+
+    @staticmethod
+    def consultar(conn, usuario_id):
+        return conn.execute(CONSULTAS_CRITICAS["agua_saldo"], (usuario_id,)).fetchone()
+
+    @staticmethod
+    def desglose(saldo, hoy=None):
+        # (lecturas pendientes, consumo pendiente, mora, total) a partir de una fila de saldos_agua
+        if saldo is None:
+            return 0, 0.0, 0.0, 0.0
+        hoy = hoy or date.today()
+        mes_actual = hoy.year * 12 + hoy.month
+        meses_mora = saldo["lecturas_con_fecha"] * mes_actual - saldo["suma_meses"]
+        mora = meses_mora * SaldosAgua.MORA_MENSUAL
+        consumo = float(saldo["total_pendiente"])
+        return saldo["lecturas_pendientes"], consumo, mora, consumo + mora
+
+class Tarifario:
+    # Tablas de la tabla tarifas compiladas en memoria: por (servicio, categoría) una lista de
+    # vigencias y, por vigencia, los bloques (desde, valor) con el cargo acumulado al inicio de
+    # cada bloque. Se recompilan solo cuando cambia configuracion.version_tarifas.
+    CATEGORIAS = ("Residencial", "Comercial")
+    CATEGORIA_DEFECTO = "Residencial"
+    _candado = threading.Lock()
+    _clave = None
+    _tablas = {}
+
+    @staticmethod
+    def _compilar(filas):
+        por_clave = {}
+        for f in filas:
+            vigencias = por_clave.setdefault((f["servicio"], f["categoria"]), {})
+            vigencias.setdefault(f["vigente_desde"], []).append((f["desde"], f["valor"]))
+        tablas = {}
+        for clave, vigencias in por_clave.items():
+            # Una vigencia sin bloque desde 0 dejaría consumos sin tarifa; se ignora y sigue la anterior
+            fechas = sorted(f for f, bloques in vigencias.items() if min(d for d, _ in bloques) == 0)
+            if not fechas:
+                continue
+            bloques = []
+            for fecha in fechas:
+                limites = [desde for desde, _ in vigencias[fecha]]
+                valores = [valor for _, valor in vigencias[fecha]]
+                acumulado = [0.0]
+                for i in range(1, len(limites)):
+                    acumulado.append(acumulado[-1] + (limites[i] - limites[i - 1]) * valores[i - 1])
+                bloques.append((limites, valores, acumulado))
+            tablas[clave] = (fechas, bloques)
+        return tablas
+
+    @staticmethod
+    def tablas(conn):
+        version = conn.execute("SELECT valor FROM configuracion WHERE clave = 'version_tarifas'").fetchone()
+        clave = (DB_NAME, version["valor"] if version else None)
+        with Tarifario._candado:
+            if clave != Tarifario._clave:
+                Tarifario._tablas = Tarifario._compilar(conn.execute("""
+                    SELECT servicio, categoria, desde, valor, vigente_desde FROM tarifas
+                    ORDER BY servicio, categoria, vigente_desde, desde
+                """).fetchall())
+                Tarifario._clave = clave
+            return Tarifario._tablas
+
+    @staticmethod
+    def _vigente(tablas, servicio, categoria, fecha, alterna=None):
+        entrada = tablas.get((servicio, categoria)) or tablas.get((servicio, alterna))
+        if not entrada:
+            return None
+        fechas, bloques = entrada
+        fecha = (fecha or date.today().isoformat())[:10]
+        # Antes de la primera vigencia se aplica la más antigua
+        return bloques[max(bisect_right(fechas, fecha) - 1, 0)]
+
+    @staticmethod
+    def cargo_agua(tablas, consumo, categoria=None, fecha=None):
+        bloque = Tarifario._vigente(tablas, "agua", categoria, fecha, Tarifario.CATEGORIA_DEFECTO)
+        if bloque is None:
+            raise LookupError("No hay tarifa de agua configurada")
+        limites, valores, acumulado = bloque
+        i = max(bisect_right(limites, consumo) - 1, 0)
+        return acumulado[i] + max(consumo - limites[i], 0) * valores[i]
+
+    @staticmethod
+    def monto(tablas, servicio, categoria, fecha=None, alterna=None, defecto=0.0):
+        bloque = Tarifario._vigente(tablas, servicio, categoria, fecha, alterna)
+        return bloque[1][0] if bloque else defecto
+
+    @staticmethod
+    def montos(tablas, servicio, fecha=None):
+        # {categoría: monto} de un servicio de monto fijo (agua_fija, multa)
+        return {categoria: Tarifario.monto(tablas, servicio, categoria, fecha)
+                for (s, categoria) in tablas if s == servicio}
+
+    @staticmethod
+    def fijar(conn, servicio, categoria, valor, desde=0.0, vigente_desde=None):
+        # Una vigencia nueva arranca con los bloques de la anterior, así cambiar un bloque no deja
+        # sin tarifa a los demás; la primera vigencia debe empezar en 0
+        vigente_desde = vigente_desde or date.today().isoformat()
+        copiados = conn.execute("""
+            INSERT INTO tarifas (servicio, categoria, desde, valor, vigente_desde)
+            SELECT servicio, categoria, desde, valor, ? FROM tarifas
+            WHERE servicio = ? AND categoria = ? AND vigente_desde = (
+                SELECT MAX(vigente_desde) FROM tarifas
+                WHERE servicio = ? AND categoria = ? AND vigente_desde < ?
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM tarifas WHERE servicio = ? AND categoria = ? AND vigente_desde = ?
+            )
+            ON CONFLICT (servicio, categoria, vigente_desde, desde) DO NOTHING
+        """, (vigente_desde, servicio, categoria, servicio, categoria, vigente_desde,
+              servicio, categoria, vigente_desde)).rowcount
+        base = conn.execute("""
+            SELECT 1 FROM tarifas WHERE servicio = ? AND categoria = ? AND vigente_desde = ? AND desde = 0
+        """, (servicio, categoria, vigente_desde)).fetchone()
+        if base is None and desde != 0:
+            raise ValueError(f"La tarifa {servicio}/{categoria} vigente desde {vigente_desde} "
+                             "necesita primero un bloque desde 0")
+        conn.execute("""
+            INSERT INTO tarifas (servicio, categoria, desde, valor, vigente_desde) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (servicio, categoria, vigente_desde, desde) DO UPDATE SET valor = excluded.valor
+        """, (servicio, categoria, desde, valor, vigente_desde))
+        return copiados
+
+    @staticmethod
+    def candidatas(conn, cambios):
+        # Tablas para simular: cada (servicio, categoría) cambiado toma los bloques de su vigencia
+        # más reciente con los cambios aplicados y rige para todas las fechas; el resto queda igual.
+        # cambios: iterable de (servicio, categoria, desde, valor)
+        filas = [dict(f) for f in conn.execute("""
+            SELECT servicio, categoria, desde, valor, vigente_desde FROM tarifas
+            ORDER BY servicio, categoria, vigente_desde, desde
+        """)]
+        propuestas = {}
+        for servicio, categoria, desde, valor in cambios:
+            bloques = propuestas.get((servicio, categoria))
+            if bloques is None:
+                previas = [f for f in filas if (f["servicio"], f["categoria"]) == (servicio, categoria)]
+                ultima = max((f["vigente_desde"] for f in previas), default=None)
+                bloques = propuestas[(servicio, categoria)] = {
+                    f["desde"]: f["valor"] for f in previas if f["vigente_desde"] == ultima}
+            bloques[float(desde)] = float(valor)
+        for (servicio, categoria), bloques in propuestas.items():
+            if 0 not in bloques:
+                raise ValueError(f"La tarifa propuesta {servicio}/{categoria} necesita un bloque desde 0")
+        filas = [f for f in filas if (f["servicio"], f["categoria"]) not in propuestas] + [
+            {"servicio": servicio, "categoria": categoria, "desde": desde, "valor": valor, "vigente_desde": ""}
+            for (servicio, categoria), bloques in propuestas.items() for desde, valor in sorted(bloques.items())]
+        return Tarifario._compilar(filas)
+
+class Ornato:
+    # Boleto de ornato: monto según el tramo de salario; después de febrero se cobra con multa
+    MES_LIMITE = 2
+
+    @staticmethod
+    def categoria(fecha=None):
+        fecha = fecha or date.today()
+        return "Con multa" if fecha.month > Ornato.MES_LIMITE else "Sin multa"
+
+    @staticmethod
+    def _tramos(tablas, fecha):
+        bloque = Tarifario._vigente(tablas, "ornato", Ornato.categoria(fecha), fecha.isoformat())
+        if bloque is None:
+            raise LookupError("No hay tramos de ornato configurados")
+        return bloque[0], bloque[1]
+
+    @staticmethod
+    def monto(tablas, salario, fecha=None):
+        fecha = fecha or date.today()
+        limites, valores = Ornato._tramos(tablas, fecha)
+        # bisect_left: un salario igual al límite queda en el tramo inferior (salario <= 3000 → primer tramo)
+        return valores[max(bisect_left(limites, salario) - 1, 0)]
+
+    @staticmethod
+    def sql_monto(tablas, fecha=None, columna="salario"):
+        # Los mismos tramos como expresión CASE para calcular todo el padrón en SQL
+        limites, valores = Ornato._tramos(tablas, fecha or date.today())
+        casos = " ".join(f"WHEN {columna} <= ? THEN ?" for _ in limites[1:])
+        params = [v for par in zip(limites[1:], valores[:-1]) for v in par] + [valores[-1]]
+        return f"(CASE {casos} ELSE ? END)", params
+
+    @staticmethod
+    def calcular(conn, fecha=None):
+        fecha = fecha or date.today()
+        monto, params = Ornato.sql_monto(Tarifario.tablas(conn), fecha)
+        return conn.execute(f"""
+            SELECT id, nombre, dpi, salario, {monto} AS monto
+            FROM ciudadanos_ornato ORDER BY nombre COLLATE NOCASE
+        """, params).fetchall()
+
+    @staticmethod
+    def proyeccion(conn, fecha=None):
+        # Ciudadanos y monto esperado por tramo, separando a quienes ya pagaron el año
+        fecha = fecha or date.today()
+        monto, params = Ornato.sql_monto(Tarifario.tablas(conn), fecha, "c.salario")
+        return conn.execute(f"""
+            SELECT monto, COUNT(*) AS ciudadanos, SUM(pagado) AS pagados,
+                   SUM(monto) AS total, SUM(CASE WHEN pagado THEN 0 ELSE monto END) AS por_cobrar
+            FROM (
+                SELECT {monto} AS monto,
+                       EXISTS (SELECT 1 FROM boletas_ornato b
+                               WHERE b.ciudadano_id = c.id AND b.anio = ? AND b.pagado = 1) AS pagado
+                FROM ciudadanos_ornato c
+            )
+            GROUP BY monto ORDER BY monto
+        """, params + [fecha.year]).fetchall()
+
+    @staticmethod
+    def cobrar(conn, ciudadano_id, anio, monto, con_multa, fecha_pago):
+        # Una sola sentencia: marca pagada la boleta pendiente de la campaña (o la crea si el
+        # ciudadano se registró después); si otra terminal ya la cobró no cambia nada y devuelve False
+        return conn.execute(CONSULTAS_CRITICAS["ornato_cobro"],
+                            (ciudadano_id, monto, con_multa, fecha_pago, anio)).rowcount == 1
+
+    @staticmethod
+    def generar_campana(conn, anio=None):
+        # Boleta pendiente para cada ciudadano del padrón, a precio sin multa; repetirla no duplica
+        anio = anio or date.today().year
+        monto, params = Ornato.sql_monto(Tarifario.tablas(conn), date(anio, 1, 1))
+        with DatabaseManager.transaccion(conn):
+            generadas = conn.execute(f"""
+                INSERT INTO boletas_ornato (ciudadano_id, monto, con_multa, fecha_pago, anio, pagado)
+                SELECT id, {monto}, 0, NULL, ?, 0 FROM ciudadanos_ornato WHERE 1
+                ON CONFLICT (ciudadano_id, anio) DO NOTHING
+            """, params + [anio]).rowcount
+        return generadas
+
+    @staticmethod
+    def recaudacion(conn, anio=None):
+        return conn.execute(CONSULTAS_CRITICAS["ornato_recaudacion"], (anio or date.today().year,)).fetchone()
+
+    @staticmethod
+    def tramos_salario(tablas, fecha=None):
+        # [(mayor que, hasta)] de cada tramo; None en los extremos abiertos
+        limites, _ = Ornato._tramos(tablas, fecha or date.today())
+        return list(zip([None] + limites[1:], limites[1:] + [None]))
+
+    @staticmethod
+    def _filtro(anio, estado=None, tramo=None):
+        condiciones, params = ["1=1"], []
+        if estado == "pagado":
+            condiciones.append("b.pagado = 1")
+        elif estado == "pendiente":
+            condiciones.append("COALESCE(b.pagado, 0) = 0")
+        if tramo:
+            mayor_que, hasta = tramo
+            if mayor_que is not None:
+                condiciones.append("c.salario > ?")
+                params.append(mayor_que)
+            if hasta is not None:
+                condiciones.append("c.salario <= ?")
+                params.append(hasta)
+        desde = """
+            FROM ciudadanos_ornato c
+            LEFT JOIN boletas_ornato b ON b.ciudadano_id = c.id AND b.anio = ?
+        """
+        return desde, " AND ".join(condiciones), [anio] + params
+
+    @staticmethod
+    def listar(conn, anio, estado=None, tramo=None, antes_de=None, limite=100):
+        # Página por llave sobre c.id (más recientes primero): antes_de es el id de la última fila
+        # de la página anterior
+        desde, where, params = Ornato._filtro(anio, estado, tramo)
+        monto, params_monto = Ornato.sql_monto(Tarifario.tablas(conn), None, "c.salario")
+        if antes_de is not None:
+            where += " AND c.id < ?"
+            params.append(antes_de)
+        return conn.execute(f"""
+            SELECT c.id, c.nombre, c.dpi, c.nit, c.salario, {monto} AS monto, COALESCE(b.pagado, 0) AS pagado
+            {desde}
+            WHERE {where}
+            ORDER BY c.id DESC LIMIT ?
+        """, params_monto + params + [limite]).fetchall()
+
+    @staticmethod
+    def marcas(conn, anio, estado=None, tramo=None, paso=100):
+        # Total del padrón filtrado y el id donde termina cada página de listar()
+        desde, where, params = Ornato._filtro(anio, estado, tramo)
+        return PaginadorLlave("c.id", desde, where, params, id_col="c.id", descendente=True).marcas(conn, paso)
+
+def _sql_facturacion(cargo):
+    return f"""
+        SELECT usuario_id,
+               COUNT(*) AS lecturas,
+               SUM(COALESCE(consumo_m3, 0)) AS consumo_m3,
+               SUM({cargo}) AS cargo,
+               SUM(CASE WHEN tipo = 'Contador' AND {_SQL_FECHADA.format(f="fecha")}
+                        THEN :mes_corte - {_SQL_MES.format(f="fecha")} ELSE 0 END) * :mora_mensual AS mora
+        FROM lecturas_agua
+        WHERE pagado = 0 AND usuario_id IS NOT NULL
+          AND (NOT {_SQL_FECHADA.format(f="fecha")} OR date(fecha) <= :fecha_corte)
+        GROUP BY usuario_id
+    """
+
+class FacturacionAgua:
+    # Facturación de todo el padrón en una sola pasada de SQL sobre las lecturas pendientes.
+    # En modo "qué pasaría si" cada lectura se vuelve a cotizar con Tarifario sobre unas tablas
+    # candidatas (ver Tarifario.candidatas), igual que al registrarla.
+    SQL_FACTURACION = _sql_facturacion("COALESCE(total_pagar, 0)")
+    SQL_SIMULACION = _sql_facturacion("""cargo_simulado(
+        tipo, COALESCE(consumo_m3, 0), (SELECT categoria FROM usuarios_registrados WHERE id = usuario_id),
+        fecha, COALESCE(total_pagar, 0))""")
+
+    @staticmethod
+    def _parametros(periodo, mora_mensual):
+        anio, mes = (int(x) for x in periodo.split("-"))
+        siguiente = date(anio + mes // 12, mes % 12 + 1, 1)
+        fecha_corte = min(date.fromordinal(siguiente.toordinal() - 1), date.today())
+        return {
+            "mora_mensual": SaldosAgua.MORA_MENSUAL if mora_mensual is None else mora_mensual,
+            "mes_corte": anio * 12 + mes,
+            "fecha_corte": fecha_corte.isoformat(),
+        }
+
+    @staticmethod
+    def cotizar(tablas, tipo, consumo, categoria, fecha, actual):
+        # Cargo de una lectura pendiente con las tablas dadas; lo que no tiene tarifa conserva su cargo
+        if tipo == "Contador":
+            return Tarifario.cargo_agua(tablas, consumo, categoria, fecha)
+        if tipo == "Tarifa fija":
+            return Tarifario.monto(tablas, "agua_fija", categoria, fecha, Tarifario.CATEGORIA_DEFECTO, actual)
+        return actual
+
+    @staticmethod
+    def calcular(conn, periodo=None, tarifas=None, mora_mensual=None):
+        # tarifas: tablas compiladas de Tarifario; None factura los cargos ya registrados
+        periodo = periodo or date.today().strftime("%Y-%m")
+        params = FacturacionAgua._parametros(periodo, mora_mensual)
+        if tarifas is None:
+            return conn.execute(FacturacionAgua.SQL_FACTURACION, params).fetchall()
+        conn.create_function("cargo_simulado", 5, lambda *fila: FacturacionAgua.cotizar(tarifas, *fila),
+                             deterministic=True)
+        try:
+            return conn.execute(FacturacionAgua.SQL_SIMULACION, params).fetchall()
+        finally:
+            conn.create_function("cargo_simulado", 5, None)
+
+    @staticmethod
+    def cerrar(conn, periodo=None):
+        # Guarda la foto del periodo en cierres_agua; repetir el cierre reemplaza la anterior
+        periodo = periodo or date.today().strftime("%Y-%m")
+        params = FacturacionAgua._parametros(periodo, None)
+        params.update(periodo=periodo, fecha_cierre=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        with DatabaseManager.transaccion(conn):
+            conn.execute("DELETE FROM cierres_agua WHERE periodo = :periodo", params)
+            conn.execute(f"""
+                INSERT INTO cierres_agua (periodo, usuario_id, lecturas, consumo_m3, cargo, mora, total, fecha_cierre)
+                SELECT :periodo, usuario_id, lecturas, consumo_m3, cargo, mora, cargo + mora, :fecha_cierre
+                FROM ({FacturacionAgua.SQL_FACTURACION})
+            """, params)
+        return conn.execute("""
+            SELECT COUNT(*) AS clientes, SUM(lecturas) AS lecturas, SUM(cargo) AS cargo,
+                   SUM(mora) AS mora, SUM(total) AS total
+            FROM cierres_agua WHERE periodo = ?
+        """, (periodo,)).fetchone()
+
+    @staticmethod
+    def generar_cargos_fijos(conn, periodo=None):
+        # Un cargo por cliente sin contador y periodo; volver a correrlo no duplica cargos
+        periodo = periodo or date.today().strftime("%Y-%m")
+        fecha = f"{periodo}-01 00:00:00"
+        tablas = Tarifario.tablas(conn)
+        # El cargo de cada categoría se resuelve una vez en Python y entra al INSERT como CASE
+        montos = Tarifario.montos(tablas, "agua_fija", fecha)
+        defecto = montos.get(Tarifario.CATEGORIA_DEFECTO)
+        if defecto is None:
+            raise LookupError("No hay tarifa fija de agua configurada")
+        casos = " ".join("WHEN ? THEN ?" for _ in montos)
+        with DatabaseManager.transaccion(conn):
+            generados = conn.execute(f"""
+                INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado, tipo, periodo)
+                SELECT id, NULL, CASE categoria {casos} ELSE ? END, ?, 0, 'Tarifa fija', ?
+                FROM usuarios_registrados
+                WHERE (servicio_agua = 'Sí' OR servicio_agua = 'si')
+                  AND lower(COALESCE(contador, '')) NOT IN ('sí', 'si')
+                ON CONFLICT DO NOTHING
+            """, [v for par in montos.items() for v in par] + [defecto, fecha, periodo]).rowcount
+        return generados
+
+    @staticmethod
+    def resumir(filas):
+        cargo = sum(f["cargo"] for f in filas)
+        mora = sum(f["mora"] for f in filas)
+        return {"clientes": len(filas), "lecturas": sum(f["lecturas"] for f in filas),
+                "cargo": cargo, "mora": mora, "total": cargo + mora}
+
+class ImportadorLecturas:
+    # Importa lecturas de una ruta (CSV o JSON) en una sola transacción.
+    # Columnas: usuario_id o dpi, consumo_m3 (o consumo) y fecha opcional.
+    FORMATOS_FECHA = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+    @staticmethod
+    def leer(ruta):
+        # Valida el formato (y un .json completo) antes de devolver el iterador de filas; una
+        # línea JSONL ilegible o una fila que no es objeto llega como {"_error": motivo} y validar() la rechaza
+        extension = os.path.splitext(ruta)[1].lower()
+        if extension == ".csv":
+            return ImportadorLecturas._filas_csv(ruta)
+        if extension == ".jsonl":
+            return ImportadorLecturas._filas_jsonl(ruta)
+        if extension != ".json":
+            raise ValueError(f"Formato no soportado: {extension} (use .csv, .json o .jsonl)")
+
+        with open(ruta, encoding="utf-8-sig") as f:
+            try:
+                datos = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{os.path.basename(ruta)} no es un JSON válido "
+                                 f"(línea {e.lineno}, columna {e.colno}: {e.msg})") from e
+        filas = datos.get("lecturas") if isinstance(datos, dict) else datos
+        if not isinstance(filas, list):
+            raise ValueError(f"{os.path.basename(ruta)}: se esperaba una lista de lecturas")
+        return (ImportadorLecturas._como_objeto(fila) for fila in filas)
+
+    @staticmethod
+    def _filas_csv(ruta):
+        with open(ruta, encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+    @staticmethod
+    def _filas_jsonl(ruta):
+        with open(ruta, encoding="utf-8-sig") as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except json.JSONDecodeError as e:
+                    fila = {"_error": f"JSON inválido: {e.msg}", "_linea": linea.strip()}
+                yield ImportadorLecturas._como_objeto(fila)
+
+    @staticmethod
+    def _como_objeto(fila):
+        return fila if isinstance(fila, dict) else {"_error": "La fila no es un objeto JSON", "_linea": fila}
+
+    @staticmethod
+    def medidores(conn):
+        # (id con contador -> categoría, dpi -> id) para validar cada fila sin volver a la base
+        rows = conn.execute(
+            "SELECT id, dpi, categoria FROM usuarios_registrados WHERE contador = 'Sí' OR contador = 'si'").fetchall()
+        return {r["id"]: r["categoria"] for r in rows}, {str(r["dpi"]): r["id"] for r in rows if r["dpi"]}
+
+    @staticmethod
+    def validar(fila, ids, por_dpi, fecha_defecto, tablas):
+        # Devuelve ((usuario_id, consumo, total, fecha), None) o (None, motivo)
+        if "_error" in fila:
+            return None, fila["_error"]
+        usuario_id = str(fila.get("usuario_id") or "").strip()
+        dpi = str(fila.get("dpi") or "").strip()
+        if usuario_id:
+            # En JSON un id puede llegar como número (12 o 12.0); se acepta si es entero
+            try:
+                numero = float(usuario_id)
+                if not numero.is_integer():
+                    raise ValueError
+                usuario_id = int(numero)
+            except ValueError:
+                return None, f"usuario_id inválido: {usuario_id}"
+        elif dpi:
+            usuario_id = por_dpi.get(dpi)
+            if usuario_id is None:
+                return None, f"DPI sin contador registrado: {dpi}"
+        else:
+            return None, "Falta usuario_id o dpi"
+        if usuario_id not in ids:
+            return None, f"El usuario {usuario_id} no existe o no tiene contador"
+
+        valor = fila.get("consumo_m3", fila.get("consumo"))
+        try:
+            consumo = float(valor)
+            if consumo < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return None, f"Consumo inválido: {valor}"
+
+        fecha = str(fila.get("fecha") or "").strip()
+        if fecha:
+            for formato in ImportadorLecturas.FORMATOS_FECHA:
+                try:
+                    fecha = datetime.strptime(fecha, formato).strftime("%Y-%m-%d %H:%M:%S")
+                    break
+                except ValueError:
+                    continue
+            else:
+                return None, f"Fecha inválida: {fecha}"
+        else:
+            fecha = fecha_defecto
+
+        return (usuario_id, consumo, Tarifario.cargo_agua(tablas, consumo, ids[usuario_id], fecha), fecha), None
+
+    @staticmethod
+    def insertar(conn, lecturas):
+        # lecturas: iterable de (usuario_id, consumo, total, fecha); una sola transacción
+        with DatabaseManager.transaccion(conn):
+            cur = conn.executemany("""
+                INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado)
+                VALUES (?, ?, ?, ?, 0)
+            """, lecturas)
+        return cur.rowcount
+
+    @staticmethod
+    def importar(conn, ruta, ruta_rechazos=None):
+        ruta_rechazos = ruta_rechazos or os.path.splitext(ruta)[0] + ".rechazos.csv"
+        ids, por_dpi = ImportadorLecturas.medidores(conn)
+        tablas = Tarifario.tablas(conn)
+        fecha_defecto = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        resumen = {"leidas": 0, "importadas": 0, "rechazadas": 0, "rechazos": None}
+        filas = ImportadorLecturas.leer(ruta)
+        completa = False
+
+        try:
+            with open(ruta_rechazos, "w", encoding="utf-8", newline="") as f:
+                rechazos = csv.writer(f)
+                rechazos.writerow(["fila", "motivo", "datos"])
+
+                def validas():
+                    for numero, fila in enumerate(filas, start=1):
+                        resumen["leidas"] += 1
+                        lectura, motivo = ImportadorLecturas.validar(fila, ids, por_dpi, fecha_defecto, tablas)
+                        if lectura:
+                            yield lectura
+                        else:
+                            resumen["rechazadas"] += 1
+                            datos = fila.get("_linea") if "_error" in fila else fila
+                            rechazos.writerow([numero, motivo, datos if isinstance(datos, str)
+                                               else json.dumps(datos, ensure_ascii=False)])
+
+                resumen["importadas"] = ImportadorLecturas.insertar(conn, validas())
+            completa = True
+        finally:
+            # Si no hubo rechazos, o la importación falló y no se guardó nada, el archivo sobra
+            if not (completa and resumen["rechazadas"]) and os.path.exists(ruta_rechazos):
+                os.remove(ruta_rechazos)
+
+        if resumen["rechazadas"]:
+            resumen["rechazos"] = ruta_rechazos
+        return resumen
+
+class DiarioLecturas:
+    # Diario local (JSON Lines, solo se agrega al final) para tomar lecturas sin acceso a la base.
+    # La sincronización es idempotente: una lectura por cliente y mes (periodo AAAA-MM).
+    RUTA = "lecturas_sin_conexion.jsonl"
+
+    @staticmethod
+    def registrar(usuario_id, consumo, fecha, ruta=None):
+        entrada = {"id": uuid.uuid4().hex, "usuario_id": usuario_id, "consumo_m3": consumo, "fecha": fecha}
+        with open(ruta or DiarioLecturas.RUTA, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return entrada
+
+    @staticmethod
+    def pendientes(ruta=None):
+        ruta = ruta or DiarioLecturas.RUTA
+        if not os.path.exists(ruta):
+            return 0
+        with open(ruta, encoding="utf-8") as f:
+            return sum(1 for linea in f if linea.strip())
+
+    @staticmethod
+    def _limites(periodo):
+        anio, mes = (int(x) for x in periodo.split("-"))
+        return f"{periodo}-01", f"{anio + mes // 12:04d}-{mes % 12 + 1:02d}-01"
+
+    @staticmethod
+    def sincronizar(conn, ruta=None):
+        ruta = ruta or DiarioLecturas.RUTA
+        resumen = {"entradas": 0, "insertadas": 0, "duplicadas": 0, "conflictos": [], "rechazadas": [],
+                   "archivo": None, "reporte": None}
+        if not os.path.exists(ruta):
+            return resumen
+
+        ids, por_dpi = ImportadorLecturas.medidores(conn)
+        tablas = Tarifario.tablas(conn)
+        ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        por_periodo = {}
+        devueltas = []
+        for numero, entrada in enumerate(ImportadorLecturas.leer(ruta), start=1):
+            resumen["entradas"] += 1
+            lectura, motivo = ImportadorLecturas.validar(entrada, ids, por_dpi, ahora, tablas)
+            if not lectura:
+                resumen["rechazadas"].append((numero, motivo))
+                devueltas.append(entrada.get("_linea", entrada) if "_error" in entrada else entrada)
+                continue
+            clave = (lectura[0], lectura[3][:7])
+            previa = por_periodo.get(clave)
+            if previa is None:
+                por_periodo[clave] = lectura
+                continue
+            if previa[1] == lectura[1]:
+                resumen["duplicadas"] += 1
+            else:
+                resumen["conflictos"].append(
+                    (clave[0], clave[1], f"Diario: {previa[1]:g} m³ y {lectura[1]:g} m³; se usa la más reciente"))
+            if lectura[3] >= previa[3]:
+                por_periodo[clave] = lectura
+
+        with DatabaseManager.transaccion(conn):
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS lecturas_agua (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    usuario_id INTEGER,
-                    consumo_m3 REAL,
-                    total_pagar REAL,
-                    fecha TEXT,
-                    pagado INTEGER DEFAULT 0,
-                    fecha_pago TEXT,
-                    FOREIGN KEY(usuario_id) REFERENCES usuarios_registrados(id)
-                );
+                CREATE TEMP TABLE IF NOT EXISTS diario_sync (
+                    usuario_id INTEGER, consumo_m3 REAL, total_pagar REAL, fecha TEXT, desde TEXT, hasta TEXT
+                )
             """)
+            conn.execute("DELETE FROM diario_sync")
+            conn.executemany("INSERT INTO diario_sync VALUES (?, ?, ?, ?, ?, ?)", (
+                (u, c, t, f) + DiarioLecturas._limites(periodo)
+                for (u, periodo), (_, c, t, f) in por_periodo.items()
+            ))
+            # Lecturas de contador que ya existen en la base para el mismo cliente y mes; un cargo
+            # de tarifa fija del mes no es una lectura y no bloquea la del diario
+            en_base = {}
+            for r in conn.execute("""
+                SELECT d.usuario_id, d.desde, d.consumo_m3, l.consumo_m3 AS consumo_bd
+                FROM diario_sync d
+                JOIN lecturas_agua l
+                  ON l.usuario_id = d.usuario_id AND l.fecha >= d.desde AND l.fecha < d.hasta
+                 AND l.tipo = 'Contador'
+            """):
+                en_base.setdefault((r["usuario_id"], r["desde"][:7], r["consumo_m3"]), []).append(r["consumo_bd"])
+            for (usuario_id, periodo, consumo), existentes in en_base.items():
+                if consumo in existentes:
+                    resumen["duplicadas"] += 1
+                else:
+                    resumen["conflictos"].append((usuario_id, periodo, "Base: " + ", ".join(
+                        f"{c:g} m³" for c in existentes) + f"; diario: {consumo:g} m³ (no se importó)"))
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS ciudadanos_ornato (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL,
-                    dpi TEXT UNIQUE NOT NULL,
-                    nit TEXT,
-                    salario REAL NOT NULL
-                );
+                DELETE FROM diario_sync WHERE EXISTS (
+                    SELECT 1 FROM lecturas_agua l
+                    WHERE l.usuario_id = diario_sync.usuario_id
+                      AND l.fecha >= diario_sync.desde AND l.fecha < diario_sync.hasta
+                      AND l.tipo = 'Contador'
+                )
             """)
+            resumen["insertadas"] = conn.execute("""
+                INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado)
+                SELECT usuario_id, consumo_m3, total_pagar, fecha, 0 FROM diario_sync
+            """).rowcount
+            conn.execute("DROP TABLE diario_sync")
+
+        base = os.path.splitext(ruta)[0]
+        sello = datetime.now().strftime("%Y%m%d-%H%M%S")
+        resumen["archivo"] = f"{base}.sincronizado-{sello}.jsonl"
+        os.replace(ruta, resumen["archivo"])
+        # Las rechazadas vuelven al diario tal como estaban para corregirlas y sincronizar de nuevo
+        if devueltas:
+            with open(ruta, "a", encoding="utf-8") as f:
+                for entrada in devueltas:
+                    f.write((entrada if isinstance(entrada, str) else json.dumps(entrada, ensure_ascii=False)) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        if resumen["conflictos"] or resumen["rechazadas"]:
+            resumen["reporte"] = f"{base}.conflictos-{sello}.csv"
+            with open(resumen["reporte"], "w", encoding="utf-8", newline="") as f:
+                reporte = csv.writer(f)
+                reporte.writerow(["usuario_id", "periodo", "detalle"])
+                reporte.writerows(resumen["conflictos"])
+                reporte.writerows(("", "", f"Línea {n}: {motivo}") for n, motivo in resumen["rechazadas"])
+        return resumen
+
+class DetectorConsumo:
+    UMBRAL_DEFECTO = 3.0
+    MIN_LECTURAS = 4
+    # Piso de la varianza (1 m³ de desviación) para clientes con consumo casi constante
+    VARIANZA_MINIMA = 1.0
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS boletas_ornato (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ciudadano_id INTEGER NOT NULL,
-                    monto REAL NOT NULL,
-                    con_multa INTEGER DEFAULT 0,
-                    fecha_pago TEXT,
-                    anio INTEGER,
-                    FOREIGN KEY (ciudadano_id) REFERENCES ciudadanos_ornato(id)
-                );
-            """)
+    @staticmethod
+    def sql_media_varianza(n, suma, cuadrados):
+        media = f"({suma} * 1.0 / {n})"
+        varianza = (f"MAX(({cuadrados} - {suma} * {suma} * 1.0 / {n}) / ({n} - 1), "
+                    f"{DetectorConsumo.VARIANZA_MINIMA})")
+        return media, varianza
 
-            conn.commit()
+    @staticmethod
+    def umbral(conn):
+        fila = conn.execute("SELECT valor FROM configuracion WHERE clave = 'umbral_anomalia'").fetchone()
+        return float(fila["valor"]) if fila else DetectorConsumo.UMBRAL_DEFECTO
+
+    @staticmethod
+    def fijar_umbral(conn, valor):
+        if valor <= 0:
+            raise ValueError("El umbral debe ser mayor que cero")
+        conn.execute("""
+            INSERT INTO configuracion (clave, valor) VALUES ('umbral_anomalia', ?)
+            ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+        """, (str(valor),))
+
+    @staticmethod
+    def reconstruir(conn):
+        conn.execute("DELETE FROM estadisticas_consumo")
+        conn.execute("""
+            INSERT INTO estadisticas_consumo (usuario_id, lecturas, suma, suma_cuadrados)
+            SELECT usuario_id, COUNT(*), SUM(consumo_m3), SUM(consumo_m3 * consumo_m3)
+            FROM lecturas_agua
+            WHERE tipo = 'Contador' AND consumo_m3 IS NOT NULL AND usuario_id IS NOT NULL
+            GROUP BY usuario_id
+        """)
+
+    @staticmethod
+    def revisar(conn, umbral=None):
+        # Revisión masiva en una sola pasada: cada lectura se compara con la estadística de las
+        # demás lecturas de su cliente (se excluye a sí misma para que un valor atípico no se esconda)
+        umbral = umbral if umbral is not None else DetectorConsumo.umbral(conn)
+        media, varianza = DetectorConsumo.sql_media_varianza(
+            "(e.lecturas - 1)", "(e.suma - l.consumo_m3)", "(e.suma_cuadrados - l.consumo_m3 * l.consumo_m3)")
+        with DatabaseManager.transaccion(conn):
+            DetectorConsumo.reconstruir(conn)
+            marcadas = conn.execute(f"""
+                INSERT INTO anomalias_consumo (lectura_id, usuario_id, consumo, media, varianza, origen)
+                SELECT l.id, l.usuario_id, l.consumo_m3, {media}, {varianza}, 'revision'
+                FROM lecturas_agua l
+                JOIN estadisticas_consumo e ON e.usuario_id = l.usuario_id
+                WHERE l.tipo = 'Contador' AND l.consumo_m3 IS NOT NULL
+                  AND e.lecturas - 1 >= ?
+                  AND (l.consumo_m3 - {media}) * (l.consumo_m3 - {media}) > ? * ? * {varianza}
+                ON CONFLICT(lectura_id) DO NOTHING
+            """, (DetectorConsumo.MIN_LECTURAS, umbral, umbral)).rowcount
+        return marcadas
+
+    @staticmethod
+    def puntaje(anomalia):
+        return (anomalia["consumo"] - anomalia["media"]) / anomalia["varianza"] ** 0.5
+
+    @staticmethod
+    def pendientes(conn):
+        return conn.execute(CONSULTAS_CRITICAS["agua_anomalias_pendientes"]).fetchall()
+
+    @staticmethod
+    def marcar_revisadas(conn, lecturas):
+        conn.executemany("UPDATE anomalias_consumo SET revisada = 1 WHERE lectura_id = ?",
+                         [(lectura_id,) for lectura_id in lecturas])
+
+# Una rama del autocompletado: prefijo sobre una columna indexada, solo clientes con contador
+_SQL_RAMA_MEDIDOR = """
+    SELECT * FROM (
+        SELECT id, nombre, dpi, numero_casa FROM usuarios_registrados
+        WHERE {col} >= ?{cot} AND {col} < ?{cot} AND (contador = 'Sí' OR contador = 'si')
+        ORDER BY {col}{cot} LIMIT ?
+    )
+"""
+
+class BuscadorMedidores:
+    # Autocompletado de clientes con contador por prefijo de nombre, DPI o número de casa;
+    # cada rama queda acotada por su índice y por el límite
+    LIMITE = 10
+    SQL = "UNION".join(_SQL_RAMA_MEDIDOR.format(col=col, cot=cot) for col, cot in (
+        ("nombre", " COLLATE NOCASE"), ("dpi", ""), ("numero_casa", ""))) + """
+        ORDER BY nombre COLLATE NOCASE LIMIT ?
+    """
+
+    @staticmethod
+    def buscar(conn, texto, limite=None):
+        texto = texto.strip()
+        if not texto:
+            return []
+        limite = limite or BuscadorMedidores.LIMITE
+        # Rango [texto, texto + U+10FFFF): búsqueda por prefijo que sí usa el índice
+        rango = (texto, texto + "\U0010ffff", limite)
+        return conn.execute(BuscadorMedidores.SQL, rango * 3 + (limite,)).fetchall()
+
+    @staticmethod
+    def texto(cliente):
+        return f"{cliente['id']} - {cliente['nombre']} ({cliente['dpi']})"
+
+CONSULTAS_CRITICAS["lector_buscar_medidor"] = BuscadorMedidores.SQL
+
+# Aviso a una multa: al tercer aviso se suma la mora y el contador vuelve a cero
+_SQL_AVISO = """
+    UPDATE multas SET
+        monto = monto + CASE WHEN avisos + 1 >= 3 THEN 10 ELSE 0 END,
+        avisos = CASE WHEN avisos + 1 >= 3 THEN 0 ELSE avisos + 1 END
+"""
+
+class RepositorioMultas:
+    # Acceso compartido a la tabla multas para todas las vistas de multas. Las lecturas son
+    # páginas filtradas y ordenadas en SQL; las filas leídas quedan en caché por id. Las escrituras
+    # pasan por aquí y cada vista suscrita actualiza solo la fila afectada.
+    # configuracion.version_multas, que suben los triggers, delata cambios hechos por otra terminal.
+    # Solo columnas con índice propio (ver migración 17): el orden sale del índice
+    COLUMNAS_ORDEN = ("id", "nombre_completo", "monto", "fecha_creacion")
+    COLUMNAS_NULAS = ("fecha_creacion",)
+
+    def __init__(self):
+        self._filas = {}
+        self._version = None
+        self._vistas = []
+        self._candado = threading.Lock()
+
+    @staticmethod
+    def _version_bd(conn):
+        return int(conn.execute(CONSULTAS_CRITICAS["multas_version"]).fetchone()["valor"])
+
+    @staticmethod
+    def _filtro(filtros):
+        # filtros: estado, tipo_multa, creado_por (exactos), dpi (prefijo), desde/hasta (AAAA-MM-DD)
+        condiciones, params = [], []
+        for columna in ("estado", "tipo_multa", "creado_por"):
+            if filtros.get(columna):
+                condiciones.append(f"{columna} = ?")
+                params.append(filtros[columna])
+        if filtros.get("dpi"):
+            condiciones.append("dpi >= ? AND dpi < ?")
+            params += [filtros["dpi"], filtros["dpi"] + "\U0010ffff"]
+        if filtros.get("desde"):
+            condiciones.append("fecha_creacion >= ?")
+            params.append(filtros["desde"])
+        if filtros.get("hasta"):
+            condiciones.append("fecha_creacion < ?")
+            params.append((date.fromisoformat(filtros["hasta"]) + timedelta(days=1)).isoformat())
+        return " AND ".join(condiciones) or "1=1", params
+
+    def paginador(self, filtros=None, orden="fecha_creacion", descendente=True):
+        if orden not in self.COLUMNAS_ORDEN:
+            raise ValueError(f"Columna de orden no válida: {orden}")
+        where, params = self._filtro(filtros or {})
+        return PaginadorLlave("*", "FROM multas", where, params, columna=None if orden == "id" else orden,
+                              descendente=descendente, nulos=orden in self.COLUMNAS_NULAS)
+
+    def buscar(self, conn, paginador, despues_de=None, limite=100):
+        # Se llama desde el hilo de ejecutor_bd
+        version = self._version_bd(conn)
+        filas = paginador.pagina(conn, despues_de, limite)
+        with self._candado:
+            # Una lectura anterior a la última escritura no pisa el caché
+            if self._version is not None and version < self._version:
+                return filas
+            if version != self._version:
+                self._filas.clear()
+                self._version = version
+            self._filas.update((f["id"], f) for f in filas)
+        return filas
+
+    def _despachar(self, trabajo, widget=None, al_terminar=None, al_fallar=None):
+        # trabajo(conn) devuelve (resultado, eventos) y actualiza el caché en su propio hilo.
+        # Sin widget (línea de comandos, pruebas) corre aquí y devuelve el resultado. Con widget
+        # va a ejecutor_bd; los eventos llegan a las vistas en el hilo de Tk aunque la ventana
+        # que pidió la escritura ya se haya cerrado, y al_terminar solo si sigue abierta.
+        if widget is None:
+            with DatabaseManager.connect() as conn:
+                resultado, eventos = trabajo(conn)
+            for evento in eventos:
+                self._notificar(*evento)
+            return resultado
+
+        def vigente():
+            try:
+                return bool(widget.winfo_exists())
+            except tk.TclError:
+                return False
+
+        def terminado(respuesta):
+            resultado, eventos = respuesta
+            for evento in eventos:
+                self._notificar(*evento)
+            if al_terminar and vigente():
+                al_terminar(resultado)
+
+        def fallado(error):
+            if al_fallar and vigente():
+                al_fallar(error)
+            else:
+                messagebox.showerror("Error", f"Error en la base de datos: {error}")
+
+        ejecutor_bd.enviar(widget._root(), trabajo, terminado, fallado)
+
+    def refrescar(self, widget=None):
+        # Si alguien cambió la tabla desde la última lectura, cada vista vuelve a pedir sus filas
+        def trabajo(conn):
+            version = self._version_bd(conn)
+            with self._candado:
+                if self._version is not None and version == self._version:
+                    return False, []
+                self._filas.clear()
+                self._version = None
+            return True, [("recarga",)]
+
+        return self._despachar(trabajo, widget)
+
+    def obtener(self, multa_id):
+        with self._candado:
+            return self._filas.get(int(multa_id))
+
+    @staticmethod
+    def tipos_y_autores(conn):
+        tipos = sorted(Tarifario.montos(Tarifario.tablas(conn), "multa"))
+        autores = [r[0] for r in conn.execute(
+            "SELECT DISTINCT creado_por FROM multas WHERE creado_por IS NOT NULL ORDER BY creado_por")]
+        return tipos, autores
+
+    def _escribir(self, sql, params, multa_id=None, **envio):
+        # Un parámetro puede ser una función de la conexión (p. ej. el monto según la tarifa vigente);
+        # se evalúa dentro del trabajo, en la misma transacción que la escritura
+        nueva = multa_id is None
+
+        def trabajo(conn):
+            with DatabaseManager.transaccion(conn):
+                valores = tuple(v(conn) if callable(v) else v for v in params)
+                antes = self._version_bd(conn)
+                anterior = None if nueva else conn.execute(CONSULTAS_CRITICAS["multas_por_id"], (multa_id,)).fetchone()
+                cursor = conn.execute(sql, valores)
+                fila_id = multa_id or cursor.lastrowid
+                fila = conn.execute(CONSULTAS_CRITICAS["multas_por_id"], (fila_id,)).fetchone()
+                despues = self._version_bd(conn)
+            with self._candado:
+                # Si entre medio cambió algo más, el caché queda viejo y la próxima lectura recarga todo
+                self._version = despues if antes == self._version and despues == antes + cursor.rowcount else None
+                if fila is None:
+                    self._filas.pop(fila_id, None)
+                else:
+                    self._filas[fila_id] = fila
+            for multa in (anterior, fila):
+                if multa is not None:
+                    ConsultaCiudadano.olvidar(multa["dpi"])
+            if fila is None:
+                return None, [("baja", fila_id, anterior)]
+            return fila, [("alta" if nueva else "cambio", fila_id, fila)]
+
+        return self._despachar(trabajo, **envio)
+
+    def crear(self, nombre, dpi, tipo, detalle, monto, creado_por, fecha, **envio):
+        return self._escribir("""
+            INSERT INTO multas (nombre_completo, dpi, tipo_multa, detalle_otro, monto, estado, creado_por, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, 'Vigente', ?, ?)
+        """, (nombre, dpi, tipo, detalle, monto, creado_por, fecha), **envio)
+
+    def actualizar(self, multa_id, widget=None, al_terminar=None, al_fallar=None, **campos):
+        asignaciones = ", ".join(f"{columna} = ?" for columna in campos)
+        return self._escribir(f"UPDATE multas SET {asignaciones} WHERE id = ?",
+                              tuple(campos.values()) + (multa_id,), multa_id,
+                              widget=widget, al_terminar=al_terminar, al_fallar=al_fallar)
+
+    def eliminar(self, multa_id, **envio):
+        return self._escribir("DELETE FROM multas WHERE id = ?", (multa_id,), multa_id, **envio)
+
+    def aviso(self, multa_id, **envio):
+        return self._escribir(_SQL_AVISO + " WHERE id = ?", (multa_id,), multa_id, **envio)
+
+    def ronda_avisos(self, dias=30, estado="Vigente", simular=False, **envio):
+        # Aviso a todas las multas con ese estado y más de 'dias' de antigüedad en un solo UPDATE;
+        # RETURNING trae las filas ya actualizadas para el resumen y para el caché
+        corte = (datetime.now() - timedelta(days=dias)).isoformat(sep=" ", timespec="seconds")
+
+        def trabajo(conn):
+            if simular:
+                return {"avisadas": conn.execute(CONSULTAS_CRITICAS["multas_ronda_avisos"],
+                                                 (estado, corte)).fetchone()[0],
+                        "moras": None, "mora_total": None, "corte": corte}, []
+            with DatabaseManager.transaccion(conn):
+                antes = self._version_bd(conn)
+                filas = conn.execute(_SQL_AVISO + " WHERE estado = ? AND fecha_creacion <= ? RETURNING *",
+                                     (estado, corte)).fetchall()
+                despues = self._version_bd(conn)
+            with self._candado:
+                self._version = despues if antes == self._version and despues == antes + len(filas) else None
+                en_cache = [f for f in filas if f["id"] in self._filas]
+                self._filas.update((f["id"], f) for f in en_cache)
+            for dpi in {f["dpi"] for f in filas}:
+                ConsultaCiudadano.olvidar(dpi)
+            moras = sum(1 for f in filas if f["avisos"] == 0)
+            return ({"avisadas": len(filas), "moras": moras, "mora_total": moras * 10.0, "corte": corte},
+                    [("cambio", f["id"], f) for f in en_cache])
+
+        return self._despachar(trabajo, **envio)
+
+    @staticmethod
+    def valores_registro(r):
+        return (r["id"], r["nombre_completo"], r["dpi"], r["tipo_multa"], r["detalle_otro"], r["monto"],
+                r["estado"], r["creado_por"], r["fecha_creacion"])
+
+    @staticmethod
+    def valores_avisos(r):
+        return (r["id"], r["nombre_completo"], r["dpi"], r["tipo_multa"], r["detalle_otro"], r["estado"],
+                r["creado_por"], r["fecha_creacion"], r["avisos"], r["monto"])
+
+    def suscribir(self, vista):
+        # vista: recargar(), alta(id, fila), reemplazar(id, fila), quitar(id, fila) y vigente(); queda
+        # suscrita hasta que su Treeview se destruye. En una baja, fila es la multa tal como estaba
+        self._vistas.append(vista)
+
+    def _notificar(self, evento, multa_id=None, fila=None):
+        self._vistas = [v for v in self._vistas if v.vigente()]
+        for vista in self._vistas:
+            if evento == "recarga":
+                vista.recargar()
+            elif evento == "alta":
+                vista.alta(multa_id, fila)
+            elif evento == "cambio":
+                vista.reemplazar(multa_id, fila)
+            elif evento == "baja":
+                vista.quitar(multa_id, fila)
+
+repositorio_multas = RepositorioMultas()
+
+_registrar_paginador("multas_navegador", repositorio_multas.paginador())
+_registrar_paginador("multas_navegador_dpi", repositorio_multas.paginador({"dpi": "1"}))
+_registrar_paginador("multas_navegador_tipo",
+                     repositorio_multas.paginador({"tipo_multa": "Otro", "desde": "2024-01-01"}))
+_registrar_paginador("multas_navegador_nombre",
+                     repositorio_multas.paginador(orden="nombre_completo", descendente=False))
+_registrar_paginador("multas_navegador_monto", repositorio_multas.paginador({"estado": "Vigente"}, orden="monto"))
+
+class ConsultaCiudadano:
+    # Estado de cuenta de una persona por DPI en agua, ornato y multas. Cada parte es una consulta
+    # indexada; las tres se leen en una sola transacción de lectura para que cuadren entre sí.
+    # Las consultas repetidas dentro de TTL segundos (una visita a ventanilla) salen del caché.
+    # _generacion sube con cada olvidar(): un resultado leído antes de una escritura no se guarda.
+    TTL = 30
+    _candado = threading.Lock()
+    _cache = {}
+    _generacion = 0
+
+    @staticmethod
+    def agua(conn, dpi, hoy=None):
+        cuentas = []
+        for f in conn.execute(CONSULTAS_CRITICAS["ciudadano_agua"], (dpi,)):
+            lecturas, consumo, mora, total = SaldosAgua.desglose(f if f["usuario_id"] is not None else None, hoy)
+            cuentas.append({"id": f["id"], "nombre": f["nombre"], "numero_casa": f["numero_casa"],
+                            "lecturas": lecturas, "consumo": consumo, "mora": mora, "total": total})
+        return cuentas
+
+    @staticmethod
+    def ornato(conn, dpi, hoy=None):
+        hoy = hoy or date.today()
+        f = conn.execute(CONSULTAS_CRITICAS["ciudadano_ornato"], (hoy.year, dpi)).fetchone()
+        if f is None:
+            return None
+        pagado = bool(f["pagado"])
+        # Si no ha pagado se cobra con la tarifa de hoy (con multa después de febrero)
+        monto = f["monto_boleta"] if pagado else Ornato.monto(Tarifario.tablas(conn), f["salario"], hoy)
+        return {"id": f["id"], "nombre": f["nombre"], "anio": hoy.year, "pagado": pagado, "monto": monto,
+                "fecha_pago": f["fecha_pago"]}
+
+    @staticmethod
+    def multas(conn, dpi):
+        return conn.execute(CONSULTAS_CRITICAS["ciudadano_multas"], (dpi,)).fetchall()
+
+    @staticmethod
+    def _armar(dpi, agua, ornato, multas):
+        nombres = [c["nombre"] for c in agua] + ([ornato["nombre"]] if ornato else []) + \
+                  [m["nombre_completo"] for m in multas]
+        pendiente = (sum(c["total"] for c in agua) + sum(m["monto"] for m in multas)
+                     + (ornato["monto"] if ornato and not ornato["pagado"] else 0))
+        return {"dpi": dpi, "nombre": nombres[0] if nombres else None, "agua": agua, "ornato": ornato,
+                "multas": multas, "total": pendiente}
+
+    @staticmethod
+    def _del_cache(dpi):
+        with ConsultaCiudadano._candado:
+            entrada = ConsultaCiudadano._cache.get((DB_NAME, dpi))
+        if entrada and time.monotonic() - entrada[0] < ConsultaCiudadano.TTL:
+            return entrada[1]
+        return None
+
+    @staticmethod
+    def generacion():
+        with ConsultaCiudadano._candado:
+            return ConsultaCiudadano._generacion
+
+    @staticmethod
+    def _guardar(dpi, resultado, generacion):
+        with ConsultaCiudadano._candado:
+            if generacion != ConsultaCiudadano._generacion:
+                return
+            ahora = time.monotonic()
+            vencidas = [k for k, (t, _) in ConsultaCiudadano._cache.items() if ahora - t >= ConsultaCiudadano.TTL]
+            for clave in vencidas:
+                del ConsultaCiudadano._cache[clave]
+            ConsultaCiudadano._cache[(DB_NAME, dpi)] = (ahora, resultado)
+
+    @staticmethod
+    def olvidar(dpi=None):
+        with ConsultaCiudadano._candado:
+            ConsultaCiudadano._generacion += 1
+            if dpi is None:
+                ConsultaCiudadano._cache.clear()
+            else:
+                ConsultaCiudadano._cache.pop((DB_NAME, dpi), None)
+
+    @staticmethod
+    def leer(conn, dpi):
+        # Las tres partes en una misma instantánea (en WAL, una transacción de lectura)
+        propia = not conn.in_transaction
+        if propia:
+            conn.execute("BEGIN")
+        try:
+            return ConsultaCiudadano._armar(dpi, ConsultaCiudadano.agua(conn, dpi),
+                                            ConsultaCiudadano.ornato(conn, dpi),
+                                            ConsultaCiudadano.multas(conn, dpi))
+        finally:
+            if propia:
+                conn.rollback()
+
+    @staticmethod
+    def estado_cuenta(conn, dpi, forzar=False):
+        # Versión síncrona (línea de comandos)
+        resultado = None if forzar else ConsultaCiudadano._del_cache(dpi)
+        if resultado is None:
+            generacion = ConsultaCiudadano.generacion()
+            resultado = ConsultaCiudadano.leer(conn, dpi)
+            ConsultaCiudadano._guardar(dpi, resultado, generacion)
+        return resultado
+
+    @staticmethod
+    def consultar(widget, dpi, al_terminar, al_fallar=None, forzar=False):
+        # Un solo trabajo del ejecutor; al_terminar recibe el estado de cuenta en el hilo de Tk
+        resultado = None if forzar else ConsultaCiudadano._del_cache(dpi)
+        if resultado is not None:
+            al_terminar(resultado)
+            return
+        generacion = ConsultaCiudadano.generacion()
+
+        def recibir(resultado):
+            ConsultaCiudadano._guardar(dpi, resultado, generacion)
+            al_terminar(resultado)
+
+        ejecutor_bd.enviar(widget, lambda conn: ConsultaCiudadano.leer(conn, dpi), recibir, al_fallar)
 
 class Usuario:
     def __init__(self, tipo_usuario, contrasena):
@@ -117,13 +2153,6 @@ class Usuario:
 
     def guardar(self):
         with DatabaseManager.connect() as conn:
-            conn.execute(f"""
-                CREATE TABLE IF NOT EXISTS {self.tabla} (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tipo_usuario TEXT NOT NULL,
-                    contrasena TEXT NOT NULL
-                );
-            """)
             conn.execute(
                 f"INSERT INTO {self.tabla} (tipo_usuario, contrasena) VALUES (?, ?)",
                 (self.tipo_usuario, self.contrasena)
@@ -133,31 +2162,12 @@ class Usuario:
     @classmethod
     def verificar_usuario(cls, contrasena):
         with DatabaseManager.connect() as conn:
-            conn.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {cls.__name__.lower()} (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        tipo_usuario TEXT NOT NULL,
-                        contrasena TEXT NOT NULL
-                    );
-                """)
             cursor = conn.execute(
                 f"SELECT * FROM {cls.__name__.lower()} WHERE contrasena = ?",
                 (contrasena,)
             )
             return cursor.fetchone() is not None
 
-# usuarios predeterminados
-def inicializar_usuarios():
-    usuarios = [
-        (Administrador, "123"),
-        (LectorAgua, "456"),
-        (Cocodes, "789"),
-        (LectorMultas, "012")
-    ]
-    for clase, contrasena in usuarios:
-        if not clase.verificar_usuario(contrasena):
-            clase(clase.__name__, contrasena).guardar()
-
 class Administrador(Usuario):
     pass
 
@@ -304,6 +2314,553 @@ class Graficos:
         elif tipo == "LectorAgua":
             LectorAguaPanel(self.ventana, self, usuario=tipo, header_bg="#008081")
 #admin panel
+class EspejoTree:
+    # Refresco por diferencias de un Treeview cuyos iid son ids de la base. Recuerda los valores
+    # que muestra cada ítem y solo inserta, actualiza, mueve o borra los que cambiaron, así la
+    # selección, el foco y el desplazamiento se conservan.
+    def __init__(self, tree):
+        self.tree = tree
+        self.valores = {}
+        # Ítems que quedaron después de la última sincronización con podar=False, para que el
+        # lote siguiente (desde donde terminó ese) no vuelva a leer ni indexar todo el Treeview
+        self._resto = None
+
+    def sincronizar(self, items, desde=0, podar=True):
+        # items: [(iid, valores)] en el orden en que deben quedar a partir de la posición desde;
+        # podar borra los ítems que no vienen. Devuelve cuántos ítems tocó.
+        items = [(str(iid), tuple(valores)) for iid, valores in items]
+        tocados = 0
+        if podar:
+            nuevos = {iid for iid, _ in items}
+            sobrantes = [iid for iid in self.tree.get_children() if iid not in nuevos]
+            if sobrantes:
+                self.tree.delete(*sobrantes)
+                for iid in sobrantes:
+                    self.valores.pop(iid, None)
+                tocados += len(sobrantes)
+        if podar or self._resto is None or self._resto[0] != desde:
+            # Los ítems desde 'desde' en adelante, con su índice en esa lista; 'movidos' son los
+            # que ya se llevaron a una posición anterior y se saltan al recorrerla
+            pendientes = self.tree.get_children()[desde:]
+            self._resto = [desde, pendientes, {iid: i for i, iid in enumerate(pendientes)}, 0, set()]
+        _, pendientes, indices, siguiente, movidos = self._resto
+        for posicion, (iid, valores) in enumerate(items, desde):
+            while siguiente < len(pendientes) and pendientes[siguiente] in movidos:
+                siguiente += 1
+            if siguiente < len(pendientes) and pendientes[siguiente] == iid:
+                siguiente += 1
+            elif iid in self.valores:
+                self.tree.move(iid, "", posicion)
+                if indices.get(iid, -1) > siguiente:
+                    movidos.add(iid)
+                tocados += 1
+            else:
+                self.tree.insert("", posicion, iid=iid, values=valores)
+                self.valores[iid] = valores
+                tocados += 1
+                continue
+            if self.valores.get(iid) != valores:
+                self.tree.item(iid, values=valores)
+                self.valores[iid] = valores
+                tocados += 1
+        self._resto = None if podar else [desde + len(items), pendientes, indices, siguiente, movidos]
+        return tocados
+
+    def reemplazar(self, iid, valores):
+        iid, valores = str(iid), tuple(valores)
+        if self.tree.exists(iid) and self.valores.get(iid) != valores:
+            self.tree.item(iid, values=valores)
+            self.valores[iid] = valores
+
+    def recortar(self, cantidad):
+        # Borra los ítems que quedan después de los primeros 'cantidad'
+        self._resto = None
+        sobrantes = self.tree.get_children()[cantidad:]
+        if sobrantes:
+            self.tree.delete(*sobrantes)
+            for iid in sobrantes:
+                self.valores.pop(iid, None)
+
+    def vaciar(self):
+        self._resto = None
+        self.tree.delete(*self.tree.get_children())
+        self.valores.clear()
+
+class ListaVirtual:
+    # Treeview que solo tiene como ítems las filas visibles: el resto se pide a SQLite por páginas,
+    # en el hilo de ejecutor_bd, al desplazarse, con un caché de las últimas páginas leídas.
+    # fuente() se llama en el hilo de Tk en cada recarga (ahí se leen los filtros de la vista) y
+    # devuelve (marcas, pagina) con la forma de PaginadorLlave.marcas y PaginadorLlave.pagina:
+    # cada página se pide por la llave donde termina la anterior, nunca por OFFSET. Puede traer
+    # un tercer elemento con la forma de PaginadorLlave.pagina_de, para que un alta o una baja
+    # relea solo su página (ver ajustar); el último valor de cada marca es la clave de la fila.
+    PAGINA = 200
+    PAGINAS_EN_CACHE = 10
+
+    def __init__(self, tree, scrollbar, fuente, valores, clave=lambda fila: fila["id"], al_cargar=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fuente = fuente
+        self.valores = valores
+        self.clave = clave
+        self.al_cargar = al_cargar
+        self.total = 0
+        self.inicio = 0
+        self.visibles = int(tree.cget("height"))
+        self._cortes = [None]
+        self._inicios = [0]
+        self._leer = None
+        self._pagina_de = None
+        self._contando = False
+        self._recargas = 0
+        self._datos = 0
+        self._paginas = OrderedDict()
+        self._pedidas = set()
+        self._seleccion = set()
+        self.espejo = EspejoTree(tree)
+
+        scrollbar.config(command=self._desplazar)
+        tree.config(yscrollcommand="")
+        tree.bind("<Configure>", self._redimensionar)
+        tree.bind("<<TreeviewSelect>>", self._seleccionar, add="+")
+        for evento in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(evento, self._rueda)
+        for tecla, paso in (("<Up>", -1), ("<Down>", 1)):
+            tree.bind(tecla, lambda e, p=paso: self._mover_foco(p))
+        for tecla, direccion in (("<Prior>", -1), ("<Next>", 1)):
+            tree.bind(tecla, lambda e, d=direccion: self._mover_foco(d * self.visibles))
+
+    def vigente(self):
+        try:
+            return bool(self.tree.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def recargar(self, al_inicio=False):
+        # La primera página se lee por llave y se muestra en cuanto llega; el total y las marcas
+        # para saltar a cualquier posición se cuentan después. Si la vista estaba más abajo de la
+        # primera página, se siguen viendo las filas anteriores hasta tener las marcas.
+        self._recargas += 1
+        recarga = self._recargas
+        marcas, pagina, *pagina_de = self.fuente()
+        mostrada = False
+        self._contando = True
+
+        def adoptar(primera, total, cortes):
+            self._leer, self._pagina_de = pagina, pagina_de[0] if pagina_de else None
+            self._datos += 1
+            self._paginas.clear()
+            self._pedidas.clear()
+            self._paginas[0] = primera
+            self.total, self._cortes = total, cortes
+            self._inicios = [numero * self.PAGINA for numero in range(len(cortes))]
+            if al_inicio:
+                self.inicio = 0
+                self._seleccion.clear()
+            self._mostrar(self.inicio)
+
+        def contadas(resultado, primera):
+            if recarga != self._recargas:
+                return
+            total, cortes = resultado
+            if mostrada:
+                self.total, self._cortes = total, cortes
+                self._inicios = [numero * self.PAGINA for numero in range(len(cortes))]
+                self._mostrar(self.inicio)
+            else:
+                adoptar(primera, total, cortes)
+            self._contando = False
+            if self.al_cargar:
+                self.al_cargar(self.total)
+
+        def leida(primera):
+            nonlocal mostrada
+            if recarga != self._recargas:
+                return
+            if len(primera) < self.PAGINA:
+                # Todo cupo en una página: ya se sabe el total sin contar nada más
+                contadas((len(primera), [None]), primera)
+                return
+            if al_inicio or self.inicio + self.visibles <= len(primera):
+                adoptar(primera, len(primera), [None])
+                mostrada = True
+            ejecutor_bd.enviar(self.tree, lambda conn: marcas(conn, self.PAGINA),
+                               lambda resultado: contadas(resultado, primera))
+
+        ejecutor_bd.enviar(self.tree, lambda conn: pagina(conn, None, self.PAGINA), leida)
+
+    def reemplazar(self, clave, fila):
+        for filas in self._paginas.values():
+            for i, f in enumerate(filas):
+                if self.clave(f) == clave:
+                    filas[i] = fila
+        self.espejo.reemplazar(clave, self.valores(fila))
+
+    def alta(self, clave, fila):
+        self.ajustar(fila)
+
+    def quitar(self, clave, fila=None):
+        self._seleccion.discard(str(clave))
+        self.ajustar(fila)
+
+    def ajustar(self, fila):
+        # Una fila entró o salió de la consulta: en vez de volver a contar todo se relee por llave
+        # la página donde cae, hasta la marca de la siguiente, y las páginas de después se corren.
+        # Si la página no se puede ubicar (o se borró justo la fila de una marca) se recarga todo.
+        numero = None
+        if fila is not None and self._pagina_de and not self._contando:
+            numero = self._pagina_de(self._cortes, fila)
+        if numero is None:
+            self.recargar()
+            return
+        recarga, leer, corte = self._recargas, self._leer, self._cortes[numero]
+        siguiente = self._cortes[numero + 1][-1] if numero + 1 < len(self._cortes) else None
+        limite = self._tamano(numero) + self.PAGINA
+
+        def releida(filas):
+            if recarga != self._recargas:
+                return
+            claves = [self.clave(f) for f in filas]
+            if siguiente is not None and siguiente in claves:
+                filas = filas[:claves.index(siguiente) + 1]
+            elif siguiente is not None or len(filas) == limite:
+                self.recargar()
+                return
+            diferencia = len(filas) - self._tamano(numero)
+            for k in range(numero + 1, len(self._inicios)):
+                self._inicios[k] += diferencia
+            self.total += diferencia
+            # Las demás páginas en caché siguen valiendo: solo cambió dónde empiezan
+            self._datos += 1
+            self._pedidas.clear()
+            self._paginas[numero] = filas
+            self._mostrar(self.inicio)
+            if diferencia and self.al_cargar:
+                self.al_cargar(self.total)
+
+        ejecutor_bd.enviar(self.tree, lambda conn: leer(conn, corte, limite), releida)
+
+    def _tamano(self, numero):
+        fin = self._inicios[numero + 1] if numero + 1 < len(self._inicios) else self.total
+        return fin - self._inicios[numero]
+
+    def _pedir(self, numero):
+        if numero in self._pedidas or numero >= len(self._cortes):
+            return
+        self._pedidas.add(numero)
+        datos, leer, corte, limite = self._datos, self._leer, self._cortes[numero], self._tamano(numero)
+
+        def llegada(filas):
+            if datos != self._datos:
+                return
+            self._pedidas.discard(numero)
+            self._paginas[numero] = filas
+            if len(self._paginas) > self.PAGINAS_EN_CACHE:
+                self._paginas.popitem(last=False)
+            self._mostrar(self.inicio)
+
+        def fallo(error):
+            self._pedidas.discard(numero)
+            messagebox.showerror("Error", f"Error en la base de datos: {error}")
+
+        ejecutor_bd.enviar(self.tree, lambda conn: leer(conn, corte, limite), llegada, fallo)
+
+    def _fila(self, indice):
+        # (True, fila) si la página ya está en caché (fila None si la página quedó corta);
+        # (False, None) si todavía hay que pedirla. Tras altas y bajas las páginas ya no miden
+        # todas PAGINA filas: se ubica la página por el índice donde empieza cada una
+        numero = bisect_right(self._inicios, indice) - 1
+        resto = indice - self._inicios[numero]
+        filas = self._paginas.get(numero)
+        if filas is None:
+            self._pedir(numero)
+            return False, None
+        self._paginas.move_to_end(numero)
+        return True, (filas[resto] if resto < len(filas) else None)
+
+    def _mostrar(self, inicio):
+        self.inicio = max(0, min(inicio, self.total - self.visibles))
+        fin = min(self.inicio + self.visibles, self.total)
+        items = {}
+        for indice in range(self.inicio, fin):
+            leida, fila = self._fila(indice)
+            if not leida:
+                # Hueco de la altura de una fila hasta que llegue su página
+                items[f"_{indice}"] = ("…",)
+            elif fila is not None:
+                # Si la tabla cambió entre dos páginas una fila puede repetirse o faltar
+                items.setdefault(str(self.clave(fila)), self.valores(fila))
+        # Al desplazarse una fila o recargar tras una edición solo se tocan los ítems que cambian
+        self.espejo.sincronizar(items.items())
+        seleccion = [iid for iid in self.tree.get_children() if iid in self._seleccion]
+        if set(seleccion) != set(self.tree.selection()):
+            self.tree.selection_set(seleccion)
+        if self.total:
+            self.scrollbar.set(self.inicio / self.total, fin / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _seleccionar(self, event=None):
+        # La selección de filas que no están a la vista se conserva al desplazarse
+        self._seleccion = (self._seleccion - set(self.tree.get_children())) | set(self.tree.selection())
+
+    def _desplazar(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            self._mostrar(int(float(cantidad) * self.total))
+        elif accion == "scroll":
+            self._mostrar(self.inicio + int(cantidad) * (self.visibles if unidad == "pages" else 1))
+
+    def _rueda(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._mostrar(self.inicio - 3)
+        else:
+            self._mostrar(self.inicio + 3)
+        return "break"
+
+    def _mover_foco(self, paso):
+        hijos = self.tree.get_children()
+        if not hijos:
+            return "break"
+        foco = self.tree.focus()
+        actual = self.inicio + (hijos.index(foco) if foco in hijos else 0)
+        destino = max(0, min(actual + paso, self.total - 1))
+        if destino < self.inicio:
+            self._mostrar(destino)
+        elif destino >= self.inicio + len(hijos):
+            self._mostrar(destino - self.visibles + 1)
+        hijos = self.tree.get_children()
+        if hijos:
+            iid = hijos[min(max(destino - self.inicio, 0), len(hijos) - 1)]
+            self._seleccion = {iid}
+            self.tree.focus(iid)
+            self.tree.selection_set(iid)
+        return "break"
+
+    def _redimensionar(self, event):
+        try:
+            alto = int(ttk.Style().lookup("Treeview", "rowheight"))
+        except (TypeError, ValueError):
+            alto = 20
+        # El encabezado ocupa más o menos una fila
+        visibles = max(1, event.height // alto - 1)
+        if visibles != self.visibles:
+            self.visibles = visibles
+            self._mostrar(self.inicio)
+
+class CargadorIncremental:
+    # Llena un Treeview por lotes: un hilo de ejecutor_bd recorre el cursor con fetchmany y deja
+    # los lotes en una cola; el hilo de Tk inserta lo que le alcance en cada tick de after(). La
+    # carga se detiene con cancelar() o sola cuando el Treeview se destruye (al cambiar de panel).
+    # consulta(conn) -> cursor; al_avanzar(cargadas, terminado) permite mostrar el progreso. Con un
+    # EspejoTree (e iid) cada lote se aplica por diferencias sobre las filas que ya estaban a la vista
+    # y al terminar se borran las que sobraron; sin espejo el Treeview se vacía y se llena de nuevo.
+    PRIMER_LOTE = 50
+    LOTE = 500
+    LOTES_EN_COLA = 8
+    INTERVALO_MS = 10
+    PRESUPUESTO_MS = 12
+
+    def __init__(self, tree, consulta, valores, iid=None, al_avanzar=None, espejo=None):
+        self.tree = tree
+        self.consulta = consulta
+        self.valores = valores
+        self.iid = iid
+        self.al_avanzar = al_avanzar
+        self.espejo = espejo
+        self.cargadas = 0
+        self._cancelada = threading.Event()
+        self._cola = queue.Queue(maxsize=self.LOTES_EN_COLA)
+        self._lectura_terminada = False
+        self._raiz = tree._root()
+
+        if espejo is None:
+            tree.delete(*tree.get_children())
+        ejecutor_bd.enviar(tree, self._leer, self._leido, self._fallo)
+        self._raiz.after(self.INTERVALO_MS, self._insertar)
+
+    def cancelar(self):
+        self._cancelada.set()
+
+    def _leer(self, conn):
+        # Hilo del ejecutor: un primer lote chico para que las primeras filas aparezcan enseguida
+        cursor = self.consulta(conn)
+        tamano = self.PRIMER_LOTE
+        try:
+            while not self._cancelada.is_set():
+                lote = cursor.fetchmany(tamano)
+                if not lote:
+                    break
+                while not self._cancelada.is_set():
+                    try:
+                        self._cola.put(lote, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                tamano = self.LOTE
+        finally:
+            cursor.close()
+
+    def _leido(self, _):
+        self._lectura_terminada = True
+
+    def _fallo(self, error):
+        self._lectura_terminada = True
+        messagebox.showerror("Error", f"Error en la base de datos: {error}")
+
+    def _insertar(self):
+        try:
+            vigente = bool(self.tree.winfo_exists())
+        except tk.TclError:
+            vigente = False
+        if not vigente:
+            self.cancelar()
+        if self._cancelada.is_set():
+            return
+        limite = time.perf_counter() + self.PRESUPUESTO_MS / 1000
+        while time.perf_counter() < limite:
+            try:
+                lote = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if self.espejo is not None:
+                self.espejo.sincronizar([(self.iid(f), self.valores(f)) for f in lote], self.cargadas, podar=False)
+            else:
+                for fila in lote:
+                    if self.iid:
+                        self.tree.insert("", "end", iid=self.iid(fila), values=self.valores(fila))
+                    else:
+                        self.tree.insert("", "end", values=self.valores(fila))
+            self.cargadas += len(lote)
+        terminado = self._lectura_terminada and self._cola.empty()
+        if terminado and self.espejo is not None:
+            # Lo que quedó después de las filas cargadas ya no está en el resultado
+            self.espejo.recortar(self.cargadas)
+        if self.al_avanzar:
+            self.al_avanzar(self.cargadas, terminado)
+        if not terminado:
+            self._raiz.after(self.INTERVALO_MS, self._insertar)
+
+class NavegadorMultas:
+    # Filtros y orden por columna de una vista de multas (Treeview ya empacado), mostrada como
+    # ListaVirtual. Todo se resuelve en SQL a través de RepositorioMultas.
+    # Columnas que se pueden ordenar con un clic en el encabezado; las demás se filtran
+    COLUMNAS = {"id": "id", "nombre": "nombre_completo", "monto": "monto", "fecha": "fecha_creacion"}
+    ESTADOS = ["Todos", "Vigente", "Pagada", "Anulada"]
+
+    def __init__(self, parent, tree, valores):
+        self.tree = tree
+        self.orden, self.descendente = "fecha", True
+        self.filtros = {}
+        self.titulos = {col: tree.heading(col, "text") for col in tree["columns"]}
+
+        barra = tk.Frame(parent, bg="#FFFFFF")
+        barra.pack(fill="x", padx=12, before=tree)
+        self.estado_cb = self._combo(barra, "Estado:", self.ESTADOS, 10)
+        self.tipo_cb = self._combo(barra, "Tipo:", ["Todos"], 16)
+        tk.Label(barra, text="DPI:", bg="#FFFFFF", font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        self.dpi_entry = ttk.Entry(barra, width=15)
+        self.dpi_entry.pack(side="left", padx=(0, 10))
+        tk.Label(barra, text="Desde:", bg="#FFFFFF", font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        self.desde_entry = ttk.Entry(barra, width=11)
+        self.desde_entry.pack(side="left", padx=(0, 10))
+        tk.Label(barra, text="Hasta:", bg="#FFFFFF", font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        self.hasta_entry = ttk.Entry(barra, width=11)
+        self.hasta_entry.pack(side="left", padx=(0, 10))
+        self.autor_cb = self._combo(barra, "Creado por:", ["Todos"], 12)
+        ttk.Button(barra, text="🔍 Buscar", command=self.buscar).pack(side="left", padx=4)
+        ttk.Button(barra, text="🧹 Limpiar", command=self.limpiar).pack(side="left", padx=4)
+        for entry in (self.dpi_entry, self.desde_entry, self.hasta_entry):
+            entry.bind("<Return>", lambda e: self.buscar())
+
+        self.total_label = tk.Label(parent, text="", font=("Segoe UI", 10), bg="#FFFFFF", fg="#2D3A4A")
+        self.total_label.pack(side="bottom", fill="x", padx=12, pady=(0, 8), before=tree)
+        scrollbar = ttk.Scrollbar(parent, orient="vertical")
+        scrollbar.pack(side="right", fill="y", pady=12, before=tree)
+
+        for col in tree["columns"]:
+            if col in self.COLUMNAS:
+                tree.heading(col, command=lambda c=col: self.ordenar(c))
+        self.lista = ListaVirtual(tree, scrollbar, self._fuente, valores,
+                                  al_cargar=lambda total: self.total_label.config(text=f"{total} multa(s)"))
+        repositorio_multas.suscribir(self)
+        ejecutor_bd.enviar(tree, RepositorioMultas.tipos_y_autores, self._opciones)
+        self.cargar(al_inicio=True)
+
+    def _opciones(self, datos):
+        tipos, autores = datos
+        self.tipo_cb.configure(values=["Todos"] + tipos)
+        self.autor_cb.configure(values=["Todos"] + autores)
+
+    @staticmethod
+    def _combo(barra, texto, valores, ancho):
+        tk.Label(barra, text=texto, bg="#FFFFFF", font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        cb = ttk.Combobox(barra, values=valores, state="readonly", width=ancho)
+        cb.set(valores[0])
+        cb.pack(side="left", padx=(0, 10))
+        return cb
+
+    def buscar(self):
+        filtros = {
+            "estado": self.estado_cb.get(),
+            "tipo_multa": self.tipo_cb.get(),
+            "creado_por": self.autor_cb.get(),
+            "dpi": self.dpi_entry.get().strip(),
+            "desde": self.desde_entry.get().strip(),
+            "hasta": self.hasta_entry.get().strip(),
+        }
+        filtros = {k: v for k, v in filtros.items() if v and v != "Todos"}
+        try:
+            for clave in ("desde", "hasta"):
+                if clave in filtros:
+                    date.fromisoformat(filtros[clave])
+        except ValueError:
+            messagebox.showwarning("Filtro", "Las fechas deben tener el formato AAAA-MM-DD.")
+            return
+        self.filtros = filtros
+        self.cargar(al_inicio=True)
+
+    def limpiar(self):
+        for cb in (self.estado_cb, self.tipo_cb, self.autor_cb):
+            cb.current(0)
+        for entry in (self.dpi_entry, self.desde_entry, self.hasta_entry):
+            entry.delete(0, "end")
+        self.buscar()
+
+    def ordenar(self, col):
+        # Un clic ordena por la columna; otro clic en la misma invierte el sentido
+        if col == self.orden:
+            self.descendente = not self.descendente
+        else:
+            self.orden, self.descendente = col, col in ("fecha", "monto", "id")
+        self.cargar(al_inicio=True)
+
+    def _fuente(self):
+        paginador = repositorio_multas.paginador(self.filtros, self.COLUMNAS[self.orden], self.descendente)
+        return paginador.marcas, lambda conn, despues_de, limite: repositorio_multas.buscar(
+            conn, paginador, despues_de, limite), paginador.pagina_de
+
+    def cargar(self, al_inicio=False):
+        self.lista.recargar(al_inicio)
+        for col, titulo in self.titulos.items():
+            flecha = (" ▼" if self.descendente else " ▲") if col == self.orden else ""
+            self.tree.heading(col, text=titulo + flecha)
+
+    # Protocolo de RepositorioMultas.suscribir
+    def vigente(self):
+        return self.lista.vigente()
+
+    def recargar(self):
+        self.cargar()
+
+    def alta(self, multa_id, fila):
+        self.lista.alta(multa_id, fila)
+
+    def reemplazar(self, multa_id, fila):
+        self.lista.reemplazar(multa_id, fila)
+
+    def quitar(self, multa_id, fila=None):
+        self.lista.quitar(multa_id, fila)
+
 class AdminPanel:
     def __init__(self, ventana, app, usuario="Administrador", header_bg="#DCE9FF"):
         self.ventana = ventana
@@ -334,6 +2891,7 @@ class AdminPanel:
 
         menu_usuarios = tk.Menu(menu_bar, tearoff=0)
         menu_usuarios.add_command(label="Administrar usuarios", command=self._abrir_panel_usuarios)
+        menu_usuarios.add_command(label="🔎 Estado de cuenta por DPI", command=self._abrir_consulta_dpi)
         menu_bar.add_cascade(label="Usuarios", menu=menu_usuarios)
 
         menu_ornato = tk.Menu(menu_bar, tearoff=0)
@@ -373,6 +2931,92 @@ class AdminPanel:
         tk.Label(self.content, text="Use el submenú para acceder a las opciones de administrador",
                  font=("Segoe UI", 12), bg="#F2F5F9", fg="#58606A").pack()
 
+    def _abrir_consulta_dpi(self):
+        for w in self.content.winfo_children():
+            w.destroy()
+
+        frame = tk.Frame(self.content, bg="#FFFFFF")
+        frame.pack(fill="both", expand=True, padx=18, pady=18)
+
+        barra = tk.Frame(frame, bg="#FFFFFF")
+        barra.pack(fill="x", pady=(0, 10))
+        tk.Label(barra, text="DPI:", font=("Segoe UI", 11), bg="#FFFFFF").pack(side="left", padx=(0, 4))
+        self.consulta_dpi_entry = ttk.Entry(barra, width=25)
+        self.consulta_dpi_entry.pack(side="left", padx=(0, 8))
+        self.consulta_dpi_entry.bind("<Return>", lambda e: self._consultar_dpi())
+        ttk.Button(barra, text="🔍 Consultar", command=self._consultar_dpi).pack(side="left", padx=4)
+        ttk.Button(barra, text="🔄 Actualizar", command=lambda: self._consultar_dpi(forzar=True)).pack(side="left",
+                                                                                                   padx=4)
+
+        self.consulta_titulo = tk.Label(frame, text="Ingrese un DPI para ver lo que adeuda en todos los servicios",
+                                        font=("Segoe UI", 13, "bold"), bg="#FFFFFF", fg="#2D3A4A")
+        self.consulta_titulo.pack(anchor="w", pady=(0, 8))
+
+        caja_agua = tk.LabelFrame(frame, text="💧 Servicio de agua", font=("Segoe UI", 11, "bold"), bg="#FFFFFF")
+        caja_agua.pack(fill="x", pady=6)
+        cols = ("id", "nombre", "casa", "lecturas", "consumo", "mora", "total")
+        self.consulta_agua_tree = ttk.Treeview(caja_agua, columns=cols, show="headings", height=3)
+        for c, t in zip(cols, ["ID", "Nombre", "No. casa", "Lecturas pend.", "Consumo (Q)", "Mora (Q)", "Total (Q)"]):
+            self.consulta_agua_tree.heading(c, text=t)
+            self.consulta_agua_tree.column(c, width=120, anchor="center")
+        self.consulta_agua_tree.pack(fill="x", padx=8, pady=6)
+
+        caja_ornato = tk.LabelFrame(frame, text="🧾 Boleto de ornato", font=("Segoe UI", 11, "bold"), bg="#FFFFFF")
+        caja_ornato.pack(fill="x", pady=6)
+        self.consulta_ornato_label = tk.Label(caja_ornato, text="—", font=("Segoe UI", 11), bg="#FFFFFF",
+                                              anchor="w", justify="left")
+        self.consulta_ornato_label.pack(fill="x", padx=8, pady=6)
+
+        caja_multas = tk.LabelFrame(frame, text="⚖️ Multas vigentes", font=("Segoe UI", 11, "bold"), bg="#FFFFFF")
+        caja_multas.pack(fill="both", expand=True, pady=6)
+        cols = ("id", "tipo", "detalle", "fecha", "avisos", "monto")
+        self.consulta_multas_tree = ttk.Treeview(caja_multas, columns=cols, show="headings", height=5)
+        for c, t in zip(cols, ["ID", "Tipo multa", "Detalle (otro)", "Fecha", "Avisos", "Monto (Q)"]):
+            self.consulta_multas_tree.heading(c, text=t)
+            self.consulta_multas_tree.column(c, width=140, anchor="center")
+        self.consulta_multas_tree.pack(fill="both", expand=True, padx=8, pady=6)
+
+        self.consulta_total_label = tk.Label(frame, text="", font=("Segoe UI", 14, "bold"), bg="#FFFFFF",
+                                             fg="#B03A2E")
+        self.consulta_total_label.pack(anchor="e", pady=(8, 0))
+
+    def _consultar_dpi(self, forzar=False):
+        dpi = self.consulta_dpi_entry.get().strip()
+        if not dpi:
+            messagebox.showwarning("Consulta", "Ingrese un DPI.")
+            return
+        self.consulta_titulo.config(text=f"Consultando DPI {dpi}...")
+        ConsultaCiudadano.consultar(self.consulta_titulo, dpi, self._mostrar_estado_cuenta, forzar=forzar)
+
+    def _mostrar_estado_cuenta(self, r):
+        if not r["agua"] and r["ornato"] is None and not r["multas"]:
+            self.consulta_titulo.config(text=f"DPI {r['dpi']}: no aparece en agua, ornato ni multas")
+        else:
+            self.consulta_titulo.config(text=f"👤 {r['nombre']}  ·  DPI {r['dpi']}")
+
+        self.consulta_agua_tree.delete(*self.consulta_agua_tree.get_children())
+        for c in r["agua"]:
+            self.consulta_agua_tree.insert("", "end", values=(
+                c["id"], c["nombre"], c["numero_casa"], c["lecturas"],
+                f"Q{c['consumo']:.2f}", f"Q{c['mora']:.2f}", f"Q{c['total']:.2f}"))
+
+        o = r["ornato"]
+        if o is None:
+            texto = "No está registrado en el padrón de ornato."
+        elif o["pagado"]:
+            texto = f"✅ Boleto {o['anio']} pagado: Q{o['monto']:.2f} el {o['fecha_pago'] or '—'}"
+        else:
+            texto = f"❌ Boleto {o['anio']} pendiente: Q{o['monto']:.2f}"
+        self.consulta_ornato_label.config(text=texto)
+
+        self.consulta_multas_tree.delete(*self.consulta_multas_tree.get_children())
+        for m in r["multas"]:
+            self.consulta_multas_tree.insert("", "end", values=(
+                m["id"], m["tipo_multa"], m["detalle_otro"] or "—", m["fecha_creacion"], m["avisos"],
+                f"Q{m['monto']:.2f}"))
+
+        self.consulta_total_label.config(text=f"Total pendiente: Q{r['total']:.2f}")
+
     def _abrir_panel_ornato(self):
         for w in self.content.winfo_children():
             w.destroy()
@@ -454,22 +3098,25 @@ class AdminPanel:
             messagebox.showerror("Error", "El salario debe ser un número válido.")
             return
 
-        try:
-            with DatabaseManager.connect() as conn:
+        def registrar(conn):
+            with DatabaseManager.transaccion(conn):
                 conn.execute("""
                     INSERT INTO ciudadanos_ornato (nombre, dpi, nit, salario)
                     VALUES (?, ?, ?, ?)
                 """, (nombre, dpi, nit if nit else None, salario))
-                conn.commit()
 
+        def registrado(_):
             messagebox.showinfo("Éxito", "Ciudadano registrado correctamente ✅")
             self._limpiar_registro_ornato()
             self._cargar_ciudadanos_ornato()
 
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "El DPI ya está registrado.")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo registrar: {e}")
+        def fallo(e):
+            if isinstance(e, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "El DPI ya está registrado.")
+            else:
+                messagebox.showerror("Error", f"No se pudo registrar: {e}")
+
+        ejecutor_bd.enviar(self.e_nombre_orn, registrar, registrado, fallo)
 
     def _build_cobro_ornato(self, parent):
         main_frame = tk.Frame(parent, bg="#FFFFFF", relief="raised", bd=2)
@@ -514,28 +3161,23 @@ class AdminPanel:
             messagebox.showwarning("Atención", "Ingrese un DPI para buscar.")
             return
 
-        with DatabaseManager.connect() as conn:
-            ciud = conn.execute("SELECT * FROM ciudadanos_ornato WHERE dpi = ?", (dpi,)).fetchone()
+        ejecutor_bd.enviar(self.monto_label, lambda conn: (
+            conn.execute(CONSULTAS_CRITICAS["ornato_buscar_dpi"], (dpi,)).fetchone(), Tarifario.tablas(conn)
+        ), self._mostrar_ciudadano_ornato)
 
+    def _mostrar_ciudadano_ornato(self, resultado):
+        ciud, tablas = resultado
         if not ciud:
             messagebox.showwarning("No encontrado", "No se encontró ningún ciudadano con ese DPI.")
             self._limpiar_info_ornato()
             return
 
-        self.ciudadano_actual = ciud
         salario = float(ciud["salario"])
-        con_multa = 1 if datetime.now().month > 2 else 0
-
-        if salario <= 3000:
-            monto = 15 if not con_multa else 30
-        elif salario <= 6000:
-            monto = 50 if not con_multa else 100
-        elif salario <= 9000:
-            monto = 75 if not con_multa else 150
-        elif salario <= 12000:
-            monto = 100 if not con_multa else 200
-        else:
-            monto = 150 if not con_multa else 300
+        con_multa = 1 if Ornato.categoria() == "Con multa" else 0
+        monto = Ornato.monto(tablas, salario)
+        # El monto se cotiza al buscar; el cobro usa el mismo valor que se mostró
+        self.ciudadano_actual = ciud
+        self.monto_actual = monto
 
         self.monto_label.config(
             text=f"💰 Monto a pagar: Q{monto:.2f}\n{'⚠️ Con multa' if con_multa else 'Sin multa'}",
@@ -553,22 +3195,10 @@ class AdminPanel:
             messagebox.showwarning("Atención", "Debe buscar un ciudadano antes de cobrar.")
             return
 
-        salario = float(ciud["salario"])
         anio_actual = datetime.now().year
         fecha_hoy = datetime.now().strftime("%Y-%m-%d")
-        con_multa = 1 if datetime.now().month > 2 else 0
-
-        # Calcular monto
-        if salario <= 3000:
-            monto = 15 if not con_multa else 30
-        elif salario <= 6000:
-            monto = 50 if not con_multa else 100
-        elif salario <= 9000:
-            monto = 75 if not con_multa else 150
-        elif salario <= 12000:
-            monto = 100 if not con_multa else 200
-        else:
-            monto = 150 if not con_multa else 300
+        con_multa = 1 if Ornato.categoria() == "Con multa" else 0
+        monto = self.monto_actual
 
         # Confirmar cobro
         confirmar = messagebox.askyesno(
@@ -578,27 +3208,23 @@ class AdminPanel:
         if not confirmar:
             return
 
-        try:
-            with DatabaseManager.connect() as conn:
-                pago_existente = conn.execute("""
-                    SELECT * FROM boletas_ornato WHERE ciudadano_id=? AND anio=?
-                """, (ciud["id"], anio_actual)).fetchone()
-
-                if pago_existente:
-                    messagebox.showwarning("Aviso", f"El ciudadano ya pagó la boleta del año {anio_actual}.")
-                    return
+        def cobrar(conn):
+            with DatabaseManager.transaccion(conn):
+                return Ornato.cobrar(conn, ciud["id"], anio_actual, monto, con_multa, fecha_hoy)
 
-                conn.execute("""
-                    INSERT INTO boletas_ornato (ciudadano_id, monto, con_multa, fecha_pago, anio)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (ciud["id"], monto, con_multa, fecha_hoy, anio_actual))
-                conn.commit()
+        def cobrada(cobrado):
+            ConsultaCiudadano.olvidar(ciud["dpi"])
+            if not cobrado:
+                messagebox.showwarning("Aviso", f"El ciudadano ya pagó la boleta del año {anio_actual}.")
+                return
 
             messagebox.showinfo("Pago registrado", f"✅ Boleta pagada correctamente.\nMonto: Q{monto:.2f}")
             self.btn_pagar_boleta.config(state="disabled")
 
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo registrar el pago: {e}")
+        self.btn_pagar_boleta.config(state="disabled")
+        ejecutor_bd.enviar(self.btn_pagar_boleta, cobrar, cobrada,
+                           lambda e: (self.btn_pagar_boleta.config(state="normal"),
+                                      messagebox.showerror("Error", f"No se pudo registrar el pago: {e}")))
 
     def _limpiar_busqueda_ornato(self):
         self.e_buscar_dpi_orn.delete(0, tk.END)
@@ -614,55 +3240,100 @@ class AdminPanel:
         frame = tk.Frame(parent, bg="#FFFFFF")
         frame.pack(fill="both", expand=True, padx=15, pady=15)
 
-        ttk.Button(frame, text="🔄 Refrescar lista", command=self._cargar_ciudadanos_ornato).pack(pady=10)
-
-        cols = ("id", "nombre", "dpi", "nit", "salario", "estado")
+        filtros = tk.Frame(frame, bg="#FFFFFF")
+        filtros.pack(fill="x", pady=10)
+
+        tk.Label(filtros, text="Estado:", bg="#FFFFFF", font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        self.orn_filtro_estado = ttk.Combobox(filtros, values=["Todos", "✅ Pagó", "❌ No ha pagado"],
+                                              state="readonly", width=16)
+        self.orn_filtro_estado.set("Todos")
+        self.orn_filtro_estado.pack(side="left", padx=(0, 12))
+
+        # Los tramos llegan del ejecutor; mientras tanto el filtro solo ofrece "Todos"
+        self.orn_tramos = []
+        tk.Label(filtros, text="Salario:", bg="#FFFFFF", font=("Segoe UI", 10)).pack(side="left", padx=(0, 4))
+        self.orn_filtro_tramo = ttk.Combobox(filtros, values=["Todos"], state="readonly", width=18)
+        self.orn_filtro_tramo.set("Todos")
+        self.orn_filtro_tramo.pack(side="left", padx=(0, 12))
+
+        def tramos(resultado):
+            self.orn_tramos = resultado
+            self.orn_filtro_tramo.config(values=["Todos"] + [
+                f"Hasta Q{hasta:g}" if mayor_que is None else
+                f"Más de Q{mayor_que:g}" if hasta is None else f"Q{mayor_que:g} – Q{hasta:g}"
+                for mayor_que, hasta in resultado
+            ])
+
+        ejecutor_bd.enviar(self.orn_filtro_tramo,
+                           lambda conn: Ornato.tramos_salario(Tarifario.tablas(conn)), tramos)
+
+        for cb in (self.orn_filtro_estado, self.orn_filtro_tramo):
+            cb.bind("<<ComboboxSelected>>", lambda e: self._cargar_ciudadanos_ornato(al_inicio=True))
+        ttk.Button(filtros, text="🔄 Refrescar lista", command=self._cargar_ciudadanos_ornato).pack(side="left")
+        ttk.Button(filtros, text="🗓 Generar campaña del año",
+                   command=self._generar_campana_ornato).pack(side="left", padx=6)
+
+        self.orn_total_label = tk.Label(frame, text="", font=("Segoe UI", 10), bg="#FFFFFF", fg="#2D3A4A")
+        self.orn_total_label.pack(side="bottom", fill="x", pady=(8, 0))
+
+        cols = ("id", "nombre", "dpi", "nit", "salario", "monto", "estado")
         self.tree_ciudadanos = ttk.Treeview(frame, columns=cols, show="headings", height=15)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical")
+        scrollbar.pack(side="right", fill="y")
         self.tree_ciudadanos.pack(fill="both", expand=True)
 
-        for c, t in zip(cols, ["ID", "Nombre", "DPI", "NIT", "Salario (Q)", "Estado"]):
+        for c, t in zip(cols, ["ID", "Nombre", "DPI", "NIT", "Salario (Q)", "Boleto (Q)", "Estado"]):
             self.tree_ciudadanos.heading(c, text=t)
             self.tree_ciudadanos.column(c, width=140, anchor="center")
 
+        def fuente():
+            filtros = self._filtros_ornato()
+            return (lambda conn, paso: Ornato.marcas(conn, *filtros, paso=paso),
+                    lambda conn, despues_de, limite: Ornato.listar(
+                        conn, *filtros, antes_de=despues_de[0] if despues_de else None, limite=limite))
+
+        self.lista_ornato = ListaVirtual(self.tree_ciudadanos, scrollbar, fuente, lambda r: (
+            r["id"],
+            r["nombre"],
+            r["dpi"],
+            r["nit"] if r["nit"] else "—",
+            f"Q{r['salario']:.2f}",
+            f"Q{r['monto']:.2f}",
+            "✅ Pagó" if r["pagado"] else "❌ No ha pagado"
+        ), al_cargar=lambda total: self.orn_total_label.config(text=f"{total} ciudadano(s)"))
         self._cargar_ciudadanos_ornato()
 
-    def _cargar_ciudadanos_ornato(self):
-        if not hasattr(self, "tree_ciudadanos"):
+    def _generar_campana_ornato(self):
+        anio = datetime.now().year
+        if not messagebox.askyesno("Campaña de ornato",
+                                   f"¿Generar las boletas pendientes {anio} de todo el padrón?\n"
+                                   "Los ciudadanos que ya tienen boleta del año no se duplican."):
             return
 
-        for i in self.tree_ciudadanos.get_children():
-            self.tree_ciudadanos.delete(i)
+        def generada(resultado):
+            ConsultaCiudadano.olvidar()
+            generadas, r = resultado
+            tasa = (r["pagadas"] or 0) / r["emitidas"] * 100 if r["emitidas"] else 0
+            messagebox.showinfo("Campaña de ornato",
+                                f"Se generaron {generadas} boleta(s) pendientes para {anio}.\n\n"
+                                f"Emitidas: {r['emitidas']}  ·  Pagadas: {r['pagadas'] or 0} ({tasa:.1f}%)\n"
+                                f"Recaudado: Q{r['recaudado'] or 0:.2f}  ·  Pendiente: Q{r['pendiente'] or 0:.2f}")
+            self._cargar_ciudadanos_ornato()
 
-        anio_actual = datetime.now().year
+        ejecutor_bd.enviar(self.tree_ciudadanos,
+                           lambda conn: (Ornato.generar_campana(conn, anio), Ornato.recaudacion(conn, anio)),
+                           generada)
 
-        with DatabaseManager.connect() as conn:
-            rows = conn.execute(f"""
-                SELECT 
-                    c.id,
-                    c.nombre,
-                    c.dpi,
-                    c.nit,
-                    c.salario,
-                    CASE 
-                        WHEN EXISTS (
-                            SELECT 1 FROM boletas_ornato b 
-                            WHERE b.ciudadano_id = c.id AND b.anio = ?
-                        ) THEN '✅ Pagó'
-                        ELSE '❌ No ha pagado'
-                    END AS estado
-                FROM ciudadanos_ornato c
-                ORDER BY c.id DESC
-            """, (anio_actual,)).fetchall()
-
-        for r in rows:
-            self.tree_ciudadanos.insert("", "end", values=(
-                r["id"],
-                r["nombre"],
-                r["dpi"],
-                r["nit"] if r["nit"] else "—",
-                f"Q{r['salario']:.2f}",
-                r["estado"]
-            ))
+    def _filtros_ornato(self):
+        estado = {"✅ Pagó": "pagado", "❌ No ha pagado": "pendiente"}.get(self.orn_filtro_estado.get())
+        indice = self.orn_filtro_tramo.current()
+        tramo = self.orn_tramos[indice - 1] if indice > 0 else None
+        return datetime.now().year, estado, tramo
+
+    def _cargar_ciudadanos_ornato(self, al_inicio=False):
+        if not hasattr(self, "lista_ornato") or not self.lista_ornato.vigente():
+            return
+        self.lista_ornato.recargar(al_inicio)
 
     def _abrir_panel_agua(self):
         try:
@@ -694,6 +3365,10 @@ class AdminPanel:
         notebook.add(ver_todos_tab, text="📄 Ver Todos")
         self._build_ver_todos_agua_tab(ver_todos_tab)
 
+        anomalias_tab = tk.Frame(notebook, bg="#FFFFFF")
+        notebook.add(anomalias_tab, text="⚠️ Consumos atípicos")
+        self._build_anomalias_agua_tab(anomalias_tab)
+
     def _build_cobro_agua_tab(self, parent):
         main_frame = tk.Frame(parent, bg="#FFFFFF", relief="raised", bd=2)
         main_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -751,6 +3426,17 @@ class AdminPanel:
         scrollbar = ttk.Scrollbar(historial_frame, orient="vertical", command=self.historial_tree.yview)
         self.historial_tree.configure(yscrollcommand=scrollbar.set)
 
+        nav = tk.Frame(historial_frame, bg="#FFFFFF")
+        nav.pack(side="bottom", fill="x", pady=(8, 0))
+        self.btn_hist_recientes = ttk.Button(nav, text="◀ Más recientes", state="disabled",
+                                             command=lambda: self._paginar_historial("recientes"))
+        self.btn_hist_recientes.pack(side="left")
+        self.btn_hist_antiguas = ttk.Button(nav, text="Más antiguas ▶", state="disabled",
+                                            command=lambda: self._paginar_historial("antiguas"))
+        self.btn_hist_antiguas.pack(side="right")
+        self.hist_total_label = tk.Label(nav, text="", font=("Segoe UI", 10), bg="#FFFFFF", fg="#2D3A4A")
+        self.hist_total_label.pack(side="left", expand=True)
+
         self.historial_tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
 
@@ -763,6 +3449,8 @@ class AdminPanel:
 
         ttk.Button(top, text="🔄 Refrescar lista", command=self._load_all_clientes_agua).pack(side="left", padx=6)
         ttk.Button(top, text="📊 Ver detalles", command=self._ver_detalles_cliente_agua).pack(side="left", padx=6)
+        ttk.Button(top, text="🧾 Generar cargos del mes",
+                   command=self._generar_cargos_tarifa_fija).pack(side="left", padx=6)
 
         cols = ("id", "nombre", "dpi", "direccion", "numero_casa", "contador", "deuda")
         self.agua_all_tree = ttk.Treeview(container, columns=cols, show="headings")
@@ -774,59 +3462,148 @@ class AdminPanel:
         for col, heading, width in headers:
             self.agua_all_tree.heading(col, text=heading)
             self.agua_all_tree.column(col, width=width, anchor="w" if col in ["nombre", "direccion"] else "center")
+        self.agua_all_tree.heading("deuda", text="Deuda ⇅", command=lambda: self._ordenar_clientes_agua("deuda"))
 
-        scrollbar = ttk.Scrollbar(container, orient="vertical", command=self.agua_all_tree.yview)
-        self.agua_all_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar = ttk.Scrollbar(container, orient="vertical")
 
         self.agua_all_tree.pack(side="left", fill="both", expand=True, padx=12, pady=12)
         scrollbar.pack(side="right", fill="y")
 
+        self.lista_agua = ListaVirtual(self.agua_all_tree, scrollbar, self._fuente_clientes_agua,
+                                       self._valores_cliente_agua)
         self._load_all_clientes_agua()
 
+    def _build_anomalias_agua_tab(self, parent):
+        container = tk.Frame(parent, bg="#FFFFFF")
+        container.pack(fill="both", expand=True, padx=12, pady=12)
+
+        top = tk.Frame(container, bg="#FFFFFF")
+        top.pack(fill="x", padx=12, pady=12)
+
+        ttk.Button(top, text="🔄 Refrescar", command=self._load_anomalias_agua).pack(side="left", padx=6)
+        ttk.Button(top, text="🔍 Revisar todo el historial",
+                   command=self._revisar_anomalias_agua).pack(side="left", padx=6)
+        ttk.Button(top, text="✔ Marcar revisada", command=self._marcar_anomalias_revisadas).pack(side="left", padx=6)
+        self.anomalias_estado = tk.Label(top, text="", font=("Segoe UI", 10), bg="#FFFFFF", fg="#58606A")
+        self.anomalias_estado.pack(side="left", padx=6)
+
+        ttk.Button(top, text="Guardar umbral", command=self._guardar_umbral_anomalias).pack(side="right", padx=6)
+        self.umbral_anomalia_entry = ttk.Entry(top, width=6)
+        self.umbral_anomalia_entry.pack(side="right")
+        tk.Label(top, text="Umbral (desviaciones):", font=("Segoe UI", 10),
+                 bg="#FFFFFF").pack(side="right", padx=6)
+
+        cols = ("fecha", "nombre", "dpi", "consumo", "media", "puntaje", "origen")
+        self.anomalias_tree = ttk.Treeview(container, columns=cols, show="headings")
+
+        headers = [("fecha", "Fecha", 150), ("nombre", "Cliente", 200), ("dpi", "DPI", 120),
+                   ("consumo", "Consumo", 100), ("media", "Promedio", 100),
+                   ("puntaje", "Desviaciones", 100), ("origen", "Origen", 100)]
+
+        for col, heading, width in headers:
+            self.anomalias_tree.heading(col, text=heading)
+            self.anomalias_tree.column(col, width=width, anchor="w" if col == "nombre" else "center")
+
+        scrollbar = ttk.Scrollbar(container, orient="vertical", command=self.anomalias_tree.yview)
+        self.anomalias_tree.configure(yscrollcommand=scrollbar.set)
+
+        self.anomalias_tree.pack(side="left", fill="both", expand=True, padx=12, pady=12)
+        scrollbar.pack(side="right", fill="y")
+
+        self.espejo_anomalias = EspejoTree(self.anomalias_tree)
+        self._load_anomalias_agua()
+
+    def _load_anomalias_agua(self):
+        def mostrar_umbral(umbral):
+            self.umbral_anomalia_entry.delete(0, tk.END)
+            self.umbral_anomalia_entry.insert(0, f"{umbral:g}")
+
+        ejecutor_bd.enviar(self.anomalias_tree, DetectorConsumo.umbral, mostrar_umbral)
+        if getattr(self, "carga_anomalias", None):
+            self.carga_anomalias.cancelar()
+        self.carga_anomalias = CargadorIncremental(
+            self.anomalias_tree, lambda conn: conn.execute(CONSULTAS_CRITICAS["agua_anomalias_pendientes"]),
+            lambda anomalia: (
+                anomalia["fecha"],
+                anomalia["nombre"],
+                anomalia["dpi"],
+                f"{anomalia['consumo']:.2f} m³",
+                f"{anomalia['media']:.2f} m³",
+                f"{DetectorConsumo.puntaje(anomalia):+.1f}",
+                "Captura" if anomalia["origen"] == "captura" else "Revisión"
+            ),
+            iid=lambda anomalia: str(anomalia["lectura_id"]), espejo=self.espejo_anomalias,
+            al_avanzar=lambda n, fin: self.anomalias_estado.config(
+                text=f"{n} pendiente(s)" if fin else f"Cargando… {n}"))
+
+    def _revisar_anomalias_agua(self):
+        def revisado(marcadas):
+            messagebox.showinfo("Consumos atípicos", f"Revisión completa: {marcadas} lectura(s) nuevas marcadas.")
+            self._load_anomalias_agua()
+
+        ejecutor_bd.enviar(self.anomalias_tree, DetectorConsumo.revisar, revisado)
+
+    def _marcar_anomalias_revisadas(self):
+        sel = self.anomalias_tree.selection()
+        if not sel:
+            messagebox.showinfo("Atención", "Seleccione una o más lecturas de la lista")
+            return
+        lecturas = [int(iid) for iid in sel]
+        ejecutor_bd.enviar(self.anomalias_tree, lambda conn: DetectorConsumo.marcar_revisadas(conn, lecturas),
+                           lambda _: self._load_anomalias_agua())
+
+    def _guardar_umbral_anomalias(self):
+        try:
+            umbral = float(self.umbral_anomalia_entry.get().strip())
+            if umbral <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("Validación", "El umbral debe ser un número mayor que cero (ej. 3).")
+            return
+        ejecutor_bd.enviar(self.anomalias_tree, lambda conn: DetectorConsumo.fijar_umbral(conn, umbral),
+                           lambda _: messagebox.showinfo("Consumos atípicos", f"Umbral guardado: {umbral:g}"))
+
     def _load_all_clientes_agua(self):
-        for i in self.agua_all_tree.get_children():
-            self.agua_all_tree.delete(i)
+        self.lista_agua.recargar()
 
-        with DatabaseManager.connect() as conn:
-            clientes = conn.execute("""
-                SELECT * FROM usuarios_registrados
-                WHERE servicio_agua = 'Sí' OR servicio_agua = 'si'
-                ORDER BY nombre COLLATE NOCASE
-            """).fetchall()
-
-        for cliente in clientes:
-            deuda = self._calcular_deuda_simple(cliente)
-            contador_texto = "Con contador" if (cliente["contador"] or "").lower() == "sí" else "Tarifa fija"
-
-            self.agua_all_tree.insert("", "end", values=(
-                cliente["id"],
-                cliente["nombre"],
-                cliente["dpi"],
-                cliente["direccion"] or "N/A",
-                cliente["numero_casa"],
-                contador_texto,
-                f"Q{deuda:.2f}"
-            ))
+    def _fuente_clientes_agua(self):
+        paginador = _paginador_clientes_agua(getattr(self, "agua_orden", None) == "deuda")
+        return paginador.marcas, paginador.pagina
+
+    def _generar_cargos_tarifa_fija(self):
+        periodo = date.today().strftime("%Y-%m")
+        if not messagebox.askyesno("Tarifa fija",
+                                   f"¿Generar los cargos de tarifa fija del periodo {periodo}?\n"
+                                   "Los clientes que ya tienen su cargo del mes no se duplican."):
+            return
+
+        def generados(cantidad):
+            ConsultaCiudadano.olvidar()
+            messagebox.showinfo("Tarifa fija", f"Se generaron {cantidad} cargo(s) para {periodo}.")
+            self._load_all_clientes_agua()
+
+        ejecutor_bd.enviar(self.agua_all_tree, lambda conn: FacturacionAgua.generar_cargos_fijos(conn, periodo),
+                           generados)
+
+    def _ordenar_clientes_agua(self, columna):
+        self.agua_orden = None if getattr(self, "agua_orden", None) == columna else columna
+        self.lista_agua.recargar(al_inicio=True)
+
+    def _valores_cliente_agua(self, cliente):
+        contador_texto = "Con contador" if (cliente["contador"] or "").lower() == "sí" else "Tarifa fija"
+        return (
+            cliente["id"],
+            cliente["nombre"],
+            cliente["dpi"],
+            cliente["direccion"] or "N/A",
+            cliente["numero_casa"],
+            contador_texto,
+            f"Q{self._calcular_deuda_simple(cliente):.2f}"
+        )
 
     def _calcular_deuda_simple(self, cliente):
-        with DatabaseManager.connect() as conn:
-            if (cliente["contador"] or "").lower() == "sí":
-                lecturas = conn.execute("""
-                    SELECT SUM(total_pagar) as total FROM lecturas_agua
-                    WHERE usuario_id = ? AND pagado = 0
-                """, (cliente["id"],)).fetchone()
-                return float(lecturas["total"] or 0.0)
-            else:
-                tarifa_fija = 20.0
-                ultimo_pago = None
-                try:
-                    ultimo_pago = cliente["ultimo_pago"]
-                except:
-                    pass
-                meses_sin_pagar = self._calcular_meses_transcurridos(ultimo_pago) if ultimo_pago else 1
-                if meses_sin_pagar < 0:
-                    meses_sin_pagar = 0
-                return meses_sin_pagar * tarifa_fija
+        # 'cliente' trae deuda_lecturas desde saldos_agua (lecturas y cargos de tarifa fija pendientes)
+        return float(cliente["deuda_lecturas"] or 0.0)
 
     def _ver_detalles_cliente_agua(self):
         sel = self.agua_all_tree.selection()
@@ -837,9 +3614,10 @@ class AdminPanel:
         item = self.agua_all_tree.item(sel[0])
         usuario_id = item["values"][0]
 
-        with DatabaseManager.connect() as conn:
-            cliente = conn.execute("SELECT * FROM usuarios_registrados WHERE id = ?", (usuario_id,)).fetchone()
+        ejecutor_bd.enviar(self.agua_all_tree, lambda conn: conn.execute(
+            CONSULTAS_CRITICAS["admin_usuario_por_id"], (usuario_id,)).fetchone(), self._mostrar_detalles_agua)
 
+    def _mostrar_detalles_agua(self, cliente):
         if cliente:
             info = f"""
 Información del Cliente:
@@ -858,19 +3636,12 @@ Información del Cliente:
             messagebox.showwarning("Atención", "Ingrese al menos el nombre o DPI del cliente")
             return
 
-        with DatabaseManager.connect() as conn:
-            query = "SELECT * FROM usuarios_registrados WHERE 1=1"
-            params = []
-
-            if nombre:
-                query += " AND nombre LIKE ?"
-                params.append(f"%{nombre}%")
-            if dpi:
-                query += " AND dpi = ?"
-                params.append(dpi)
-
-            cliente = conn.execute(query, params).fetchone()
+        query, params = _sql_buscar_usuarios(nombre=nombre, dpi=dpi)
+        ejecutor_bd.enviar(self.info_cliente_label,
+                           lambda conn: conn.execute(query, params).fetchone(),
+                           self._cliente_agua_encontrado)
 
+    def _cliente_agua_encontrado(self, cliente):
         if not cliente:
             messagebox.showwarning("No encontrado", "No se encontró ningún cliente con esos datos")
             self._limpiar_info_cliente()
@@ -895,30 +3666,32 @@ Información del Cliente:
         if not respuesta:
             return
 
-        try:
-            with DatabaseManager.connect() as conn:
-                fecha_pago = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                conn.execute("""
-                    UPDATE lecturas_agua
-                    SET pagado = 1, fecha_pago = ?
-                    WHERE usuario_id = ? AND pagado = 0
-                """, (fecha_pago, self.cliente_seleccionado["id"]))
+        cliente = self.cliente_seleccionado
+        fecha_pago = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-                conn.commit()
+        def cobrar(conn):
+            conn.execute(CONSULTAS_CRITICAS["agua_cobro"], (fecha_pago, cliente["id"]))
+            conn.commit()
+            ConsultaCiudadano.olvidar(cliente["dpi"])
 
+        def cobro_realizado(_):
             messagebox.showinfo(
                 "Cobro Realizado",
                 f"✅ Cobro realizado exitosamente\n\n"
-                f"Cliente: {self.cliente_seleccionado['nombre']}\n"
+                f"Cliente: {cliente['nombre']}\n"
                 f"Fecha: {fecha_pago}"
             )
 
-            self._calcular_deuda_cliente(self.cliente_seleccionado)
-            self._cargar_historial_pagos(self.cliente_seleccionado["id"])
+            self._calcular_deuda_cliente(cliente)
+            self._cargar_historial_pagos(cliente["id"])
 
-        except Exception as e:
+        def cobro_fallido(e):
             messagebox.showerror("Error", f"Error al procesar el cobro: {str(e)}")
+            self.btn_cobro.config(state="normal")
+
+        # Evita un segundo cobro mientras la transacción sigue en curso
+        self.btn_cobro.config(state="disabled")
+        ejecutor_bd.enviar(self.btn_cobro, cobrar, cobro_realizado, cobro_fallido)
 
     def _mostrar_info_cliente(self, cliente):
         info_text = f"""
@@ -930,68 +3703,91 @@ Información del Cliente:
         self.info_cliente_label.config(text=info_text, fg="#2D3A4A", justify="left")
 
     def _calcular_deuda_cliente(self, cliente):
-        with DatabaseManager.connect() as conn:
-            lecturas = conn.execute("""
-                        SELECT * FROM lecturas_agua
-                        WHERE usuario_id = ? AND pagado = 0
-                        ORDER BY fecha DESC
-                    """, (cliente["id"],)).fetchall()
-
-            total_deuda = 0
-            detalles = []
+        ejecutor_bd.enviar(self.deuda_label, lambda conn: SaldosAgua.consultar(conn, cliente["id"]),
+                           lambda saldo: self._mostrar_deuda_cliente(cliente, saldo))
 
-            for lectura in lecturas:
-                meses_mora = self._calcular_meses_transcurridos(lectura["fecha"])
-                mora = meses_mora * 25.0
-                total_lectura = float(lectura["total_pagar"]) + mora
-                total_deuda += total_lectura
-
-                detalles.append(
-                    f"• Lectura {lectura['fecha']}: Q{lectura['total_pagar']:.2f} + Mora Q{mora:.2f}")
+    def _mostrar_deuda_cliente(self, cliente, saldo):
+        if self.cliente_seleccionado is not cliente:
+            # Llegó tarde: ya se buscó otro cliente
+            return
+        pendientes, consumo, mora, total_deuda = SaldosAgua.desglose(saldo)
 
         if total_deuda > 0:
-            deuda_text = f"💸 DEUDA TOTAL: Q{total_deuda:.2f}\n\nDetalles:\n" + "\n".join(detalles)
+            deuda_text = (f"💸 DEUDA TOTAL: Q{total_deuda:.2f}\n\nDetalles:\n"
+                          f"• {pendientes} cargo(s) pendiente(s): Q{consumo:.2f}\n"
+                          f"• Mora acumulada: Q{mora:.2f}")
             self.deuda_label.config(text=deuda_text, fg="#D32F2F", justify="left")
             self.btn_cobro.config(state="normal")
         else:
             self.deuda_label.config(text="✅ Cliente al día - Sin deuda pendiente", fg="#388E3C")
             self.btn_cobro.config(state="disabled")
 
-    def _calcular_meses_transcurridos(self, fecha_str):
-        if not fecha_str:
-            return 0
-
-        try:
-            fecha = datetime.strptime(fecha_str.split(" ")[0], "%Y-%m-%d").date()
-            hoy = date.today()
-            return (hoy.year - fecha.year) * 12 + (hoy.month - fecha.month)
-        except:
-            return 0
+    HISTORIAL_POR_PAGINA = 10
 
     def _cargar_historial_pagos(self, usuario_id):
+        self.hist_usuario = usuario_id
+        self.hist_totales = (0, 0.0)
+
+        def totales(saldo):
+            if self.hist_usuario != usuario_id:
+                return
+            self.hist_totales = (saldo["lecturas_total"], saldo["consumo_total"]) if saldo else (0, 0.0)
+            self._paginar_historial()
+
+        # El total histórico lo llevan los triggers en saldos_agua
+        ejecutor_bd.enviar(self.historial_tree, lambda conn: SaldosAgua.consultar(conn, usuario_id), totales)
+
+    def _paginar_historial(self, direccion=None):
+        # Paginación por llave (fecha, id): cada página cuesta lo mismo sin importar cuántas
+        # lecturas tenga el cliente. "Recientes" lee hacia atrás con el orden invertido.
+        limite = self.HISTORIAL_POR_PAGINA
+        usuario_id = self.hist_usuario
+        if direccion == "antiguas":
+            paginador, desde = _paginador_historial_agua(usuario_id), self.hist_ultima
+        elif direccion == "recientes":
+            paginador, desde = _paginador_historial_agua(usuario_id, recientes_primero=False), self.hist_primera
+        else:
+            paginador, desde = _paginador_historial_agua(usuario_id), None
+
+        def leida(lecturas):
+            if self.hist_usuario != usuario_id:
+                return
+            if direccion == "antiguas":
+                self._mostrar_historial(lecturas[:limite], True, len(lecturas) > limite)
+            elif direccion == "recientes":
+                self._mostrar_historial(lecturas[:limite][::-1], len(lecturas) > limite, True)
+            else:
+                self._mostrar_historial(lecturas[:limite], False, len(lecturas) > limite)
+
+        ejecutor_bd.enviar(self.historial_tree, lambda conn: paginador.pagina(conn, desde, limite + 1), leida)
+
+    def _mostrar_historial(self, lecturas, hay_recientes, hay_antiguas):
         for item in self.historial_tree.get_children():
             self.historial_tree.delete(item)
 
-        with DatabaseManager.connect() as conn:
-            lecturas = conn.execute("""
-                SELECT fecha, consumo_m3 as consumo, total_pagar, pagado, fecha_pago
-                FROM lecturas_agua
-                WHERE usuario_id = ?
-                ORDER BY fecha DESC
-                LIMIT 10
-            """, (usuario_id,)).fetchall()
-
-            for lectura in lecturas:
-                estado = "✅ Pagado" if lectura["pagado"] else "❌ Pendiente"
-                consumo = f"{lectura['consumo']:.2f} m³" if lectura["consumo"] is not None else "N/A"
-
-                self.historial_tree.insert("", "end", values=(
-                    lectura["fecha"],
-                    "Contador",
-                    consumo,
-                    f"Q{lectura['total_pagar']:.2f}",
-                    estado
-                ))
+        consumo_pagina = 0.0
+        for lectura in lecturas:
+            estado = "✅ Pagado" if lectura["pagado"] else "❌ Pendiente"
+            consumo = f"{lectura['consumo']:.2f} m³" if lectura["consumo"] is not None else "N/A"
+            consumo_pagina += lectura["consumo"] or 0.0
+
+            self.historial_tree.insert("", "end", values=(
+                lectura["fecha"],
+                lectura["tipo"],
+                consumo,
+                f"Q{lectura['total_pagar']:.2f}",
+                estado
+            ))
+
+        if lecturas:
+            self.hist_primera = (lecturas[0]["fecha"], lecturas[0]["id"])
+            self.hist_ultima = (lecturas[-1]["fecha"], lecturas[-1]["id"])
+        self.btn_hist_recientes.config(state="normal" if hay_recientes and lecturas else "disabled")
+        self.btn_hist_antiguas.config(state="normal" if hay_antiguas and lecturas else "disabled")
+        total_lecturas, total_consumo = self.hist_totales
+        self.hist_total_label.config(
+            text=f"Esta página: {consumo_pagina:.2f} m³ · Total histórico: {total_consumo:.2f} m³ "
+                 f"en {total_lecturas} registro(s)")
 
     def _limpiar_busqueda_agua(self):
         self.agua_nombre.delete(0, tk.END)
@@ -1000,12 +3796,16 @@ Información del Cliente:
 
     def _limpiar_info_cliente(self):
         self.cliente_seleccionado = None
+        self.hist_usuario = None
         self.info_cliente_label.config(text="Seleccione un cliente para ver su información", fg="#666666")
         self.deuda_label.config(text="")
         self.btn_cobro.config(state="disabled")
 
         for item in self.historial_tree.get_children():
             self.historial_tree.delete(item)
+        self.btn_hist_recientes.config(state="disabled")
+        self.btn_hist_antiguas.config(state="disabled")
+        self.hist_total_label.config(text="")
 
     def _abrir_panel_usuarios(self):
         for w in self.content.winfo_children():
@@ -1056,8 +3856,15 @@ Información del Cliente:
         contador_cb.grid(row=len(labels), column=1, **pad, ipady=6)
         self._reg_entries["Contador"] = contador_cb
 
+        tk.Label(form, text="Categoría", font=fuente_label, bg="#FFFFFF").grid(row=len(labels) + 1, column=0,
+                                                                               sticky="w", **pad)
+        categoria_cb = ttk.Combobox(form, values=Tarifario.CATEGORIAS, width=57, font=fuente_entry, state="readonly")
+        categoria_cb.grid(row=len(labels) + 1, column=1, **pad, ipady=6)
+        categoria_cb.set(Tarifario.CATEGORIA_DEFECTO)
+        self._reg_entries["Categoría"] = categoria_cb
+
         btn_frame = tk.Frame(form, bg="#FFFFFF")
-        btn_frame.grid(row=len(labels) + 1, column=0, columnspan=2, pady=20)
+        btn_frame.grid(row=len(labels) + 2, column=0, columnspan=2, pady=20)
 
         style = ttk.Style()
         style.configure("Custom.TButton", font=fuente_boton, padding=10)
@@ -1075,6 +3882,7 @@ Información del Cliente:
                 e.delete(0, tk.END)
             except:
                 e.set("")
+        self._reg_entries["Categoría"].set(Tarifario.CATEGORIA_DEFECTO)
 
     def guardar_registro(self):
         datos = {campo: widget.get() for campo, widget in self._reg_entries.items()}
@@ -1083,20 +3891,23 @@ Información del Cliente:
             messagebox.showwarning("Validación", "Los campos Nombre, Número de casa y DPI son obligatorios.")
             return
 
-        with DatabaseManager.connect() as conn:
-            conn.execute("""
-                INSERT INTO usuarios_registrados
-                (nombre, direccion, numero_casa, dpi, nit, servicio_agua, contador)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                datos["Nombre"], datos["Dirección"], datos["Número de casa"],
-                datos["DPI"], datos["NIT"], datos["Solicitar servicio de agua"],
-                datos["Contador"]
-            ))
-            conn.commit()
+        def registrar(conn):
+            with DatabaseManager.transaccion(conn):
+                conn.execute("""
+                    INSERT INTO usuarios_registrados
+                    (nombre, direccion, numero_casa, dpi, nit, servicio_agua, contador, categoria)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    datos["Nombre"], datos["Dirección"], datos["Número de casa"],
+                    datos["DPI"], datos["NIT"], datos["Solicitar servicio de agua"],
+                    datos["Contador"], datos["Categoría"] or Tarifario.CATEGORIA_DEFECTO
+                ))
 
-        messagebox.showinfo("Registro", "Usuario registrado correctamente. 💾")
-        self.limpiar_registro()
+        def registrado(_):
+            messagebox.showinfo("Registro", "Usuario registrado correctamente. 💾")
+            self.limpiar_registro()
+
+        ejecutor_bd.enviar(self._reg_entries["Nombre"], registrar, registrado)
 
     def buscar_tab(self, parent):
         container = tk.Frame(parent, bg="#FFFFFF")
@@ -1181,7 +3992,10 @@ Información del Cliente:
             self.search_tree.heading(col, text=heading)
             self.search_tree.column(col, width=ancho, anchor="w", stretch=True)
 
-        self.search_tree.pack(fill="both", expand=True, padx=16, pady=16)
+        self.search_tree.pack(fill="both", expand=True, padx=16, pady=(16, 4))
+        self.search_estado = tk.Label(container, text="", font=("Segoe UI", 10), bg="#FFFFFF", fg="#58606A")
+        self.search_estado.pack(anchor="w", padx=16, pady=(0, 8))
+        self.espejo_busqueda = EspejoTree(self.search_tree)
 
         self.search_tree.update_idletasks()
 
@@ -1195,38 +4009,27 @@ Información del Cliente:
         self.search_name.delete(0, tk.END)
         self.search_house.delete(0, tk.END)
         self.search_dpi.delete(0, tk.END)
-        for i in self.search_tree.get_children():
-            self.search_tree.delete(i)
+        if getattr(self, "carga_busqueda", None):
+            self.carga_busqueda.cancelar()
+        self.espejo_busqueda.vaciar()
+        self.search_estado.config(text="")
 
     def buscar(self):
         name = self.search_name.get().strip()
         house = self.search_house.get().strip()
         dpi = self.search_dpi.get().strip()
 
-        query = "SELECT * FROM usuarios_registrados WHERE 1=1"
-        params = []
-
-        if name:
-            query += " AND nombre LIKE ?"
-            params.append(f"%{name}%")
-        if house:
-            query += " AND numero_casa = ?"
-            params.append(house)
-        if dpi:
-            query += " AND dpi = ?"
-            params.append(dpi)
-
-        with DatabaseManager.connect() as conn:
-            cur = conn.execute(query, tuple(params))
-            rows = cur.fetchall()
-
-        for i in self.search_tree.get_children():
-            self.search_tree.delete(i)
+        query, params = _sql_buscar_usuarios(nombre=name, casa=house, dpi=dpi)
 
-        for r in rows:
-            self.search_tree.insert("", "end", values=(r["id"], r["nombre"], r["direccion"],
-                                                       r["numero_casa"], r["dpi"], r["nit"],
-                                                       r["servicio_agua"], r["contador"]))
+        if getattr(self, "carga_busqueda", None):
+            self.carga_busqueda.cancelar()
+        self.carga_busqueda = CargadorIncremental(
+            self.search_tree, lambda conn: conn.execute(query, tuple(params)),
+            lambda r: (r["id"], r["nombre"], r["direccion"], r["numero_casa"], r["dpi"], r["nit"],
+                       r["servicio_agua"], r["contador"]),
+            iid=lambda r: str(r["id"]), espejo=self.espejo_busqueda,
+            al_avanzar=lambda n, fin: self.search_estado.config(
+                text=f"{n} resultado(s)" if fin else f"Cargando… {n} resultado(s)"))
 
     def _build_all_tab(self, parent):
         top = tk.Frame(parent, bg="#FFFFFF")
@@ -1271,6 +4074,8 @@ Información del Cliente:
             self.all_tree.column(col, width=ancho, anchor="w",
                                  stretch=True)
 
+        scrollbar = ttk.Scrollbar(parent, orient="vertical")
+        scrollbar.pack(side="right", fill="y", pady=16)
         self.all_tree.pack(fill="both", expand=True, padx=20, pady=16)
 
         self.all_tree.update_idletasks()
@@ -1281,18 +4086,17 @@ Información del Cliente:
             width = font.measure(header_text) + 50  # +50 px de margen para que no se corte
             self.all_tree.column(col, width=width, stretch=True)
 
+        self.lista_usuarios = ListaVirtual(self.all_tree, scrollbar, self._fuente_usuarios,
+                                           lambda r: (r["id"], r["nombre"], r["direccion"], r["numero_casa"],
+                                                      r["dpi"], r["nit"], r["servicio_agua"], r["contador"]))
         self._load_all_users()
 
     def _load_all_users(self):
-        for i in self.all_tree.get_children():
-            self.all_tree.delete(i)
-        with DatabaseManager.connect() as conn:
-            cur = conn.execute("SELECT * FROM usuarios_registrados ORDER BY nombre COLLATE NOCASE")
-            rows = cur.fetchall()
-        for r in rows:
-            self.all_tree.insert("", "end", values=(r["id"], r["nombre"], r["direccion"],
-                                                    r["numero_casa"], r["dpi"], r["nit"],
-                                                    r["servicio_agua"], r["contador"]))
+        self.lista_usuarios.recargar()
+
+    def _fuente_usuarios(self):
+        paginador = _paginador_usuarios()
+        return paginador.marcas, paginador.pagina
 
     def _get_selected_from_tree(self, tree):
         sel = tree.selection()
@@ -1329,7 +4133,8 @@ Información del Cliente:
         frame = tk.Frame(edit_win)
         frame.pack(padx=12, pady=8)
 
-        fields = ["Nombre", "Dirección", "Número de casa", "DPI", "NIT", "Solicitar servicio de agua", "Contador"]
+        fields = ["Nombre", "Dirección", "Número de casa", "DPI", "NIT", "Solicitar servicio de agua", "Contador",
+                  "Categoría"]
         entries = {}
         values_map = {
             "Nombre": data["nombre"],
@@ -1338,13 +4143,14 @@ Información del Cliente:
             "DPI": data["dpi"],
             "NIT": data["nit"],
             "Solicitar servicio de agua": data["servicio_agua"],
-            "Contador": data["contador"]
+            "Contador": data["contador"],
+            "Categoría": None
         }
 
         for i, f in enumerate(fields):
             tk.Label(frame, text=f).grid(row=i, column=0, sticky="w", **pad)
-            if f == "Contador":
-                cb = ttk.Combobox(frame, values=["Sí", "No"], width=40)
+            if f in ("Contador", "Categoría"):
+                cb = ttk.Combobox(frame, values=["Sí", "No"] if f == "Contador" else Tarifario.CATEGORIAS, width=40)
                 cb.grid(row=i, column=1, **pad)
                 cb.set(values_map[f] if values_map[f] else "")
                 entries[f] = cb
@@ -1359,37 +4165,58 @@ Información del Cliente:
             if not nuevo["Nombre"] or not nuevo["Número de casa"] or not nuevo["DPI"]:
                 messagebox.showwarning("Validación", "Nombre, Número de casa y DPI son obligatorios.")
                 return
-            with DatabaseManager.connect() as conn:
-                conn.execute("""
-                    UPDATE usuarios_registrados
-                    SET nombre=?, direccion=?, numero_casa=?, dpi=?, nit=?, servicio_agua=?, contador=?
-                    WHERE id=?
-                """, (
-                    nuevo["Nombre"], nuevo["Dirección"], nuevo["Número de casa"],
-                    nuevo["DPI"], nuevo["NIT"], nuevo["Solicitar servicio de agua"],
-                    nuevo["Contador"], data["id"]
-                ))
-                conn.commit()
-            messagebox.showinfo("Editar", "Registro actualizado correctamente.")
-            edit_win.destroy()
-            self._load_all_users()
+
+            def guardar(conn):
+                with DatabaseManager.transaccion(conn):
+                    conn.execute("""
+                        UPDATE usuarios_registrados
+                        SET nombre=?, direccion=?, numero_casa=?, dpi=?, nit=?, servicio_agua=?, contador=?, categoria=?
+                        WHERE id=?
+                    """, (
+                        nuevo["Nombre"], nuevo["Dirección"], nuevo["Número de casa"],
+                        nuevo["DPI"], nuevo["NIT"], nuevo["Solicitar servicio de agua"],
+                        nuevo["Contador"], nuevo["Categoría"] or Tarifario.CATEGORIA_DEFECTO, data["id"]
+                    ))
+
+            def guardado(_):
+                messagebox.showinfo("Editar", "Registro actualizado correctamente.")
+                edit_win.destroy()
+                self._load_all_users()
+
+            btn_guardar.config(state="disabled")
+            ejecutor_bd.enviar(edit_win, guardar, guardado,
+                               lambda e: (btn_guardar.config(state="normal"),
+                                          messagebox.showerror("Editar", f"No se pudo actualizar: {e}")))
 
         btns = tk.Frame(edit_win)
         btns.pack(pady=8)
-        ttk.Button(btns, text="💾 Guardar cambios", command=guardar_edicion).pack(side="left", padx=8)
+        btn_guardar = ttk.Button(btns, text="💾 Guardar cambios", command=guardar_edicion, state="disabled")
+        btn_guardar.pack(side="left", padx=8)
         ttk.Button(btns, text="❌ Cancelar", command=edit_win.destroy).pack(side="left", padx=8)
 
+        def categoria_leida(fila):
+            # Guardar queda deshabilitado hasta conocer la categoría, para no pisarla con la de defecto
+            entries["Categoría"].set(fila["categoria"] if fila else Tarifario.CATEGORIA_DEFECTO)
+            btn_guardar.config(state="normal")
+
+        ejecutor_bd.enviar(edit_win, lambda conn: conn.execute(
+            "SELECT categoria FROM usuarios_registrados WHERE id = ?", (data["id"],)).fetchone(), categoria_leida)
+
     def _delete_selected(self):
         sel = self._get_selected_from_tree(self.all_tree)
         if not sel:
             messagebox.showinfo("Eliminar", "Selecciona un usuario para eliminar.")
             return
         if messagebox.askyesno("Eliminar", f"¿Eliminar al usuario '{sel['nombre']}' (ID {sel['id']})?"):
-            with DatabaseManager.connect() as conn:
-                conn.execute("DELETE FROM usuarios_registrados WHERE id = ?", (sel["id"],))
-                conn.commit()
-            messagebox.showinfo("Eliminar", "Registro eliminado.")
-            self._load_all_users()
+            def eliminar(conn):
+                with DatabaseManager.transaccion(conn):
+                    conn.execute("DELETE FROM usuarios_registrados WHERE id = ?", (sel["id"],))
+
+            def eliminado(_):
+                messagebox.showinfo("Eliminar", "Registro eliminado.")
+                self._load_all_users()
+
+            ejecutor_bd.enviar(self.all_tree, eliminar, eliminado)
 
     def cerrar_sesion(self):
         for widget in self.ventana.winfo_children():
@@ -1407,8 +4234,8 @@ Información del Cliente:
         style = ttk.Style()
         style.configure("Big.TButton", font=("Segoe UI", 12, "bold"), padding=(10, 7))
 
-        ttk.Button(top, text="🔄 Refrescar", style="Big.TButton", command=self._load_multas_admin).pack(side="left",
-                                                                                                       padx=10)
+        ttk.Button(top, text="🔄 Refrescar", style="Big.TButton",
+                   command=lambda: repositorio_multas.refrescar(top)).pack(side="left", padx=10)
         ttk.Button(top, text="🔎 Ver detalles", style="Big.TButton", command=self._ver_detalle_multa_admin).pack(
             side="left", padx=10)
         ttk.Button(top, text="🔁 Cambiar estado", style="Big.TButton",
@@ -1452,17 +4279,7 @@ Información del Cliente:
             width = font.measure(header_text) + 30  # +50 px de margen visual
             self.admin_multas_tree.column(col, width=width, stretch=True)
 
-        self._load_multas_admin()
-
-    def _load_multas_admin(self):
-        for i in self.admin_multas_tree.get_children():
-            self.admin_multas_tree.delete(i)
-        with DatabaseManager.connect() as conn:
-            rows = conn.execute("SELECT * FROM multas ORDER BY fecha_creacion DESC").fetchall()
-        for r in rows:
-            self.admin_multas_tree.insert("", "end", values=(r["id"], r["nombre_completo"], r["dpi"],
-                                                             r["tipo_multa"], r["detalle_otro"], r["monto"], r["estado"],
-                                                             r["creado_por"], r["fecha_creacion"]))
+        NavegadorMultas(self.content, self.admin_multas_tree, RepositorioMultas.valores_registro)
 
     def _get_selected_multa(self, tree):
         sel = tree.selection()
@@ -1506,14 +4323,12 @@ Información del Cliente:
         cb = ttk.Combobox(win, values=["Vigente", "Pagada", "Anulada"], textvariable=estado_var, state="readonly", width=30)
         cb.pack(padx=12, pady=8)
 
-        def guardar():
-            nuevo = estado_var.get()
-            with DatabaseManager.connect() as conn:
-                conn.execute("UPDATE multas SET estado = ? WHERE id = ?", (nuevo, sel["id"]))
-                conn.commit()
+        def guardado(fila):
             messagebox.showinfo("Estado", "Estado actualizado.")
             win.destroy()
-            self._load_multas_admin()
+
+        def guardar():
+            repositorio_multas.actualizar(sel["id"], widget=win, al_terminar=guardado, estado=estado_var.get())
 
         ttk.Button(win, text="💾 Guardar", command=guardar).pack(padx=8, pady=8)
         ttk.Button(win, text="❌ Cancelar", command=win.destroy).pack(padx=8, pady=4)
@@ -1662,37 +4477,20 @@ class CocodesPanel:
         if not nombre or not dpi or not tipo:
             messagebox.showwarning("Validación", "Nombre completo, DPI y Tipo de multa son obligatorios.")
             return
-        montos = {
-            "Tala de árboles.": 6000,
-            "Indocumentación": 100,
-            "Contaminación ambiental.": 5000,
-            "Daño a la infraestructura pública.": 500,
-            "Daño al alumbrado público.": 500,
-            "Otro": 50
-        }
-        monto = montos.get(tipo, 0)
         fecha = datetime.now().isoformat(sep=" ", timespec="seconds")
 
-        with DatabaseManager.connect() as conn:
-            conn.execute("""
-                INSERT INTO multas (nombre_completo, dpi, tipo_multa, detalle_otro, monto, estado, creado_por, fecha_creacion)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (nombre, dpi, tipo, detalle, monto, "Vigente", self.usuario_tipo, fecha))
-            conn.commit()
+        def creada(fila):
+            messagebox.showinfo("Multa", "Multa creada y guardada correctamente. ✅")
+            self._limpiar_crear_multa()
 
-        messagebox.showinfo("Multa", "Multa creada y guardada correctamente. ✅")
-        self._limpiar_crear_multa()
-        # refrescar vistas si existen
-        try:
-            self._cargar_multas_ver()
-            self._cargar_multas_modificar()
-        except Exception:
-            pass
+        repositorio_multas.crear(nombre, dpi, tipo, detalle,
+                                 lambda conn: Tarifario.monto(Tarifario.tablas(conn), "multa", tipo, fecha),
+                                 self.usuario_tipo, fecha, widget=self.cm_nombre, al_terminar=creada)
 
     def _build_ver_multas(self, parent):
         top = tk.Frame(parent, bg="#FFFFFF")
         top.pack(fill="x", padx=12, pady=12)
-        ttk.Button(top, text="🔄 Refrescar", command=self._cargar_multas_ver).pack(side="left", padx=6)
+        ttk.Button(top, text="🔄 Refrescar", command=lambda: repositorio_multas.refrescar(top)).pack(side="left", padx=6)
         ttk.Button(top, text="🔎 Ver detalle", command=self._ver_detalle_multa_ver).pack(side="left", padx=6)
 
         cols = ("id", "nombre", "dpi", "tipo", "detalle","monto", "estado", "creado_por", "fecha")
@@ -1705,17 +4503,7 @@ class CocodesPanel:
             self.ver_tree.column(col, width=120 if col not in ("nombre", "detalle") else 220, anchor="w")
         self.ver_tree.pack(fill="both", expand=True, padx=12, pady=12)
 
-        self._cargar_multas_ver()
-
-    def _cargar_multas_ver(self):
-        for i in self.ver_tree.get_children():
-            self.ver_tree.delete(i)
-        with DatabaseManager.connect() as conn:
-            rows = conn.execute("SELECT * FROM multas ORDER BY fecha_creacion DESC").fetchall()
-        for r in rows:
-            self.ver_tree.insert("", "end", values=(r["id"], r["nombre_completo"], r["dpi"],
-                                                    r["tipo_multa"], r["detalle_otro"],r["monto"],
-                                                    r["estado"], r["creado_por"], r["fecha_creacion"]))
+        NavegadorMultas(parent, self.ver_tree, RepositorioMultas.valores_registro)
 
     def _ver_detalle_multa_ver(self):
         sel = self._get_selected_from_tree(self.ver_tree)
@@ -1730,7 +4518,7 @@ class CocodesPanel:
     def _build_modificar_multas(self, parent):
         top = tk.Frame(parent, bg="#FFFFFF")
         top.pack(fill="x", padx=12, pady=12)
-        ttk.Button(top, text="🔄 Refrescar", command=self._cargar_multas_modificar).pack(side="left", padx=6)
+        ttk.Button(top, text="🔄 Refrescar", command=lambda: repositorio_multas.refrescar(top)).pack(side="left", padx=6)
         ttk.Button(top, text="✏️ Editar seleccionado", command=self._editar_seleccionado).pack(side="left", padx=6)
         ttk.Button(top, text="🗑️ Eliminar seleccionado", command=self._eliminar_seleccionado).pack(side="left", padx=6)
 
@@ -1743,17 +4531,7 @@ class CocodesPanel:
             self.modi_tree.column(col, width=120 if col not in ("nombre", "detalle") else 220, anchor="w")
         self.modi_tree.pack(fill="both", expand=True, padx=12, pady=12)
 
-        self._cargar_multas_modificar()
-
-    def _cargar_multas_modificar(self):
-        for i in self.modi_tree.get_children():
-            self.modi_tree.delete(i)
-        with DatabaseManager.connect() as conn:
-            rows = conn.execute("SELECT * FROM multas ORDER BY fecha_creacion DESC").fetchall()
-        for r in rows:
-            self.modi_tree.insert("", "end", values=(r["id"], r["nombre_completo"], r["dpi"],
-                                                     r["tipo_multa"], r["detalle_otro"],r["monto"], r["estado"],
-                                                     r["creado_por"], r["fecha_creacion"]))
+        NavegadorMultas(parent, self.modi_tree, RepositorioMultas.valores_registro)
 
     def _get_selected_from_tree(self, tree):
         sel = tree.selection()
@@ -1819,25 +4597,14 @@ class CocodesPanel:
             if not nuevo_nom or not nuevo_dpi or not nuevo_tipo:
                 messagebox.showwarning("Validación", "Nombre, DPI y Tipo son obligatorios.")
                 return
-            montos = {
-                "Tala de árboles.": 6000,
-                "Indocumentación": 100,
-                "Contaminación ambiental.": 5000,
-                "Daño a la infraestructura pública.": 500,
-                "Daño al alumbrado público.": 500,
-                "Otro": 50
-            }
-            nuevo_monto = montos.get(nuevo_tipo, 0)
-            with DatabaseManager.connect() as conn:
-                conn.execute("""
-                    UPDATE multas SET nombre_completo=?, dpi=?, tipo_multa=?, detalle_otro=?, monto=?
-                    WHERE id = ?
-                """, (nuevo_nom, nuevo_dpi, nuevo_tipo, nuevo_otro,nuevo_monto, sel["id"]))
-                conn.commit()
-            messagebox.showinfo("Editar", "Multa actualizada correctamente.")
-            win.destroy()
-            self._cargar_multas_modificar()
-            self._cargar_multas_ver()
+            def guardado(fila):
+                messagebox.showinfo("Editar", "Multa actualizada correctamente.")
+                win.destroy()
+
+            nuevo_monto = lambda conn: Tarifario.monto(Tarifario.tablas(conn), "multa", nuevo_tipo, sel["fecha_creacion"])
+            repositorio_multas.actualizar(sel["id"], widget=win, al_terminar=guardado,
+                                          nombre_completo=nuevo_nom, dpi=nuevo_dpi, tipo_multa=nuevo_tipo,
+                                          detalle_otro=nuevo_otro, monto=nuevo_monto)
 
         btns = tk.Frame(win)
         btns.pack(pady=8)
@@ -1851,12 +4618,8 @@ class CocodesPanel:
             return
         if not messagebox.askyesno("Confirmar", f"¿Seguro que deseas eliminar la multa de {sel['nombre_completo']}?"):
             return
-        with DatabaseManager.connect() as conn:
-            conn.execute("DELETE FROM multas WHERE id=?", (sel["id"],))
-            conn.commit()
-        messagebox.showinfo("Eliminar", "Multa eliminada correctamente.")
-        self._cargar_multas_modificar()
-        self._cargar_multas_ver()
+        repositorio_multas.eliminar(sel["id"], widget=self.modi_tree,
+                                    al_terminar=lambda _: messagebox.showinfo("Eliminar", "Multa eliminada correctamente."))
 
 class LectorMultasPanel:
     def __init__(self, ventana, app, usuario="LectorMultas", header_bg="#F3F3F4"):
@@ -1914,9 +4677,10 @@ class LectorMultasPanel:
         top = tk.Frame(self.content, bg="#FFFFFF")
         top.pack(fill="x", padx=12, pady=12)
 
-        ttk.Button(top, text="🔄 Refrescar", command=self._cargar_multas).pack(side="left", padx=6)
+        ttk.Button(top, text="🔄 Refrescar", command=lambda: repositorio_multas.refrescar(top)).pack(side="left", padx=6)
         ttk.Button(top, text="🔎 Ver detalle", command=self._ver_detalle).pack(side="left", padx=6)
         ttk.Button(top, text="⚠️ Hacer aviso", command=self._hacer_aviso).pack(side="left", padx=6)
+        ttk.Button(top, text="📨 Ronda de avisos", command=self._ronda_avisos).pack(side="left", padx=6)
 
         cols = ("id", "nombre", "dpi", "tipo", "detalle", "estado", "creado_por", "fecha", "avisos", "monto")
         self.tree = ttk.Treeview(self.content, columns=cols, show="headings")
@@ -1932,22 +4696,7 @@ class LectorMultasPanel:
             self.tree.column(col, width=120 if col not in ("nombre", "detalle") else 220, anchor="w")
 
         self.tree.pack(fill="both", expand=True, padx=12, pady=12)
-        self._cargar_multas()
-
-    def _cargar_multas(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-
-        with DatabaseManager.connect() as conn:
-            # Asegúrate de que la tabla 'multas' tenga las columnas 'avisos' y 'monto'
-            rows = conn.execute("SELECT * FROM multas ORDER BY fecha_creacion DESC").fetchall()
-
-        for r in rows:
-            self.tree.insert("", "end", values=(
-                r["id"], r["nombre_completo"], r["dpi"], r["tipo_multa"],
-                r["detalle_otro"], r["estado"], r["creado_por"], r["fecha_creacion"],
-                r.get("avisos", 0), r.get("monto", 0.00)
-            ))
+        NavegadorMultas(self.content, self.tree, RepositorioMultas.valores_avisos)
 
     def _ver_detalle(self):
         sel = self._get_selected(self.tree)
@@ -1966,24 +4715,38 @@ class LectorMultasPanel:
             messagebox.showwarning("Aviso", "Selecciona una multa para hacer un aviso.")
             return
 
-        multa_id = sel["id"]
-        with DatabaseManager.connect() as conn:
-            multa = conn.execute("SELECT avisos, monto FROM multas WHERE id = ?", (multa_id,)).fetchone()
-            avisos = multa["avisos"] + 1
-            monto = multa["monto"]
-
-            if avisos >= 3:
-                monto += 10  # Aplica mora extra
-                avisos = 0   # Reinicia contador de avisos
-                conn.execute("UPDATE multas SET monto = ?, avisos = ? WHERE id = ?", (monto, avisos, multa_id))
-                messagebox.showinfo("Mora aplicada", f"Se aplicó una mora adicional de Q10. Nuevo monto: Q{monto:.2f}")
+        def avisada(multa):
+            if multa is None:
+                messagebox.showwarning("Aviso", "La multa ya no existe.")
+            elif multa["avisos"] == 0:
+                messagebox.showinfo("Mora aplicada", f"Se aplicó una mora adicional de Q10. Nuevo monto: Q{multa['monto']:.2f}")
             else:
-                conn.execute("UPDATE multas SET avisos = ? WHERE id = ?", (avisos, multa_id))
-                messagebox.showinfo("Aviso registrado", f"Aviso número {avisos} para esta multa.")
+                messagebox.showinfo("Aviso registrado", f"Aviso número {multa['avisos']} para esta multa.")
 
-            conn.commit()
+        repositorio_multas.aviso(sel["id"], widget=self.tree, al_terminar=avisada)
+
+    def _ronda_avisos(self):
+        dias = simpledialog.askinteger("Ronda de avisos", "Avisar a las multas vigentes con más de cuántos días:",
+                                       initialvalue=30, minvalue=0, parent=self.ventana)
+        if dias is None:
+            return
+
+        def registrada(resumen):
+            messagebox.showinfo("Ronda de avisos",
+                                f"Avisos registrados: {resumen['avisadas']}\n"
+                                f"Con mora aplicada (tercer aviso): {resumen['moras']}\n"
+                                f"Mora total: Q{resumen['mora_total']:.2f}")
 
-        self._cargar_multas()
+        def contada(simulacion):
+            pendientes = simulacion["avisadas"]
+            if not pendientes:
+                messagebox.showinfo("Ronda de avisos", "No hay multas vigentes con esa antigüedad.")
+                return
+            if not messagebox.askyesno("Ronda de avisos", f"Se registrará un aviso a {pendientes} multa(s). ¿Continuar?"):
+                return
+            repositorio_multas.ronda_avisos(dias, widget=self.tree, al_terminar=registrada)
+
+        repositorio_multas.ronda_avisos(dias, simular=True, widget=self.tree, al_terminar=contada)
 
     def _get_selected(self, tree):
         sel = tree.selection()
@@ -2007,7 +4770,9 @@ class LectorMultasPanel:
 
 #panel de lector de agua
 class LectorAguaPanel:
-    TARIFA_POR_M3 = 5.0
+    ESPERA_BUSQUEDA_MS = 250
+    RECIENTES = 8
+
     def __init__(self, ventana, app, usuario="LectorAgua", header_bg="#E6F3FF"):
         self.ventana = ventana
         self.app = app
@@ -2095,18 +4860,33 @@ class LectorAguaPanel:
                           font=("Segoe UI", 16, "bold"), bg="#FFFFFF", fg="#2D3A4A")
         titulo.grid(row=0, column=0, columnspan=2, pady=(0, 15))
 
-        tk.Label(frame, text="Elegir usuario (con contador):", bg="#FFFFFF",
-                 font=("Segoe UI", 11)).grid(row=1, column=0, sticky="w", **pad)
-        self.lista_usuarios_cb = ttk.Combobox(
-            frame,
-            values=self._obtener_usuarios_con_contador(),
-            state="readonly",
-            width=50,
-            font=("Segoe UI", 10)
-        )
-        self.lista_usuarios_cb.grid(row=1, column=1, **pad)
-        if self.lista_usuarios_cb['values']:
-            self.lista_usuarios_cb.current(0)
+        tk.Label(frame, text="Buscar usuario (con contador):", bg="#FFFFFF",
+                 font=("Segoe UI", 11)).grid(row=1, column=0, sticky="nw", **pad)
+        selector = tk.Frame(frame, bg="#FFFFFF")
+        selector.grid(row=1, column=1, sticky="w", **pad)
+
+        self.usuario_seleccionado = None
+        self.recientes = OrderedDict()
+        self._busqueda_pendiente = None
+        self._busqueda_num = 0
+        self._resultados = []
+
+        self.buscar_usuario_entry = ttk.Entry(selector, width=50, font=("Segoe UI", 10))
+        self.buscar_usuario_entry.pack(fill="x")
+        self.buscar_usuario_entry.bind("<KeyRelease>", self._programar_busqueda)
+        self.buscar_usuario_entry.bind("<Down>", lambda e: self._enfocar_resultados())
+        self.buscar_usuario_entry.bind("<Return>", lambda e: self._elegir_resultado(0))
+
+        self.resultados_list = tk.Listbox(selector, height=6, width=50, font=("Segoe UI", 10),
+                                          activestyle="none", exportselection=False)
+        self.resultados_list.pack(fill="x", pady=(4, 0))
+        self.resultados_list.bind("<<ListboxSelect>>", lambda e: self._elegir_resultado())
+        self.resultados_list.bind("<Return>", lambda e: self._elegir_resultado())
+
+        self.usuario_sel_label = tk.Label(selector, text="Ningún usuario seleccionado", bg="#FFFFFF",
+                                          fg="#58606A", font=("Segoe UI", 10), anchor="w")
+        self.usuario_sel_label.pack(fill="x", pady=(4, 0))
+        self._mostrar_resultados_usuario(None)
 
         tk.Label(frame, text="Consumo (m³):", bg="#FFFFFF", font=("Segoe UI", 11)).grid(
             row=2, column=0, sticky="w", **pad)
@@ -2129,28 +4909,145 @@ class LectorAguaPanel:
 
         ttk.Button(btns, text="🧹 Limpiar", style="Big.TButton",
                    command=self._limpiar_form_lectura).pack(side="left", padx=8)
-        ttk.Button(btns, text="💾 Guardar", style="Big.TButton",
-                   command=self._guardar_lectura).pack(side="left", padx=8)
+        self.btn_guardar_lectura = ttk.Button(btns, text="💾 Guardar", style="Big.TButton",
+                                              command=self._guardar_lectura)
+        self.btn_guardar_lectura.pack(side="left", padx=8)
+        ttk.Button(btns, text="📥 Importar ruta", style="Big.TButton",
+                   command=self._importar_lecturas).pack(side="left", padx=8)
+
+        diario = tk.Frame(frame, bg="#FFFFFF")
+        diario.grid(row=5, column=0, columnspan=2, pady=(0, 10))
+        self.modo_sin_conexion = tk.BooleanVar(value=False)
+        tk.Checkbutton(diario, text="📴 Modo sin conexión (guardar en el diario local)",
+                       variable=self.modo_sin_conexion, bg="#FFFFFF",
+                       font=("Segoe UI", 10)).pack(side="left", padx=8)
+        ttk.Button(diario, text="🔄 Sincronizar diario",
+                   command=self._sincronizar_diario).pack(side="left", padx=8)
+        self.diario_label = tk.Label(diario, bg="#FFFFFF", fg="#58606A", font=("Segoe UI", 10))
+        self.diario_label.pack(side="left", padx=8)
+        self._actualizar_estado_diario()
+
+    def _importar_lecturas(self):
+        ruta = filedialog.askopenfilename(
+            title="Importar lecturas de la ruta",
+            filetypes=[("Lecturas", "*.csv *.json *.jsonl"), ("Todos", "*.*")]
+        )
+        if not ruta:
+            return
 
-    def _obtener_usuarios_con_contador(self):
-        with DatabaseManager.connect() as conn:
-            rows = conn.execute("SELECT id, nombre, dpi FROM usuarios_registrados WHERE contador = 'Sí' OR contador = 'si' ORDER BY nombre COLLATE NOCASE").fetchall()
-        vals = [f"{r['id']} - {r['nombre']} ({r['dpi']})" for r in rows]
-        return vals
+        def importado(resumen):
+            ConsultaCiudadano.olvidar()
+            texto = (f"Filas leídas: {resumen['leidas']}\n"
+                     f"Importadas: {resumen['importadas']}\n"
+                     f"Rechazadas: {resumen['rechazadas']}")
+            if resumen["rechazos"]:
+                texto += f"\n\nDetalle de rechazos en:\n{resumen['rechazos']}"
+            messagebox.showinfo("Importación de lecturas", texto)
+
+        ejecutor_bd.enviar(self.consumo_entry, lambda conn: ImportadorLecturas.importar(conn, ruta), importado,
+                           lambda e: messagebox.showerror("Error", f"No se pudo importar el archivo: {e}"))
+
+    def _actualizar_estado_diario(self):
+        pendientes = DiarioLecturas.pendientes()
+        self.diario_label.config(text=f"{pendientes} lectura(s) en el diario" if pendientes else "Diario vacío")
+
+    def _sincronizar_diario(self):
+        if not DiarioLecturas.pendientes():
+            messagebox.showinfo("Diario", "No hay lecturas pendientes en el diario local.")
+            return
+
+        def sincronizado(resumen):
+            ConsultaCiudadano.olvidar()
+            texto = (f"Entradas en el diario: {resumen['entradas']}\n"
+                     f"Importadas: {resumen['insertadas']}\n"
+                     f"Ya existentes: {resumen['duplicadas']}\n"
+                     f"Conflictos: {len(resumen['conflictos'])}\n"
+                     f"Rechazadas: {len(resumen['rechazadas'])}")
+            if resumen["rechazadas"]:
+                texto += "\n\nLas rechazadas siguen en el diario para corregirlas."
+            if resumen["reporte"]:
+                texto += f"\n\nReporte de conflictos en:\n{resumen['reporte']}"
+            messagebox.showinfo("Sincronización del diario", texto)
+            self._actualizar_estado_diario()
+
+        ejecutor_bd.enviar(self.diario_label, lambda conn: DiarioLecturas.sincronizar(conn), sincronizado,
+                           lambda e: messagebox.showerror("Error", f"No se pudo sincronizar el diario: {e}"))
+
+    def _programar_busqueda(self, event=None):
+        if event is not None and event.keysym in ("Return", "Down", "Up"):
+            return
+        # Se consulta cuando el usuario deja de escribir, no en cada tecla
+        if self._busqueda_pendiente:
+            self.buscar_usuario_entry.after_cancel(self._busqueda_pendiente)
+        self._busqueda_pendiente = self.buscar_usuario_entry.after(self.ESPERA_BUSQUEDA_MS, self._buscar_usuarios)
+
+    def _buscar_usuarios(self):
+        self._busqueda_pendiente = None
+        texto = self.buscar_usuario_entry.get().strip()
+        if not texto:
+            self._mostrar_resultados_usuario(None)
+            return
+        self._busqueda_num += 1
+        numero = self._busqueda_num
+
+        def mostrar(filas):
+            # Una respuesta que llega después de otra búsqueda más nueva se descarta
+            if numero == self._busqueda_num:
+                self._mostrar_resultados_usuario(filas)
+
+        ejecutor_bd.enviar(self.resultados_list, lambda conn: BuscadorMedidores.buscar(conn, texto), mostrar)
+
+    def _mostrar_resultados_usuario(self, filas):
+        # Sin texto de búsqueda se muestran los últimos usuarios elegidos
+        if filas is None:
+            self._resultados = [(uid, texto) for uid, texto in reversed(self.recientes.items())]
+        else:
+            self._resultados = [(f["id"], BuscadorMedidores.texto(f)) for f in filas]
+        self.resultados_list.delete(0, tk.END)
+        for _, texto in self._resultados:
+            self.resultados_list.insert(tk.END, texto)
+        if filas is not None and not filas:
+            self.resultados_list.insert(tk.END, "Sin coincidencias")
+
+    def _enfocar_resultados(self):
+        if self._resultados:
+            self.resultados_list.focus_set()
+            self.resultados_list.selection_clear(0, tk.END)
+            self.resultados_list.selection_set(0)
+            self.resultados_list.activate(0)
+
+    def _elegir_resultado(self, indice=None):
+        if indice is None:
+            sel = self.resultados_list.curselection()
+            if not sel:
+                return
+            indice = sel[0]
+        if indice >= len(self._resultados):
+            return
+        usuario_id, texto = self._resultados[indice]
+        self.usuario_seleccionado = usuario_id
+        self.usuario_sel_label.config(text=f"✔ {texto}", fg="#2E7D32")
+        self.recientes.pop(usuario_id, None)
+        self.recientes[usuario_id] = texto
+        while len(self.recientes) > self.RECIENTES:
+            self.recientes.popitem(last=False)
+        self.consumo_entry.focus_set()
 
     def _limpiar_form_lectura(self):
         self.consumo_entry.delete(0, tk.END)
         self.fecha_label.config(text=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-        self.lista_usuarios_cb['values'] = self._obtener_usuarios_con_contador()
-        if self.lista_usuarios_cb['values']:
-            self.lista_usuarios_cb.current(0)
+        self.usuario_seleccionado = None
+        self.usuario_sel_label.config(text="Ningún usuario seleccionado", fg="#58606A")
+        self.buscar_usuario_entry.delete(0, tk.END)
+        self._mostrar_resultados_usuario(None)
+        self.buscar_usuario_entry.focus_set()
 
     def _guardar_lectura(self):
-        sel = self.lista_usuarios_cb.get().strip()
+        usuario_id = self.usuario_seleccionado
         consumo_text = self.consumo_entry.get().strip()
-        if not sel:
-            messagebox.showwarning("Validación", "Seleccione un usuario con contador.")
+        if usuario_id is None:
+            messagebox.showwarning("Validación", "Busque y seleccione un usuario con contador.")
             return
         if not consumo_text:
             messagebox.showwarning("Validación", "Ingrese el consumo en m³.")
@@ -2163,31 +5060,286 @@ class LectorAguaPanel:
             messagebox.showwarning("Validación", "El consumo debe ser un número válido (ej. 12.5).")
             return
 
-        try:
-            usuario_id = int(sel.split(" - ")[0])
-        except:
-            messagebox.showerror("Error", "Formato de usuario inválido.")
-            return
-
         fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        total = consumo * LectorAguaPanel.TARIFA_POR_M3
 
-        try:
-            with DatabaseManager.connect() as conn:
-                conn.execute("""
+        if self.modo_sin_conexion.get():
+            try:
+                DiarioLecturas.registrar(usuario_id, consumo, fecha)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudo escribir en el diario: {e}")
+                return
+            messagebox.showinfo("Lectura", f"Lectura guardada en el diario local.\nUsuario ID: {usuario_id}\n"
+                                           f"Consumo: {consumo:.2f} m³\nSincronice al volver a la oficina.")
+            self._actualizar_estado_diario()
+            self._limpiar_form_lectura()
+            return
+
+        def guardar(conn):
+            with DatabaseManager.transaccion(conn):
+                cliente = conn.execute("SELECT categoria, dpi FROM usuarios_registrados WHERE id = ?",
+                                       (usuario_id,)).fetchone()
+                total = Tarifario.cargo_agua(Tarifario.tablas(conn), consumo, cliente["categoria"], fecha)
+                lectura_id = conn.execute("""
                     INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado)
                     VALUES (?, ?, ?, ?, 0)
-                """, (usuario_id, consumo, total, fecha))
-                conn.commit()
+                """, (usuario_id, consumo, total, fecha)).lastrowid
+            ConsultaCiudadano.olvidar(cliente["dpi"])
+            # El trigger de consumo ya comparó la lectura con el historial del cliente
+            anomalia = conn.execute("SELECT * FROM anomalias_consumo WHERE lectura_id = ?",
+                                    (lectura_id,)).fetchone()
+            return total, anomalia
+
+        def guardada(resultado):
+            total, anomalia = resultado
+            self.btn_guardar_lectura.config(state="normal")
             messagebox.showinfo("Lectura", f"Lectura guardada.\nUsuario ID: {usuario_id}\nConsumo: {consumo:.2f} m³\nTotal: Q{total:.2f}")
+            if anomalia:
+                messagebox.showwarning("Consumo atípico",
+                                       f"El consumo de {consumo:.2f} m³ se aleja del promedio del cliente "
+                                       f"({anomalia['media']:.2f} m³, {DetectorConsumo.puntaje(anomalia):+.1f} "
+                                       "desviaciones).\nVerifique el contador; la lectura quedó marcada para revisión.")
             self._limpiar_form_lectura()
-        except Exception as e:
+
+        def fallida(e):
+            self.btn_guardar_lectura.config(state="normal")
             messagebox.showerror("Error", f"Error al guardar la lectura: {str(e)}")
 
+        # Un segundo clic mientras se guarda duplicaría la lectura
+        self.btn_guardar_lectura.config(state="disabled")
+        ejecutor_bd.enviar(self.btn_guardar_lectura, guardar, guardada, fallida)
+
+atexit.register(DatabaseManager.close)
+atexit.register(ejecutor_bd.cerrar)
+
+def _comando_verificar_indices(args):
+    fallos = DatabaseManager.verificar_indices()
+    for nombre, plan in fallos.items():
+        print(f"✗ {nombre}: " + " | ".join(plan))
+    for nombre, motivo in RECORRIDOS_PERMITIDOS.items():
+        print(f"- {nombre}: recorrido permitido: {motivo}")
+    verificadas = len(CONSULTAS_CRITICAS) - len(RECORRIDOS_PERMITIDOS)
+    print(f"{verificadas - len(fallos)}/{verificadas} consultas usan índice")
+    return 1 if fallos else 0
+
+def _comando_reconstruir_saldos(args):
+    with DatabaseManager.connect() as conn:
+        with DatabaseManager.transaccion(conn):
+            diferencias = SaldosAgua.reconstruir(conn)
+    print(f"Saldos de agua reconstruidos; {diferencias} cliente(s) no cuadraban")
+    return 0
+
+def _comando_cierre_agua(args):
+    inicio = time.perf_counter()
+    simular = args.simular or bool(args.tarifa) or args.mora is not None
+    with DatabaseManager.connect() as conn:
+        if simular:
+            try:
+                tarifas = Tarifario.candidatas(conn, args.tarifa) if args.tarifa else None
+            except ValueError as e:
+                print(e)
+                return 1
+            resumen = FacturacionAgua.resumir(
+                FacturacionAgua.calcular(conn, args.periodo, tarifas, args.mora))
+        else:
+            resumen = FacturacionAgua.cerrar(conn, args.periodo)
+    transcurrido = (time.perf_counter() - inicio) * 1000
+    print(f"{'Simulación' if simular else 'Cierre'} {args.periodo or date.today().strftime('%Y-%m')}: "
+          f"{resumen['clientes'] or 0} clientes, {resumen['lecturas'] or 0} lecturas pendientes")
+    print(f"  Cargo Q{resumen['cargo'] or 0:.2f} + Mora Q{resumen['mora'] or 0:.2f} = "
+          f"Q{resumen['total'] or 0:.2f}  ({transcurrido:.0f} ms)")
+    return 0
+
+def _comando_importar_lecturas(args):
+    inicio = time.perf_counter()
+    with DatabaseManager.connect() as conn:
+        try:
+            resumen = ImportadorLecturas.importar(conn, args.archivo, args.rechazos)
+        except (ValueError, OSError) as e:
+            print(e)
+            return 1
+    print(f"{resumen['importadas']} de {resumen['leidas']} lecturas importadas "
+          f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+    if resumen["rechazos"]:
+        print(f"{resumen['rechazadas']} rechazadas; detalle en {resumen['rechazos']}")
+    return 0
+
+def _comando_sincronizar_diario(args):
+    with DatabaseManager.connect() as conn:
+        resumen = DiarioLecturas.sincronizar(conn, args.diario)
+    if not resumen["entradas"]:
+        print("No hay lecturas pendientes en el diario")
+        return 0
+    print(f"{resumen['insertadas']} importadas, {resumen['duplicadas']} ya existentes, "
+          f"{len(resumen['conflictos'])} conflictos, {len(resumen['rechazadas'])} rechazadas")
+    for usuario_id, periodo, detalle in resumen["conflictos"]:
+        print(f"  ⚠ usuario {usuario_id} {periodo}: {detalle}")
+    print(f"Diario archivado en {resumen['archivo']}")
+    if resumen["rechazadas"]:
+        print(f"{len(resumen['rechazadas'])} rechazada(s) siguen en {args.diario or DiarioLecturas.RUTA}")
+    return 0
+
+def _comando_cargos_tarifa_fija(args):
+    with DatabaseManager.connect() as conn:
+        generados = FacturacionAgua.generar_cargos_fijos(conn, args.periodo)
+    print(f"{generados} cargo(s) de tarifa fija generados para {args.periodo or date.today().strftime('%Y-%m')}")
+    return 0
+
+def _comando_revisar_consumos(args):
+    with DatabaseManager.connect() as conn:
+        if args.umbral is not None:
+            DetectorConsumo.fijar_umbral(conn, args.umbral)
+            conn.commit()
+        umbral = DetectorConsumo.umbral(conn)
+        marcadas = DetectorConsumo.revisar(conn, umbral)
+        pendientes = DetectorConsumo.pendientes(conn)
+    print(f"{marcadas} lectura(s) nuevas fuera de ±{umbral:g} desviaciones; {len(pendientes)} sin revisar")
+    for a in pendientes:
+        print(f"  ⚠ {a['fecha']} {a['nombre']} ({a['dpi']}): {a['consumo']:.2f} m³, "
+              f"promedio {a['media']:.2f} m³ ({DetectorConsumo.puntaje(a):+.1f})")
+    return 0
+
+def _comando_tarifas(args):
+    with DatabaseManager.connect() as conn:
+        if args.fijar:
+            servicio, categoria, valor = args.fijar
+            try:
+                Tarifario.fijar(conn, servicio, categoria, float(valor), args.desde, args.vigente)
+            except ValueError as e:
+                conn.rollback()
+                print(e)
+                return 1
+            conn.commit()
+        filas = conn.execute("""
+            SELECT servicio, categoria, vigente_desde, desde, valor FROM tarifas
+            ORDER BY servicio, categoria, vigente_desde, desde
+        """).fetchall()
+    for f in filas:
+        bloque = {"agua": f" desde {f['desde']:g} m³", "ornato": f" salario > Q{f['desde']:g}"}.get(f["servicio"], "")
+        print(f"{f['servicio']:<10} {f['categoria']:<36} {f['vigente_desde']}{bloque}: Q{f['valor']:.2f}")
+    return 0
+
+def _comando_proyeccion_ornato(args):
+    fecha = date.fromisoformat(args.fecha) if args.fecha else date.today()
+    with DatabaseManager.connect() as conn:
+        tramos = Ornato.proyeccion(conn, fecha)
+    print(f"Proyección de ornato {fecha.year} ({Ornato.categoria(fecha).lower()}, al {fecha.isoformat()})")
+    for t in tramos:
+        print(f"  Q{t['monto']:>7.2f}: {t['ciudadanos']} ciudadano(s), {t['pagados']} pagado(s), "
+              f"esperado Q{t['total']:.2f}, por cobrar Q{t['por_cobrar']:.2f}")
+    print(f"  Total por cobrar: Q{sum(t['por_cobrar'] for t in tramos):.2f}")
+    return 0
+
+def _comando_campana_ornato(args):
+    anio = args.anio or date.today().year
+    with DatabaseManager.connect() as conn:
+        if not args.reporte:
+            print(f"{Ornato.generar_campana(conn, anio)} boleta(s) pendientes generadas para {anio}")
+        r = Ornato.recaudacion(conn, anio)
+    tasa = (r["pagadas"] or 0) / r["emitidas"] * 100 if r["emitidas"] else 0
+    print(f"Ornato {anio}: {r['emitidas']} emitidas, {r['pagadas'] or 0} pagadas ({tasa:.1f}%)")
+    print(f"  Recaudado Q{r['recaudado'] or 0:.2f}, pendiente Q{r['pendiente'] or 0:.2f}")
+    return 0
+
+def _comando_avisos_multas(args):
+    inicio = time.perf_counter()
+    resumen = repositorio_multas.ronda_avisos(args.dias, args.estado, args.simular)
+    transcurrido = (time.perf_counter() - inicio) * 1000
+    if args.simular:
+        print(f"Simulación: {resumen['avisadas']} multa(s) '{args.estado}' creadas hasta {resumen['corte']}")
+        return 0
+    print(f"{resumen['avisadas']} aviso(s) registrados a multas '{args.estado}' creadas hasta {resumen['corte']}")
+    print(f"  {resumen['moras']} llegaron al tercer aviso: mora total Q{resumen['mora_total']:.2f}  "
+          f"({transcurrido:.0f} ms)")
+    return 0
+
+def _comando_estado_cuenta(args):
+    with DatabaseManager.connect() as conn:
+        r = ConsultaCiudadano.estado_cuenta(conn, args.dpi)
+    print(f"DPI {r['dpi']}: {r['nombre'] or 'sin registros'}")
+    for c in r["agua"]:
+        print(f"  Agua #{c['id']} (casa {c['numero_casa']}): {c['lecturas']} lectura(s) pendientes, "
+              f"consumo Q{c['consumo']:.2f} + mora Q{c['mora']:.2f} = Q{c['total']:.2f}")
+    o = r["ornato"]
+    if o is not None:
+        estado = "pagado" if o["pagado"] else "pendiente"
+        print(f"  Ornato {o['anio']}: {estado}, Q{o['monto']:.2f}")
+    for m in r["multas"]:
+        print(f"  Multa #{m['id']} {m['tipo_multa']} ({m['fecha_creacion']}): Q{m['monto']:.2f}")
+    print(f"  Total pendiente: Q{r['total']:.2f}")
+    return 0
+
+def _crear_parser():
+    parser = argparse.ArgumentParser(description="Sistema de Gestión Municipal")
+    parser.add_argument("--db", default=None, help="Ruta de la base de datos (por defecto BD_municipalidad.db)")
+    sub = parser.add_subparsers(dest="comando")
+
+    p = sub.add_parser("verificar-indices", help="Revisa con EXPLAIN QUERY PLAN que las consultas críticas usen índices")
+    p.set_defaults(func=_comando_verificar_indices)
+
+    p = sub.add_parser("reconstruir-saldos", help="Recalcula saldos_agua desde lecturas_agua")
+    p.set_defaults(func=_comando_reconstruir_saldos)
+
+    p = sub.add_parser("cierre-agua", help="Factura la mora de todo el padrón y guarda el cierre del mes")
+    p.add_argument("--periodo", help="Mes a cerrar, AAAA-MM (por defecto el actual)")
+    p.add_argument("--simular", action="store_true", help="Calcula sin guardar el cierre")
+    p.add_argument("--tarifa", nargs=4, action="append", default=[],
+                   metavar=("SERVICIO", "CATEGORIA", "DESDE", "VALOR"),
+                   help="Bloque de tarifa propuesto, agua o agua_fija; se puede repetir (implica --simular)")
+    p.add_argument("--mora", type=float, help="Mora mensual propuesta (implica --simular)")
+    p.set_defaults(func=_comando_cierre_agua)
+
+    p = sub.add_parser("importar-lecturas", help="Importa las lecturas de una ruta desde CSV/JSON")
+    p.add_argument("archivo", help="Archivo .csv, .json o .jsonl")
+    p.add_argument("--rechazos", help="Archivo CSV de rechazos (por defecto <archivo>.rechazos.csv)")
+    p.set_defaults(func=_comando_importar_lecturas)
+
+    p = sub.add_parser("sincronizar-diario", help="Pasa a la base las lecturas del diario sin conexión")
+    p.add_argument("--diario", help=f"Ruta del diario (por defecto {DiarioLecturas.RUTA})")
+    p.set_defaults(func=_comando_sincronizar_diario)
+
+    p = sub.add_parser("cargos-tarifa-fija", help="Genera el cargo mensual de los clientes sin contador")
+    p.add_argument("--periodo", help="Mes a facturar, AAAA-MM (por defecto el actual)")
+    p.set_defaults(func=_comando_cargos_tarifa_fija)
+
+    p = sub.add_parser("revisar-consumos", help="Marca las lecturas con consumo atípico en todo el historial")
+    p.add_argument("--umbral", type=float, help="Desviaciones estándar permitidas (se guarda como nuevo umbral)")
+    p.set_defaults(func=_comando_revisar_consumos)
+
+    p = sub.add_parser("tarifas", help="Lista las tarifas o agrega una (bloques de agua, tarifa fija, multas, ornato)")
+    p.add_argument("--fijar", nargs=3, metavar=("SERVICIO", "CATEGORIA", "VALOR"),
+                   help="Servicio agua|agua_fija|multa|ornato, categoría (o tipo de multa) y valor")
+    p.add_argument("--desde", type=float, default=0.0, help="Inicio del bloque: m³ (agua) o salario (ornato)")
+    p.add_argument("--vigente", help="Fecha de vigencia AAAA-MM-DD (por defecto hoy)")
+    p.set_defaults(func=_comando_tarifas)
+
+    p = sub.add_parser("proyeccion-ornato", help="Monto esperado y por cobrar del boleto de ornato por tramo")
+    p.add_argument("--fecha", help="Fecha de cobro AAAA-MM-DD (define el año y si aplica multa; por defecto hoy)")
+    p.set_defaults(func=_comando_proyeccion_ornato)
+
+    p = sub.add_parser("campana-ornato", help="Genera las boletas de ornato pendientes del año para todo el padrón")
+    p.add_argument("--anio", type=int, help="Año de la campaña (por defecto el actual)")
+    p.add_argument("--reporte", action="store_true", help="Solo muestra la recaudación, sin generar boletas")
+    p.set_defaults(func=_comando_campana_ornato)
+
+    p = sub.add_parser("avisos-multas", help="Registra un aviso a todas las multas de un estado con cierta antigüedad")
+    p.add_argument("--dias", type=int, default=30, help="Antigüedad mínima en días (por defecto 30)")
+    p.add_argument("--estado", default="Vigente", help="Estado de las multas (por defecto Vigente)")
+    p.add_argument("--simular", action="store_true", help="Solo cuenta las multas que recibirían aviso")
+    p.set_defaults(func=_comando_avisos_multas)
+
+    p = sub.add_parser("estado-cuenta", help="Lo que adeuda una persona en agua, ornato y multas según su DPI")
+    p.add_argument("dpi", help="DPI de la persona")
+    p.set_defaults(func=_comando_estado_cuenta)
+    return parser
+
 # Programa principal
 if __name__ == "__main__":
+    args = _crear_parser().parse_args()
+    if args.db:
+        DB_NAME = args.db
     DatabaseManager.init_tables()
-    inicializar_usuarios()
+    if args.comando:
+        sys.exit(args.func(args))
     root = tk.Tk()
     app = Graficos(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import proyecto_final as pf
+
+
+@pytest.fixture
+def bd(tmp_path, monkeypatch):
+    # Base nueva por prueba, con su propio pool y el esquema en la última migración
+    ruta = str(tmp_path / "municipalidad.db")
+    monkeypatch.setattr(pf, "DB_NAME", ruta)
+    monkeypatch.setattr(pf.DatabaseManager, "pool", pf.ConnectionPool())
+    monkeypatch.setattr(pf.DatabaseManager, "_esquema_listo", False)
+    yield ruta
+    pf.DatabaseManager.close()
+
+
+@pytest.fixture
+def conn(bd):
+    pf.DatabaseManager.init_tables()
+    with pf.DatabaseManager.connect() as conn:
+        yield conn
+
+
+def crear_usuario(conn, nombre="Ana López", categoria="Residencial"):
+    return conn.execute("""
+        INSERT INTO usuarios_registrados (nombre, direccion, numero_casa, dpi, nit, servicio_agua, contador, categoria)
+        VALUES (?, 'Zona 1', '1', ?, 'CF', 'Sí', 'Sí', ?)
+    """, (nombre, f"DPI-{nombre}", categoria)).lastrowid
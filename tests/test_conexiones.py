@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+
+import pytest
+
+import proyecto_final as pf
+
+
+def _contar(conn, tabla="configuracion"):
+    return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+
+def test_conexion_usa_wal_y_row_factory(conn):
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert conn.row_factory is sqlite3.Row
+
+
+def test_mismo_hilo_recibe_la_misma_conexion(bd):
+    with pf.DatabaseManager.connect() as externa:
+        with pf.DatabaseManager.connect() as interna:
+            assert interna is externa
+    with pf.DatabaseManager.connect() as siguiente:
+        assert siguiente is externa
+    stats = pf.DatabaseManager.stats()
+    assert (stats["abiertas"], stats["reusadas"], stats["en_uso"]) == (1, 1, 0)
+
+
+def test_otro_hilo_recibe_otra_conexion(bd):
+    otras = []
+
+    def en_hilo():
+        with pf.DatabaseManager.connect() as conn:
+            otras.append(conn)
+
+    with pf.DatabaseManager.connect() as propia:
+        hilo = threading.Thread(target=en_hilo)
+        hilo.start()
+        hilo.join()
+    assert otras and otras[0] is not propia
+
+
+def test_pool_lleno_espera_y_falla(bd):
+    pool = pf.ConnectionPool(bd, max_conexiones=1, espera_maxima=0.05)
+    ocupada = pool.adquirir()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.adquirir()
+    pool.liberar(ocupada)
+    assert pool.adquirir() is ocupada
+    pool.liberar(ocupada)
+    pool.cerrar()
+
+
+def test_error_dentro_de_connect_deshace_la_transaccion(conn):
+    antes = _contar(conn)
+    conn.commit()
+    with pytest.raises(RuntimeError):
+        with pf.DatabaseManager.connect() as anidada:
+            anidada.execute("INSERT INTO configuracion (clave, valor) VALUES ('prueba', '1')")
+            raise RuntimeError
+    # La conexión reentrante no cierra la transacción del llamador
+    assert conn.in_transaction
+    conn.rollback()
+    assert _contar(conn) == antes
+
+
+def test_transaccion_sin_transaccion_abierta_confirma(conn):
+    conn.commit()
+    with pf.DatabaseManager.transaccion(conn):
+        conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('prueba', '1')")
+    assert not conn.in_transaction
+    with pytest.raises(RuntimeError):
+        with pf.DatabaseManager.transaccion(conn):
+            conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('otra', '1')")
+            raise RuntimeError
+    assert not conn.in_transaction
+    assert [r["clave"] for r in conn.execute("SELECT clave FROM configuracion WHERE clave IN ('prueba', 'otra')")] \
+        == ["prueba"]
+
+
+def test_transaccion_anidada_deshace_solo_el_bloque_interno(conn):
+    conn.commit()
+    antes = _contar(conn)
+    conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('externa', '1')")
+    with pytest.raises(RuntimeError):
+        with pf.DatabaseManager.transaccion(conn):
+            conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('interna', '1')")
+            raise RuntimeError
+    assert conn.in_transaction
+    with pf.DatabaseManager.transaccion(conn):
+        conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('segunda', '1')")
+    # El bloque anidado no confirma: el llamador decide
+    assert conn.in_transaction
+    conn.commit()
+    assert _contar(conn) == antes + 2
+    assert conn.execute("SELECT COUNT(*) FROM configuracion WHERE clave = 'interna'").fetchone()[0] == 0
+
+
+def test_helper_dentro_de_una_transaccion_abierta(conn):
+    conn.execute("INSERT INTO ciudadanos_ornato (nombre, dpi, nit, salario) VALUES ('Ana', '111', 'CF', 2500)")
+    assert pf.Ornato.generar_campana(conn, 2025) == 1
+    # La campaña no confirma el trabajo del llamador; deshacerlo deshace todo
+    assert conn.in_transaction
+    conn.rollback()
+    assert _contar(conn, "ciudadanos_ornato") == 0
+    assert _contar(conn, "boletas_ornato") == 0
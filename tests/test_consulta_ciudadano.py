@@ -0,0 +1,44 @@
+import proyecto_final as pf
+from conftest import crear_usuario
+
+
+def _datos(conn):
+    usuario = crear_usuario(conn, "Ana")
+    conn.execute("INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado) "
+                 "VALUES (?, 10, 50, NULL, 0)", (usuario,))
+    conn.execute("INSERT INTO multas (nombre_completo, dpi, tipo_multa, monto, creado_por, fecha_creacion) "
+                 "VALUES ('Ana', 'DPI-Ana', 'Otro', 100, 'admin', '2025-01-01 00:00:00')")
+    conn.commit()
+    return "DPI-Ana"
+
+
+def test_estado_de_cuenta_junta_las_tres_partes(conn):
+    pf.ConsultaCiudadano.olvidar()
+    dpi = _datos(conn)
+    resultado = pf.ConsultaCiudadano.estado_cuenta(conn, dpi)
+    assert resultado["nombre"] == "Ana"
+    assert [c["total"] for c in resultado["agua"]] == [50]
+    assert [m["monto"] for m in resultado["multas"]] == [100]
+    assert resultado["ornato"] is None and resultado["total"] == 150
+    # La lectura usa su propia transacción y no la deja abierta
+    assert not conn.in_transaction
+    assert pf.ConsultaCiudadano._del_cache(dpi) is resultado
+
+
+def test_resultado_leido_antes_de_olvidar_no_se_guarda(conn):
+    pf.ConsultaCiudadano.olvidar()
+    dpi = _datos(conn)
+    generacion = pf.ConsultaCiudadano.generacion()
+    resultado = pf.ConsultaCiudadano.leer(conn, dpi)
+    # Una escritura llega entre la lectura y el guardado
+    pf.ConsultaCiudadano.olvidar(dpi)
+    pf.ConsultaCiudadano._guardar(dpi, resultado, generacion)
+    assert pf.ConsultaCiudadano._del_cache(dpi) is None
+
+
+def test_leer_dentro_de_una_transaccion_no_la_cierra(conn):
+    dpi = _datos(conn)
+    conn.execute("UPDATE multas SET monto = 200 WHERE dpi = ?", (dpi,))
+    assert pf.ConsultaCiudadano.leer(conn, dpi)["total"] == 250
+    assert conn.in_transaction
+    conn.rollback()
@@ -0,0 +1,55 @@
+import json
+
+import proyecto_final as pf
+from conftest import crear_usuario
+
+
+def test_rechazadas_vuelven_al_diario(conn, tmp_path):
+    usuario = crear_usuario(conn)
+    conn.commit()
+    diario = str(tmp_path / "diario.jsonl")
+    pf.DiarioLecturas.registrar(usuario, 10, "2025-01-05", diario)
+    pf.DiarioLecturas.registrar(usuario + 99, 7, "2025-01-06", diario)
+    with open(diario, "a", encoding="utf-8") as f:
+        f.write("{roto\n")
+
+    resumen = pf.DiarioLecturas.sincronizar(conn, diario)
+
+    assert (resumen["insertadas"], len(resumen["rechazadas"])) == (1, 2)
+    with open(diario, encoding="utf-8") as f:
+        lineas = f.read().splitlines()
+    assert json.loads(lineas[0])["usuario_id"] == usuario + 99
+    assert lineas[1] == "{roto"
+    assert pf.DiarioLecturas.pendientes(diario) == 2
+
+
+def test_diario_limpio_queda_archivado(conn, tmp_path):
+    usuario = crear_usuario(conn)
+    conn.commit()
+    diario = str(tmp_path / "diario.jsonl")
+    pf.DiarioLecturas.registrar(usuario, 10, "2025-01-05", diario)
+
+    resumen = pf.DiarioLecturas.sincronizar(conn, diario)
+
+    assert resumen["insertadas"] == 1 and resumen["reporte"] is None
+    assert pf.DiarioLecturas.pendientes(diario) == 0
+
+
+def test_cargo_fijo_del_mes_no_bloquea_la_lectura(conn, tmp_path):
+    usuario = crear_usuario(conn)
+    conn.execute("""
+        INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado, tipo, periodo)
+        VALUES (?, NULL, 20, '2025-01-01 00:00:00', 0, 'Tarifa fija', '2025-01')
+    """, (usuario,))
+    conn.commit()
+    diario = str(tmp_path / "diario.jsonl")
+    pf.DiarioLecturas.registrar(usuario, 10, "2025-01-05", diario)
+    pf.DiarioLecturas.registrar(usuario, 8, "2025-02-05", diario)
+
+    resumen = pf.DiarioLecturas.sincronizar(conn, diario)
+
+    assert (resumen["insertadas"], resumen["conflictos"]) == (2, [])
+    # Una segunda lectura de contador en el mismo mes sí es un conflicto
+    pf.DiarioLecturas.registrar(usuario, 12, "2025-01-20", diario)
+    resumen = pf.DiarioLecturas.sincronizar(conn, diario)
+    assert resumen["insertadas"] == 0 and len(resumen["conflictos"]) == 1
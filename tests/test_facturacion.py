@@ -0,0 +1,53 @@
+import pytest
+
+import proyecto_final as pf
+from conftest import crear_usuario
+
+
+def _lecturas(conn, usuario, consumos):
+    tablas = pf.Tarifario.tablas(conn)
+    for mes, consumo in enumerate(consumos, start=1):
+        fecha = f"2024-{mes:02d}-05 10:00:00"
+        conn.execute("INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado) "
+                     "VALUES (?, ?, ?, ?, 0)",
+                     (usuario, consumo, pf.Tarifario.cargo_agua(tablas, consumo, "Residencial", fecha), fecha))
+
+
+def _cargos(filas):
+    return {f["usuario_id"]: f["cargo"] for f in filas}
+
+
+def test_simulacion_con_las_mismas_tarifas_coincide_con_la_facturacion(conn):
+    pf.Tarifario.fijar(conn, "agua", "Residencial", 8.0, desde=10, vigente_desde="2000-01-01")
+    _lecturas(conn, crear_usuario(conn), [5, 15, 20])
+    tablas = pf.Tarifario.candidatas(conn, [("agua", "Residencial", 10, 8.0)])
+    assert _cargos(pf.FacturacionAgua.calcular(conn, "2024-12", tablas)) \
+        == _cargos(pf.FacturacionAgua.calcular(conn, "2024-12"))
+    conn.rollback()
+
+
+def test_simulacion_de_un_bloque_nuevo(conn):
+    usuario = crear_usuario(conn)
+    _lecturas(conn, usuario, [5, 15])
+    tablas = pf.Tarifario.candidatas(conn, [("agua", "Residencial", 10, 8.0)])
+    # 5 m³ a Q5; 15 m³ = 10 a Q5 + 5 a Q8
+    assert _cargos(pf.FacturacionAgua.calcular(conn, "2024-12", tablas)) == {usuario: 25 + 90}
+    # Las tarifas reales no cambian
+    assert pf.Tarifario.cargo_agua(pf.Tarifario.tablas(conn), 15) == 75
+    conn.rollback()
+
+
+def test_simulacion_de_tarifa_fija(conn):
+    usuario = conn.execute("""
+        INSERT INTO usuarios_registrados (nombre, dpi, servicio_agua, contador) VALUES ('Sin contador', '9', 'Sí', 'No')
+    """).lastrowid
+    pf.FacturacionAgua.generar_cargos_fijos(conn, "2024-01")
+    tablas = pf.Tarifario.candidatas(conn, [("agua_fija", "Residencial", 0, 30.0)])
+    assert _cargos(pf.FacturacionAgua.calcular(conn, "2024-12")) == {usuario: 20}
+    assert _cargos(pf.FacturacionAgua.calcular(conn, "2024-12", tablas)) == {usuario: 30}
+    conn.rollback()
+
+
+def test_tarifa_candidata_necesita_bloque_desde_cero(conn):
+    with pytest.raises(ValueError):
+        pf.Tarifario.candidatas(conn, [("agua", "Comercial", 10, 8.0)])
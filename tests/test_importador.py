@@ -0,0 +1,52 @@
+import csv
+import json
+
+import pytest
+
+import proyecto_final as pf
+from conftest import crear_usuario
+
+
+def _validar(conn, fila):
+    ids, por_dpi = pf.ImportadorLecturas.medidores(conn)
+    return pf.ImportadorLecturas.validar(fila, ids, por_dpi, "2025-01-01 00:00:00", pf.Tarifario.tablas(conn))
+
+
+@pytest.mark.parametrize("valor", [None, "{id}", "{id}.0", " {id} "])
+def test_usuario_id_entero_en_texto_o_numero(conn, valor):
+    usuario = crear_usuario(conn)
+    fila = {"consumo_m3": 10, "fecha": "2025-01-05"}
+    fila["usuario_id"] = usuario if valor is None else valor.format(id=usuario)
+    assert _validar(conn, fila) == ((usuario, 10.0, 50.0, "2025-01-05 00:00:00"), None)
+    assert _validar(conn, dict(fila, usuario_id=float(usuario)))[0][0] == usuario
+
+
+@pytest.mark.parametrize("valor", ["1.5", "abc", 2.5])
+def test_usuario_id_no_entero_se_rechaza(conn, valor):
+    crear_usuario(conn)
+    lectura, motivo = _validar(conn, {"usuario_id": valor, "consumo_m3": 10})
+    assert lectura is None and motivo.startswith("usuario_id inválido")
+
+
+def test_jsonl_con_lineas_ilegibles(conn, tmp_path):
+    usuario = crear_usuario(conn)
+    conn.commit()
+    ruta = tmp_path / "lecturas.jsonl"
+    ruta.write_text(json.dumps({"usuario_id": float(usuario), "consumo_m3": 5, "fecha": "2025-01-05"}) + "\n"
+                    + "{roto\n[1, 2]\n", encoding="utf-8")
+
+    resumen = pf.ImportadorLecturas.importar(conn, str(ruta))
+
+    assert (resumen["leidas"], resumen["importadas"], resumen["rechazadas"]) == (3, 1, 2)
+    with open(resumen["rechazos"], encoding="utf-8") as f:
+        filas = list(csv.reader(f))
+    assert [f[0] for f in filas[1:]] == ["2", "3"]
+    assert filas[1][2] == "{roto"
+
+
+def test_json_ilegible_no_deja_archivo_de_rechazos(conn, tmp_path):
+    ruta = tmp_path / "lecturas.json"
+    ruta.write_text('{"lecturas": [', encoding="utf-8")
+    with pytest.raises(ValueError):
+        pf.ImportadorLecturas.importar(conn, str(ruta))
+    assert not (tmp_path / "lecturas.rechazos.csv").exists()
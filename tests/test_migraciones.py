@@ -0,0 +1,112 @@
+import sqlite3
+
+import proyecto_final as pf
+
+# Esquema que creaba la versión anterior a las migraciones (sin PRAGMA user_version)
+ESQUEMA_ORIGINAL = """
+    CREATE TABLE usuarios_registrados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT, direccion TEXT, numero_casa TEXT, dpi TEXT, nit TEXT, servicio_agua TEXT, contador TEXT
+    );
+    CREATE TABLE multas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre_completo TEXT NOT NULL,
+        dpi TEXT NOT NULL,
+        tipo_multa TEXT NOT NULL,
+        detalle_otro TEXT,
+        monto REAL NOT NULL DEFAULT 0,
+        avisos INTEGER NOT NULL DEFAULT 0,
+        estado TEXT NOT NULL DEFAULT 'Vigente',
+        creado_por TEXT,
+        fecha_creacion TEXT
+    );
+    CREATE TABLE lecturas_agua (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER,
+        consumo_m3 REAL,
+        total_pagar REAL,
+        fecha TEXT,
+        pagado INTEGER DEFAULT 0,
+        fecha_pago TEXT,
+        FOREIGN KEY(usuario_id) REFERENCES usuarios_registrados(id)
+    );
+    CREATE TABLE ciudadanos_ornato (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        dpi TEXT UNIQUE NOT NULL,
+        nit TEXT,
+        salario REAL NOT NULL
+    );
+    CREATE TABLE boletas_ornato (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ciudadano_id INTEGER NOT NULL,
+        monto REAL NOT NULL,
+        con_multa INTEGER DEFAULT 0,
+        fecha_pago TEXT,
+        anio INTEGER,
+        FOREIGN KEY (ciudadano_id) REFERENCES ciudadanos_ornato(id)
+    );
+    INSERT INTO usuarios_registrados (nombre, dpi, servicio_agua, contador) VALUES
+        ('Ana López', '111', 'Sí', 'Sí'), ('Luis Pérez', '222', 'Sí', 'No');
+    INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado) VALUES
+        (1, 10, 50, '2024-01-05 10:00:00', 0),
+        (1, 12, 60, '2024-02-05 10:00:00', 1),
+        (1, 8, 40, NULL, 0),
+        (2, 5, 25, '2024-01-07 10:00:00', 0);
+    INSERT INTO multas (nombre_completo, dpi, tipo_multa, monto, creado_por, fecha_creacion) VALUES
+        ('Ana López', '111', 'Otro', 50, 'admin', '2024-01-01 08:00:00');
+    INSERT INTO ciudadanos_ornato (nombre, dpi, salario) VALUES ('Ana López', '111', 2500);
+    INSERT INTO boletas_ornato (ciudadano_id, monto, con_multa, fecha_pago, anio) VALUES
+        (1, 15, 0, '2024-01-10', 2024),
+        (1, 15, 0, '2024-01-11', 2024);
+"""
+
+
+def _objetos(ruta):
+    with sqlite3.connect(ruta) as conn:
+        return {(tipo, nombre) for tipo, nombre in conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+
+
+def test_migra_la_base_original_hasta_la_ultima_version(bd):
+    with sqlite3.connect(bd) as conn:
+        conn.executescript(ESQUEMA_ORIGINAL)
+
+    pf.DatabaseManager.init_tables()
+
+    with pf.DatabaseManager.connect() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == pf.MIGRACIONES[-1][0]
+        assert conn.execute("SELECT COUNT(*) FROM lecturas_agua").fetchone()[0] == 4
+        assert conn.execute("SELECT COUNT(*) FROM multas").fetchone()[0] == 1
+        # La boleta duplicada se aparta y queda una por ciudadano y año
+        assert conn.execute("SELECT COUNT(*) FROM boletas_ornato").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM boletas_ornato_duplicadas").fetchone()[0] == 1
+        # Los saldos calculados por las migraciones cuadran con las lecturas
+        assert pf.SaldosAgua.reconstruir(conn) == 0
+        saldo = pf.SaldosAgua.consultar(conn, 1)
+        assert (saldo["total_pendiente"], saldo["lecturas_pendientes"], saldo["lecturas_total"]) == (90, 2, 3)
+        conn.rollback()
+
+
+def test_base_migrada_y_base_nueva_tienen_el_mismo_esquema(bd, tmp_path, monkeypatch):
+    with sqlite3.connect(bd) as conn:
+        conn.executescript(ESQUEMA_ORIGINAL)
+    pf.DatabaseManager.init_tables()
+    migrada = _objetos(bd)
+    pf.DatabaseManager.close()
+
+    nueva = str(tmp_path / "nueva.db")
+    monkeypatch.setattr(pf, "DB_NAME", nueva)
+    monkeypatch.setattr(pf.DatabaseManager, "pool", pf.ConnectionPool())
+    monkeypatch.setattr(pf.DatabaseManager, "_esquema_listo", False)
+    pf.DatabaseManager.init_tables()
+
+    assert _objetos(nueva) == migrada
+
+
+def test_init_tables_no_repite_migraciones(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    pf.DatabaseManager._esquema_listo = False
+    pf.DatabaseManager.init_tables()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+    assert conn.execute("SELECT COUNT(*) FROM tarifas WHERE servicio = 'agua'").fetchone()[0] == 1
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import proyecto_final as pf
+
+
+@pytest.fixture
+def repositorio(bd):
+    pf.DatabaseManager.init_tables()
+    return pf.RepositorioMultas()
+
+
+def _hace(dias):
+    return (datetime.now() - timedelta(days=dias)).isoformat(sep=" ", timespec="seconds")
+
+
+def _multa(repositorio, dias, estado="Vigente", monto=50.0):
+    fila = repositorio.crear("Ana López", "111", "Otro", None, monto, "admin", _hace(dias))
+    if estado != "Vigente":
+        fila = repositorio.actualizar(fila["id"], estado=estado)
+    return fila["id"]
+
+
+def _estado(multa_id):
+    with pf.DatabaseManager.connect() as conn:
+        fila = conn.execute("SELECT avisos, monto FROM multas WHERE id = ?", (multa_id,)).fetchone()
+    return fila["avisos"], fila["monto"]
+
+
+def test_tercer_aviso_suma_mora_y_reinicia(repositorio):
+    vieja = _multa(repositorio, 60)
+    reciente = _multa(repositorio, 5)
+    pagada = _multa(repositorio, 60, estado="Pagada")
+
+    resultados = [repositorio.ronda_avisos(dias=30) for _ in range(4)]
+
+    assert [r["avisadas"] for r in resultados] == [1, 1, 1, 1]
+    assert [r["moras"] for r in resultados] == [0, 0, 1, 0]
+    assert resultados[2]["mora_total"] == 10.0
+    assert _estado(vieja) == (1, 60.0)
+    assert _estado(reciente) == (0, 50.0)
+    assert _estado(pagada) == (0, 50.0)
+
+
+def test_simular_no_cambia_nada(repositorio):
+    multa = _multa(repositorio, 60)
+    resumen = repositorio.ronda_avisos(dias=30, simular=True)
+    assert resumen["avisadas"] == 1 and resumen["moras"] is None
+    assert _estado(multa) == (0, 50.0)
+
+
+def test_aviso_individual_sigue_la_misma_regla(repositorio):
+    multa = _multa(repositorio, 1)
+    filas = [repositorio.aviso(multa) for _ in range(3)]
+    assert [(f["avisos"], f["monto"]) for f in filas] == [(1, 50.0), (2, 50.0), (0, 60.0)]
+
+
+def test_ronda_actualiza_el_cache(repositorio):
+    multa = _multa(repositorio, 60)
+    repositorio.ronda_avisos(dias=30)
+    assert repositorio._filas[multa]["avisos"] == 1
+
+
+def test_parametro_calculado_en_la_transaccion(repositorio):
+    fila = repositorio.crear("Ana López", "111", "Otro", None,
+                             lambda conn: pf.Tarifario.monto(pf.Tarifario.tablas(conn), "multa", "Otro"),
+                             "admin", _hace(1))
+    assert fila["monto"] == 50
+    assert repositorio.obtener(fila["id"]) is fila
+
+
+def test_escrituras_notifican_a_las_vistas(repositorio):
+    eventos = []
+
+    class Vista:
+        vigente = staticmethod(lambda: True)
+        recargar = staticmethod(lambda: eventos.append("recarga"))
+        alta = staticmethod(lambda multa_id, fila: eventos.append(("alta", multa_id)))
+        reemplazar = staticmethod(lambda multa_id, fila: eventos.append(("cambio", multa_id)))
+        quitar = staticmethod(lambda multa_id, fila: eventos.append(("baja", multa_id, fila["avisos"])))
+
+    repositorio.suscribir(Vista())
+    multa = _multa(repositorio, 1)
+    repositorio.aviso(multa)
+    repositorio.eliminar(multa)
+    repositorio.refrescar()
+    # La baja lleva la multa como estaba, para ubicar su página en cada vista
+    assert eventos == [("alta", multa), ("cambio", multa), ("baja", multa, 1), "recarga"]
+    assert repositorio.obtener(multa) is None
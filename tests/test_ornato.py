@@ -0,0 +1,35 @@
+import proyecto_final as pf
+
+
+def _ciudadano(conn, dpi="111", salario=2500):
+    return conn.execute("INSERT INTO ciudadanos_ornato (nombre, dpi, nit, salario) VALUES ('Ana', ?, 'CF', ?)",
+                        (dpi, salario)).lastrowid
+
+
+def _boletas(conn, ciudadano_id, anio):
+    return [tuple(r) for r in conn.execute(
+        "SELECT monto, con_multa, fecha_pago, pagado FROM boletas_ornato WHERE ciudadano_id = ? AND anio = ?",
+        (ciudadano_id, anio))]
+
+
+def test_cobrar_dos_veces_no_duplica_la_boleta(conn):
+    ciudadano = _ciudadano(conn)
+    assert pf.Ornato.cobrar(conn, ciudadano, 2025, 15, 0, "2025-01-10") is True
+    assert pf.Ornato.cobrar(conn, ciudadano, 2025, 30, 1, "2025-03-10") is False
+    assert _boletas(conn, ciudadano, 2025) == [(15, 0, "2025-01-10", 1)]
+    conn.rollback()
+
+
+def test_cobrar_paga_la_boleta_de_la_campana(conn):
+    ciudadano = _ciudadano(conn)
+    otro = _ciudadano(conn, "222", 7000)
+    assert pf.Ornato.generar_campana(conn, 2025) == 2
+    assert pf.Ornato.generar_campana(conn, 2025) == 0
+    assert _boletas(conn, ciudadano, 2025) == [(15, 0, None, 0)]
+
+    assert pf.Ornato.cobrar(conn, ciudadano, 2025, 30, 1, "2025-03-10") is True
+    assert _boletas(conn, ciudadano, 2025) == [(30, 1, "2025-03-10", 1)]
+    assert _boletas(conn, otro, 2025) == [(75, 0, None, 0)]
+    recaudacion = pf.Ornato.recaudacion(conn, 2025)
+    assert (recaudacion["emitidas"], recaudacion["pagadas"], recaudacion["recaudado"]) == (2, 1, 30)
+
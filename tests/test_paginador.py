@@ -0,0 +1,36 @@
+import pytest
+
+import proyecto_final as pf
+
+
+@pytest.fixture
+def multas(conn):
+    fechas = ["2025-01-0%d 00:00:00" % (i % 3 + 1) for i in range(10)] + [None, None]
+    conn.executemany("INSERT INTO multas (nombre_completo, dpi, tipo_multa, monto, creado_por, fecha_creacion) "
+                     "VALUES ('Ana', '1', 'Otro', 50, 'admin', ?)", [(f,) for f in fechas])
+    conn.commit()
+    return conn
+
+
+@pytest.mark.parametrize("descendente", [False, True])
+@pytest.mark.parametrize("paso", [1, 4, 5, 12, 50])
+def test_marcas_dan_el_total_sin_contar(multas, descendente, paso):
+    paginador = pf.repositorio_multas.paginador(descendente=descendente)
+    total, cortes = paginador.marcas(multas, paso)
+    assert total == 12
+    assert len(cortes) == total // paso + 1
+
+
+@pytest.mark.parametrize("orden", ["id", "fecha_creacion", "monto"])
+@pytest.mark.parametrize("descendente", [False, True])
+def test_pagina_de_coincide_con_las_paginas_leidas(multas, orden, descendente):
+    paginador = pf.repositorio_multas.paginador(orden=orden, descendente=descendente)
+    _, cortes = paginador.marcas(multas, 5)
+    for numero, corte in enumerate(cortes):
+        for fila in paginador.pagina(multas, corte, 5):
+            assert paginador.pagina_de(cortes, fila) == numero
+
+
+def test_pagina_de_sin_columna_simple(conn):
+    fila = {"id": 1, "nombre": "Ana"}
+    assert pf._paginador_usuarios().pagina_de([None, ("ana", 1)], fila) is None
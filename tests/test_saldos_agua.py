@@ -0,0 +1,64 @@
+from datetime import date
+
+import proyecto_final as pf
+from conftest import crear_usuario
+
+
+def _lectura(conn, usuario_id, consumo, total, fecha, pagado=0):
+    return conn.execute("""
+        INSERT INTO lecturas_agua (usuario_id, consumo_m3, total_pagar, fecha, pagado) VALUES (?, ?, ?, ?, ?)
+    """, (usuario_id, consumo, total, fecha, pagado)).lastrowid
+
+
+def _saldo(conn, usuario_id):
+    return tuple(pf.SaldosAgua.consultar(conn, usuario_id))
+
+
+def test_usuario_nuevo_tiene_saldo_en_cero(conn):
+    usuario = crear_usuario(conn)
+    assert _saldo(conn, usuario) == (usuario, 0, 0, 0, 0, 0, 0)
+
+
+def test_triggers_y_reconstruir_coinciden(conn):
+    ana, luis = crear_usuario(conn, "Ana"), crear_usuario(conn, "Luis")
+    primera = _lectura(conn, ana, 10, 50, "2024-01-05 10:00:00")
+    _lectura(conn, ana, 12, 60, "2024-02-05 10:00:00")
+    sin_fecha = _lectura(conn, ana, 4, 20, None)
+    _lectura(conn, luis, 5, 25, "2024-03-01 09:00:00", pagado=1)
+    movida = _lectura(conn, luis, 7, 35, "2024-04-01 09:00:00")
+
+    conn.execute("UPDATE lecturas_agua SET pagado = 1, fecha_pago = '2024-02-01' WHERE id = ?", (primera,))
+    conn.execute("UPDATE lecturas_agua SET consumo_m3 = 6, total_pagar = 30 WHERE id = ?", (sin_fecha,))
+    conn.execute("UPDATE lecturas_agua SET usuario_id = ? WHERE id = ?", (ana, movida))
+    conn.execute("DELETE FROM lecturas_agua WHERE usuario_id = ? AND pagado = 1 AND consumo_m3 = 5", (luis,))
+
+    por_triggers = {u: _saldo(conn, u) for u in (ana, luis)}
+    assert pf.SaldosAgua.reconstruir(conn) == 0
+    assert {u: _saldo(conn, u) for u in (ana, luis)} == por_triggers
+
+    # Ana: pendientes 60 + 30 + 35, tres lecturas sin pagar (dos con fecha), cuatro en total
+    assert por_triggers[ana][1:4] == (125, 3, 2)
+    assert por_triggers[ana][5:] == (4, 10 + 12 + 6 + 7)
+    assert por_triggers[luis] == (luis, 0, 0, 0, 0, 0, 0)
+    conn.rollback()
+
+
+def test_reconstruir_cuenta_los_saldos_descuadrados(conn):
+    usuario = crear_usuario(conn)
+    _lectura(conn, usuario, 10, 50, "2024-01-05 10:00:00")
+    conn.execute("UPDATE saldos_agua SET total_pendiente = 999 WHERE usuario_id = ?", (usuario,))
+    assert pf.SaldosAgua.reconstruir(conn) == 1
+    assert _saldo(conn, usuario)[1] == 50
+    conn.rollback()
+
+
+def test_desglose_suma_la_mora_por_mes(conn):
+    usuario = crear_usuario(conn)
+    _lectura(conn, usuario, 10, 50, "2024-01-05 10:00:00")
+    _lectura(conn, usuario, 10, 50, "2024-03-05 10:00:00")
+    lecturas, consumo, mora, total = pf.SaldosAgua.desglose(pf.SaldosAgua.consultar(conn, usuario),
+                                                            date(2024, 4, 20))
+    assert (lecturas, consumo) == (2, 100)
+    assert mora == (3 + 1) * pf.SaldosAgua.MORA_MENSUAL
+    assert total == consumo + mora
+    conn.rollback()
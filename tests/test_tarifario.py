@@ -0,0 +1,50 @@
+import pytest
+
+import proyecto_final as pf
+
+
+def test_tarifa_inicial_es_un_solo_bloque(conn):
+    tablas = pf.Tarifario.tablas(conn)
+    assert [pf.Tarifario.cargo_agua(tablas, m3) for m3 in (0, 5, 10, 15)] == [0, 25, 50, 75]
+
+
+def test_fijar_bloque_cobra_por_tramos(conn):
+    pf.Tarifario.fijar(conn, "agua", "Residencial", 8.0, desde=10, vigente_desde="2000-01-01")
+    conn.commit()
+    tablas = pf.Tarifario.tablas(conn)
+    # 10 m³ a Q5 y el resto a Q8
+    assert [pf.Tarifario.cargo_agua(tablas, m3, "Residencial", "2000-06-01") for m3 in (0, 5, 10, 15)] \
+        == [0, 25, 50, 90]
+
+
+def test_vigencia_nueva_copia_los_bloques_anteriores(conn):
+    pf.Tarifario.fijar(conn, "agua", "Residencial", 8.0, desde=10, vigente_desde="2000-01-01")
+    copiados = pf.Tarifario.fijar(conn, "agua", "Residencial", 6.0, vigente_desde="2030-01-01")
+    conn.commit()
+    assert copiados == 2
+    tablas = pf.Tarifario.tablas(conn)
+    assert pf.Tarifario.cargo_agua(tablas, 15, "Residencial", "2029-12-31") == 90
+    assert pf.Tarifario.cargo_agua(tablas, 15, "Residencial", "2030-01-01") == 10 * 6 + 5 * 8
+
+
+def test_categoria_sin_tarifa_usa_la_residencial(conn):
+    pf.Tarifario.fijar(conn, "agua", "Comercial", 9.0, vigente_desde="2000-01-01")
+    conn.commit()
+    tablas = pf.Tarifario.tablas(conn)
+    assert pf.Tarifario.cargo_agua(tablas, 10, "Comercial", "2000-06-01") == 90
+    assert pf.Tarifario.cargo_agua(tablas, 10, "Otra", "2000-06-01") == 50
+
+
+def test_primera_vigencia_necesita_bloque_desde_cero(conn):
+    with pytest.raises(ValueError):
+        pf.Tarifario.fijar(conn, "agua", "Comercial", 9.0, desde=10, vigente_desde="2000-01-01")
+    conn.rollback()
+
+
+def test_cambiar_tarifa_invalida_el_cache(conn):
+    antes = pf.Tarifario.tablas(conn)
+    pf.Tarifario.fijar(conn, "agua", "Residencial", 7.0)
+    conn.commit()
+    despues = pf.Tarifario.tablas(conn)
+    assert despues is not antes
+    assert pf.Tarifario.cargo_agua(despues, 10) == 70